@@ -10,8 +10,10 @@ It can either read trimming information from an XML file, either read directly
 from the command line. Each ways works with 'Single-Ends' (SE) and 
 'Paired-Ends' (PE) data.
  
-This script need four personal modules to function : parse_xml, parse_args, 
-commandline and check_entries"""
+This script need personal modules to function : parse_xml, parse_args, 
+commandline, check_entries, adapters, batch, compression, fastq, governor, jvm,
+merger, native, normalize, overrepresented, pipeline, plan, preflight, preview,
+qcstats, rundb, samplesheet, screen, sweep, trimmer and watch"""
 
 __author__ = "Anita Annamalé"
 __version__  = "1.0"
@@ -26,6 +28,7 @@ import xml.etree.ElementTree as ET
 import shlex, subprocess
 import os
 import sys
+import time
 
 
 # Add /src/ directory to Python path
@@ -37,6 +40,25 @@ import parse_args as pa
 import parse_xml as px
 import commandline as cl
 import check_entries as ce
+import adapters as ad
+import batch as bt
+import normalize as nm
+import compression as cp
+import fastq as fq
+import governor as gv
+import jvm as jv
+import merger as mg
+import pipeline as pl
+import plan as pn
+import preflight as pf
+import overrepresented as ov
+import preview as pv
+import qcstats as qc
+import rundb as db
+import samplesheet as ss
+import screen as sc
+import sweep as sw
+import watch as wa
 
 
 #-------------------------- FUNCTIONS DEFINITION ------------------------------#
@@ -57,6 +79,55 @@ if __name__ == '__main__' :
                 "Do python premseq.py -h for more informations.")
 
 
+    # QUERY OF THE RUN DATABASE ------------------------------------------------
+
+    if arguments['query'] != None :
+
+        if arguments['rundb'] == None :
+            sys.exit("/!\ '--query' needs the run database given by '--rundb'.")
+
+        db.query(arguments['rundb'], arguments['query'])
+        sys.exit(0)
+
+
+    # SAMPLE SHEET MODE --------------------------------------------------------
+
+    if arguments['samples'] != None :
+
+        arguments['output'] = ce.check_output_dir(arguments['output'])
+        if arguments['scratch'] != None :
+            arguments['scratch'] = ce.check_output_dir(arguments['scratch'])
+
+        samples = ss.read_sample_sheet(arguments['samples'])
+
+        if arguments['gather'] != None :
+            ss.gather(arguments, samples)
+        elif arguments['batch'] != None :
+            bt.run_batches(os.path.abspath(__file__), arguments, samples,
+                           arguments['batch'], arguments['task'])
+        else :
+            ss.run_samples(os.path.abspath(__file__), arguments, samples,
+                           arguments['task'])
+        sys.exit(0)
+
+
+    # WATCH MODE ---------------------------------------------------------------
+
+    if arguments['watch'] != None :
+
+        arguments['output'] = ce.check_output_dir(arguments['output'])
+        if arguments['scratch'] != None :
+            arguments['scratch'] = ce.check_output_dir(arguments['scratch'])
+
+        arguments['layout'] = ce.check_layout(arguments['layout'])
+
+        wa.watch(os.path.abspath(__file__), arguments, arguments['watch'],
+                 arguments['watch_workers'] or 1,
+                 arguments['watch_settle'] if arguments['watch_settle'] != None
+                 else wa.SETTLE)
+        sys.exit(0)
+
+
     # PARSING PARAMETERS -------------------------------------------------------
     
     if arguments['XML'] != None : 
@@ -69,14 +140,16 @@ if __name__ == '__main__' :
             # separate sub trees
         in_out, fastqc, trimmo = px.separate_steps(root)
             # separate trimming categories of Trimmomatic
-        adapter, quality, useful = px.separate_categories_Trimmo(trimmo)
+        adapter, quality, useful, screening = px.separate_categories_Trimmo(trimmo)
             # create an empty dict()
         param = dict()
             # fill the dictionnary with trimming parameters
-        param = px.get_input_output_parameters(in_out, param)
+        param = px.get_input_output_parameters(in_out, param, 
+                                               arguments.get('plan') == None)
         param = px.get_fastqc_choice(fastqc,param)
         param = px.get_adapter_parameters(adapter, param)
         param = px.get_quality_parameters(quality, param)
+        param = px.get_screening_parameters(screening, param)
         param = px.get_useful_parameters(useful, param)
 
     else :
@@ -121,8 +194,14 @@ SE data.")
         
         # CHECK OUTPUT DIRECTORY -----------------------------------------------
         
+        # directories are not created for the plan of a run
+        create = arguments.get('plan') == None
+
         if 'output' in param :
-            param['output'] = ce.check_output_dir(param['output'])
+            param['output'] = ce.check_output_dir(param['output'], create)
+
+        if 'scratch' in param :
+            param['scratch'] = ce.check_output_dir(param['scratch'], create)
 
 
         # CHECK PARAMETERS -----------------------------------------------------
@@ -130,6 +209,13 @@ SE data.")
             # check illuminaclip
         if 'illuminaclip' in param :
             pa.check_illuminaclip(param['illuminaclip'])
+
+            # check adapter detection
+        if 'detect_adapters' in param :
+            if not 'illuminaclip' in param :
+                sys.exit("/!\ Adapter detection needs the illuminaclip parameters.")
+            if param['detect_adapters'] != 'yes' :
+                param['detect_adapters'] = ce.check_fasta_file(param['detect_adapters'])
             
             # check slidingwindow 
         if 'slidingwindow' in param :
@@ -138,13 +224,49 @@ SE data.")
             # check maxingo
         if 'maxinfo' in param :
             pa.check_maxinfo(param['maxinfo'])
+
+            # check poly-X
+        if 'polyx' in param :
+            pa.check_polyx(param['polyx'])
+
+            # check compression format and level
+        if 'compress' in param :
+            param['compress'], level = ce.check_compression(param['compress'])
+            if level != None :
+                param['compress_level'] = level
+
+            # check read merging
+        if 'merge' in param :
+            if layout != 'PE' :
+                sys.exit("/!\ Read merging needs PE data.")
+            pa.check_merge(param['merge'])
+
+            # check early abort
+        if 'min_survival' in param :
+            pa.check_min_survival(param['min_survival'])
+
+            # check contaminant screening
+        if 'screen' in param :
+            pa.check_screen(param['screen'])
+
+            # check quality binning scheme
+        if 'binquality' in param :
+            pa.check_binquality(param['binquality'])
+
+            # check normalize
+        if 'normalize' in param :
+            pa.check_normalize(param['normalize'])
+
+            # check excluded tiles
+        if 'exclude_tiles' in param :
+            pa.check_exclude_tiles(param['exclude_tiles'])
         
         
         # ADD QUALITY to dictionnary if a quality trimming parameter is choosen 
         
         quality=['slidingwindow', 'maxinfo', 'leading', 'trailing',
                  'headcrop', 'crop', 'avgqual', 'minlen', 'tophred33',
-                 'tophred64']
+                 'tophred64', 'polyx']
     
         for element in quality :
             if element in param:
@@ -153,78 +275,192 @@ SE data.")
 
 
 
-    # INITIALISATION -----------------------------------------------------------
+    # MEMORY BUDGET ------------------------------------------------------------
+
+    # shared by the Java programs of all premseq jobs of the node
+    if arguments.get('memory') != None :
+        param['memory'] = gv.check_memory(arguments['memory'])
+
 
-    nb = 0 # number of executed command
+    # SCRATCH DIRECTORY & DISK SPACE -------------------------------------------
+
+    # temporary files are written in the output directory by default
+    if not 'scratch' in param :
+        param['scratch'] = param['output']
+
+    if arguments.get('preview') == None and arguments.get('sweep') == None \
+       and arguments.get('plan') == None :
+        ce.check_disk_space(param)
+
+
+    # PLAN MODE (DRY RUN) ------------------------------------------------------
+
+    if arguments.get('plan') != None :
+        pn.plan(loc, param, arguments.get('rundb'))
+        sys.exit(0)
+
+
+    # PREVIEW MODE -----------------------------------------------------------
+
+    if arguments.get('preview') != None :
+        pv.preview(loc, param, arguments['preview'])
+        sys.exit(0)
+
+
+    # SWEEP MODE -------------------------------------------------------------
+
+    if arguments.get('sweep') != None :
+        sw.sweep(loc, param, sw.read_sweep_file(arguments['sweep']),
+                 arguments.get('sweep_outputs') != None)
+        sys.exit(0)
+
+
+    # INITIALISATION -----------------------------------------------------------
 
     io= dict() # dictionnary wich will contain all created files 
+
+    start = time.time() # to record the duration of the run
     
 
-    # STEP 1 : ADAPTER TRIMMING ------------------------------------------------
+    # raw reads, before the tile filter
+    rawfiles = list(param['input'])
+    if param['layout'] == 'SE' :
+        rawfiles = rawfiles[:1]
 
-    if 'illuminaclip' in param :
 
-        # Commandline generation
-        cmd_step1, io = cl.commandline_step_1(loc,param,nb,io)
-        
-        # Launch commandline
-        args_1 = shlex.split(cmd_step1)
-        with open("{0}/step1_output.out".format(param['output']),"wt") as out1:
-            prog_1 = subprocess.check_call(args_1, stderr=out1)
-        
-        # Number of executed commandline becomes 1
-        nb = 1
-        
+    # PREFLIGHT CHECK OF INPUTS ------------------------------------------------
 
-    # STEP 2 : QUALITY TRIMMING ------------------------------------------------
+    if arguments.get('no_preflight') == None :
+        io = pf.preflight(param, rawfiles, io)
 
-    if 'quality' in param :
-        
+    # phred offset of the outputs, taken from the raw reads (the filtered reads
+    # are removed before the outputs are binned)
+    outputphred = None
+    if 'binquality' in param :
+        outputphred = fq.get_output_phred(param, rawfiles[0])
 
-        if(nb==1):    
-            # Change step1 output files into step2 input files
-            io = cl.change_output_as_input(io, param)
 
-        # Commandline generation
-        cmd_step2 = cl.commandline_step_2(loc,param, nb, io)
-                
-        # Launch commandline
-        args_2 = shlex.split(cmd_step2)
-        with open("{0}/step2_output.out".format(param['output']),"wt") as out2:
-            prog_2 = subprocess.check_call(args_2, stderr=out2)
-    
+    # TILE FILTER --------------------------------------------------------------
 
-    # DELETE TEMPORARY FILES ---------------------------------------------------
+    if 'exclude_tiles' in param :
+        param, io = qc.filter_tiles(param, io)
 
-    if 'tmp' in io :
 
-        if param['layout'] == 'SE' :
-            os.remove(io['tmp'])
-            
-        else:
-            os.remove(io['tmp'][0])
-            os.remove(io['tmp'][1])
-
-    if not 'keep_singleton' in param:
-        # Delete singleton read files
-        if 'single' in io:
-            os.remove(io['single'][0])
-            os.remove(io['single'][1])
+    # ADAPTER DETECTION --------------------------------------------------------
+
+    if 'detect_adapters' in param :
+        param, io = ad.adapter_detection(loc, param, io)
+
+
+    # STEP 1 & 2 : ADAPTER AND QUALITY TRIMMING --------------------------------
+
+    io = pl.run_trimming(loc, param, io)
+
+    # trimmed reads (screening and merging rewrite them under the same names)
+    trimmedfiles = []
+    if 'trimmed' in io and param['layout'] == 'SE' :
+        trimmedfiles = [io['trimmed']]
+    elif 'trimmed' in io :
+        trimmedfiles = list(io['trimmed'])
+
+    # reads of each tile surviving the trimming, counted before screening and
+    # merging remove some of them
+    trimmingtiles = None
+    if 'qc' in param and trimmedfiles and ('screen' in param or
+                                           'merge' in param) :
+        trimmingtiles = qc.output_tiles(param, trimmedfiles)
     
 
+    # CONTAMINANT SCREENING ----------------------------------------------------
+
+    if 'screen' in param and 'trimmed' in io :
+        io = sc.screen_step(param, io)
+
+
+    # READ MERGING -------------------------------------------------------------
+
+    if 'merge' in param and 'trimmed' in io :
+        io = mg.merge_step(param, io)
+
+
+    # DIGITAL NORMALIZATION ----------------------------------------------------
+
+    if 'normalize' in param:
+
+        # trimmed reads are normalized, or raw reads if nothing have been done
+        if not 'trimmed' in io :
+            reads = list(param['input'])
+        elif param['layout'] == 'SE' :
+            reads = [io['trimmed']]
+        else :
+            reads = list(io['trimmed'])
+
+        io['normalized'] = nm.normalized_names(param, reads)
+        total, kept = nm.normalize_files(param, reads, io['normalized'])
+
+        io = cl.add_stat_section(io, 'Normalization', 
+                                 ['Total', 'Kept', 'Kept Percentage'],
+                                 [[total, kept, 
+                                   round(100.0 * kept / max(total, 1), 2)]])
+
+
+    # NATIVE QUALITY CONTROL ---------------------------------------------------
+
+    # raw reads and trimmed reads
+    qcfiles = rawfiles + trimmedfiles
+
+    if 'qc' in param:
+
+        rows, tiles = qc.quality_control(param, rawfiles, trimmedfiles,
+                                          trimmingtiles)
+
+        io = cl.add_stat_section(io, 'Quality Control',
+                                 ['Filename', 'Total Sequences', 'Total Bases',
+                                  'Mean Length', 'Mean Quality', 
+                                  'GC Percentage', 'N Percentage'],
+                                 rows)
+
+        io = cl.add_stat_section(io, 'Tiles',
+                                 ['Filename', 'Lane', 'Tile', 'Reads', 
+                                  'Mean Quality', 'Surviving Percentage',
+                                  'Trimmed Away Bases Percentage'],
+                                 tiles)
+
+    if 'overrepresented' in param:
+
+        io = cl.add_stat_section(io, 'Overrepresented Sequences',
+                                 ['Filename', 'Sequence', 'Count', 
+                                  'Percentage', 'Possible Source'],
+                                 ov.overrepresented_sequences(loc, param, 
+                                                              qcfiles))
+
+
+    fastqcfiles = [] # quality control information
+
+
     # STEP 3 : QUALITY CONTROL -------------------------------------------------
 
     if 'fastqc' in param:
 
+        fastqc_start = time.time()
+
+        # FastQC works in the scratch directory
+        os.mkdir('{0}/Fastqc'.format(param['scratch']))
+        jv.build_fastqc_jar(loc)
+
         # Commandline generation
         cmd_step3 = cl.commandline_fastqc(loc, param, io)
             
         # Launch commandline
         args_3 = shlex.split(cmd_step3)
-        prog_3 = subprocess.check_call(args_3)
+        with gv.reservation(param, gv.fastqc_resources(param, len(qcfiles))[1]):
+            prog_3 = subprocess.check_call(args_3)
+
+        io.setdefault('timings', []).append(('fastqc',
+                                             time.time() - fastqc_start))
 
         # DELETE UNNECESSARY FILES
-        if arguments['layout'] == 'SE' :
+        if param['layout'] == 'SE' :
             file_1 = cl.clean_fastqc_output(param,io['input'][0])
             file_2 = cl.clean_fastqc_output(param,io['trimmed'])
             fastqcfiles = [file_1, file_2]
@@ -235,13 +471,41 @@ SE data.")
             file_4 = cl.clean_fastqc_output(param,io['trimmed'][1])
             
             fastqcfiles=[file_1, file_2, file_3, file_4]
+
+        # MOVE REPORTS FROM THE SCRATCH DIRECTORY
+        cl.move_fastqc_output(param)
         
-        # WRITE STATISTIC FILE
-        cl.write_stat_file(fastqcfiles,param)
+
+    # DELETE FILTERED READS ----------------------------------------------------
+
+    if 'filtered' in io :
+        for filename in io['filtered'] :
+            os.remove(filename)
+        os.rmdir(os.path.dirname(io['filtered'][0]))
+        del io['filtered']
+
+
+    # COMPRESSION OF FINAL OUTPUTS ---------------------------------------------
+
+    io = cp.compress_outputs(io, param, outputphred)
+
+
+    # WRITE STATISTIC FILE -----------------------------------------------------
+
+    if fastqcfiles or 'stats' in io :
+        cl.write_stat_file(fastqcfiles,param,io)
+
+
+    # RECORD THE RUN IN THE RUN DATABASE ---------------------------------------
+
+    if arguments.get('rundb') != None :
+        db.record_run(arguments['rundb'], param, io, start)
 
 
     #  check execution of premseq 
-    if ('illuminaclip' not in param) and ('quality' not in param) and ('fastqc' not in param):
+    if ('illuminaclip' not in param) and ('quality' not in param) and \
+       ('fastqc' not in param) and ('normalize' not in param) and \
+       ('qc' not in param) and ('overrepresented' not in param):
         print 'Oops! Nothing have been done, please check the commandline.'
     
 
@@ -0,0 +1,303 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+adapters.py : module containing all functions to detect the adapters present
+              in a library before adapter trimming. The k-mers at the 3' end of
+              the first reads are counted, the overrepresented ones are matched
+              against a library of known adapters, and only the detected
+              adapters are written in the FASTA file given to ILLUMINACLIP.
+
+Dependency : check_entries, commandline, fastq, normalize (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import collections
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+import normalize as nm
+
+
+# number of reads of each file looked at
+DETECTION_READS = 200000
+
+# length of k-mers and number of k-mers taken at the 3' end of reads
+KMER_SIZE = 12
+KMER_NUMBER = 3
+
+# minimal fraction of reads in which an adapter must be found
+MIN_FRACTION = 0.001
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# ADAPTER LIBRARY --------------------------------------------------------------
+
+def read_fasta(filename):
+    """
+    Function that reads the sequences of a FASTA file.
+
+    Takes one argument : filename [string] : the FASTA file
+
+    Returns one argument : entries [list] : list of (name, sequence)
+    """
+
+    entries = []
+
+    with open(filename, 'rt') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('>'):
+                entries.append([line[1:], ''])
+            elif entries:
+                entries[-1][1] += line.upper()
+
+    return [tuple(entry) for entry in entries]
+
+
+
+def write_fasta(filename, entries):
+    """
+    Function that writes sequences in a FASTA file.
+
+    Takes two arguments : - filename [string] : the FASTA file
+                          - entries [list] : list of (name, sequence)
+
+    Returns anything.
+    """
+
+    with open(filename, 'wt') as f:
+        for name, seq in entries:
+            f.write(">{0}\n{1}\n".format(name, seq))
+
+
+
+def kmer_index(entries, ksize):
+    """
+    Function that indexes the k-mers of adapters. Adapters read through at the
+    3' end of reads can be found in their forward or reverse complement
+    orientation, reverse complement k-mers are only indexed when they aren't
+    the forward k-mer of another adapter.
+
+    Takes two arguments : - entries [list] : list of (name, sequence)
+                          - ksize [integer] : length of k-mers
+
+    Returns one argument : index [dict] : set of adapter names for each k-mer
+    """
+
+    index = {}
+
+    for name, seq in entries:
+        for i in range(len(seq) - ksize + 1):
+            index.setdefault(seq[i:i + ksize], set()).add(name)
+
+    reverse = {}
+
+    for name, seq in entries:
+        seq = seq.translate(nm.COMPLEMENT)[::-1]
+        for i in range(len(seq) - ksize + 1):
+            kmer = seq[i:i + ksize]
+            if not kmer in index:
+                reverse.setdefault(kmer, set()).add(name)
+
+    index.update(reverse)
+
+    return index
+
+
+
+def with_mates(entries, names):
+    """
+    Function that adds the mate of detected palindrome adapters ('prefix/1'
+    and 'prefix/2' entries), as palindrome mode needs both of them.
+
+    Takes two arguments : - entries [list] : list of (name, sequence)
+                          - names [set] : detected adapter names
+
+    Returns one argument : names [set] : names with their mates
+    """
+
+    prefixes = set([name[:-2] for name in names
+                    if name.endswith('/1') or name.endswith('/2')])
+
+    return names | set([name for name, seq in entries
+                        if name[:-2] in prefixes and
+                        (name.endswith('/1') or name.endswith('/2'))])
+
+
+
+# DETECTION --------------------------------------------------------------------
+
+def read_tails(filename, nb_reads=DETECTION_READS,
+               ksize=KMER_SIZE, number=KMER_NUMBER):
+    """
+    Function that gets the k-mers at the 3' end of the first reads of a file
+    (non overlapping k-mers, starting from the last base).
+
+    Takes four arguments :
+        - filename [string] : the FASTQ file
+        - nb_reads [integer] : number of reads to look at
+        - ksize [integer] : length of k-mers
+        - number [integer] : number of k-mers taken in each read
+
+    Returns one argument : tails [list] : list of k-mers of each read
+    """
+
+    tails = []
+    handle = fq.open_fastq(filename)
+
+    for record in fq.read_records(handle):
+        seq = record[1]
+        tails.append([seq[i - ksize:i] for i in
+                      range(len(seq), max(len(seq) - number * ksize, ksize - 1),
+                            -ksize)])
+        if (len(tails) == nb_reads):
+            break
+
+    handle.close()
+
+    return tails
+
+
+
+def detect_adapters(filename, index, nb_reads=DETECTION_READS,
+                    fraction=MIN_FRACTION):
+    """
+    Function that detects the adapters present at the 3' end of the reads of
+    a file. Overrepresented 3' k-mers are matched against the adapter index,
+    each read is then assigned to the adapters sharing all its matched k-mers.
+    An adapter is detected if enough reads are specific to it (k-mers shared
+    by several adapters, like the common TruSeq start, are not enough).
+
+    Takes four arguments :
+        - filename [string] : the FASTQ file
+        - index [dict] : set of adapter names for each k-mer
+        - nb_reads [integer] : number of reads to look at
+        - fraction [float] : minimal fraction of reads containing an adapter
+
+    Returns two arguments :
+        - counts [dict] : number of reads containing each detected adapter
+        - total [integer] : number of reads looked at
+    """
+
+    tails = read_tails(filename, nb_reads)
+    total = len(tails)
+    min_reads = max(10, int(fraction * total))
+
+
+    # Overrepresented 3' k-mers found in adapters ------------------------------
+
+    kmers = collections.Counter()
+    for tail in tails:
+        kmers.update(tail)
+
+    matched = dict([(kmer, index[kmer]) for kmer, count in kmers.iteritems()
+                    if count >= min_reads and kmer in index])
+
+
+    # Assign reads to adapters -------------------------------------------------
+
+    groups = collections.Counter()
+    for tail in tails:
+        names = [matched[kmer] for kmer in tail if kmer in matched]
+        if names:
+            groups[frozenset.intersection(*map(frozenset, names))] += 1
+
+    # reads specific to one adapter
+    detected = set([name for names, count in groups.iteritems()
+                    if count >= min_reads and len(names) == 1
+                    for name in names])
+
+    # reads specific to identical adapters (ex : PrefixNX/1 and PrefixNX/2)
+    for names, count in groups.items():
+        if (count >= min_reads and not detected.intersection(names)):
+            detected.update(names)
+
+    # reads shared by several detected adapters are counted for each of them
+    counts = dict([(name, 0) for name in detected])
+    for names, count in groups.iteritems():
+        for name in detected.intersection(names):
+            counts[name] += count
+
+    return counts, total
+
+
+
+def adapter_detection(loc, param, inout):
+    """
+    Function that detects the adapters of the input(s) and replaces the FASTA
+    file of ILLUMINACLIP by a file containing only the detected adapters
+    (written in the scratch directory). Adapter trimming is skipped if no
+    adapter is found and a quality trimming follows. Detected adapters are
+    added to the statistic file.
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames
+
+    Returns two arguments :
+        - param [dict] : with the new ILLUMINACLIP FASTA file
+        - inout [dict] : with the adapter detection statistics
+    """
+
+    library = param['detect_adapters']
+    if (library == 'yes'):
+        library = '{0}AdaptersLibrary.fasta'.format(loc[:-3])
+
+    entries = read_fasta(library)
+    index = kmer_index(entries, KMER_SIZE)
+
+    inputs = list(param['input'])
+    if (param['layout'] == 'SE'):
+        inputs = inputs[:1]
+
+    detected = set()
+    rows = []
+
+    for filename in inputs:
+        counts, total = detect_adapters(filename, index)
+        detected.update(counts)
+
+        for name, count in sorted(counts.items(), key=lambda x: -x[1]):
+            rows.append([filename, name, count,
+                         round(100.0 * count / max(total, 1), 2)])
+
+    inout = cl.add_stat_section(inout, 'Adapter Detection',
+                                ['Filename', 'Adapter', 'Reads',
+                                 'Reads Percentage'], rows)
+
+    if not detected :
+        print "No adapter found in the first {0} reads.".format(DETECTION_READS)
+
+        # nothing to clip
+        if 'quality' in param :
+            del param['illuminaclip']
+
+        return param, inout
+
+    detected = with_mates(entries, detected)
+
+    fasta = "{0}/adapters_{1}.fasta".format(param['scratch'],
+                                            ce.get_file_prefix(inputs[0]))
+    write_fasta(fasta, [entry for entry in entries if entry[0] in detected])
+
+    clip = param['illuminaclip'].split(':')
+    clip[0] = fasta
+    param['illuminaclip'] = ':'.join(clip)
+
+    return param, inout
+
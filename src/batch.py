@@ -0,0 +1,429 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+batch.py : module containing all functions to run the many small samples of a
+           sample sheet (single-cell, amplicons, ...) in batches, so that the
+           start of Trimmomatic is paid once per batch and not once per
+           sample. The reads of the samples of a batch are concatenated in one
+           file (in two files for PE data), each record being tagged with its
+           sample in its header, premseq is run once on the batch, and its
+           output files are demultiplexed back into the output directory of
+           each sample, with the statistics (and the trimming survival) of
+           each sample.
+
+Dependency : check_entries, commandline, fastq, samplesheet (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+import samplesheet as ss
+
+
+# tag appended to the header of each record (after the read name and its
+# comment, so that the read name is still parsed) : index of the sample in
+# the batch
+TAG = ' premseq_batch='
+
+# default number of samples in a batch
+SIZE = 200
+
+# output files of a batch run which are demultiplexed
+FASTQ = re.compile(r"\.(fastq|fq)(\.gz|\.bz2|\.zst)?$")
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# BATCHES ----------------------------------------------------------------------
+
+def make_batches(samples, size, phred=None):
+    """
+    Function that groups the samples in batches of at most 'size' samples, the
+    samples of a batch having the same layout and the same phred offset (as a
+    batch is trimmed with one offset).
+
+    Takes three arguments :
+        - samples [list] : list of (name, layout, files)
+        - size [integer] : maximal number of samples in a batch
+        - phred [integer] : phred offset given by the user, or None to detect
+                            it from the first file of each sample
+
+    Returns one argument : batches [list] : lists of (name, layout, files)
+    """
+
+    offsets = [phred or fq.detect_phred(sample[2][0]) for sample in samples]
+    batches = []
+
+    for layout in ['SE', 'PE']:
+        for offset in [33, 64]:
+            same = [sample for sample, sample_offset in zip(samples, offsets)
+                    if sample[1] == layout and sample_offset == offset]
+            for start in range(0, len(same), size):
+                batches.append(same[start:start + size])
+
+    return batches
+
+
+
+def concatenate(batch, prefix, directory):
+    """
+    Function that concatenates the reads of the samples of a batch, the header
+    of each record being tagged with the index of its sample in the batch.
+
+    Takes three arguments :
+        - batch [list] : list of (name, layout, files)
+        - prefix [string] : prefix of the concatenated files
+        - directory [string] : directory of the concatenated files
+
+    Returns two arguments : - files [list] : the concatenated file(s)
+                            - counts [list] : number of reads of each sample
+    """
+
+    nb_files = len(batch[0][2])
+    files = ["{0}/{1}_{2}.fastq".format(directory, prefix, mate)
+             for mate in range(1, nb_files + 1)]
+    counts = []
+
+    writers = [fq.open_fastq(filename, 'w') for filename in files]
+
+    for index, (name, layout, inputs) in enumerate(batch):
+        tag = "{0}{1}".format(TAG, index)
+
+        for writer, filename in zip(writers, inputs):
+            reader = fq.open_fastq(filename)
+            count = 0
+
+            for records in fq.read_batches(reader):
+                fq.write_records(writer, [(record[0] + tag,) + record[1:]
+                                          for record in records])
+                count += len(records)
+
+            reader.close()
+
+        # reads of the last mate (PE files are checked by the trimming)
+        counts.append(count)
+
+    for writer in writers:
+        writer.close()
+
+    return files, counts
+
+
+
+# DEMULTIPLEXING ---------------------------------------------------------------
+
+def output_mate(filename, prefixes):
+    """
+    Function that gives the mate of an output file of a batch, from the prefix
+    of the concatenated file in its name.
+
+    Takes two arguments : - filename [string] : basename of the output file
+                          - prefixes [list] : prefix of each concatenated file
+
+    Returns one argument : mate [integer] : index of the mate, or None
+    """
+
+    # the second mate first ('<batch>_1' is not a part of '<batch>_2')
+    for mate in reversed(range(len(prefixes))):
+        if prefixes[mate] in filename:
+            return mate
+
+    return None
+
+
+
+def output_name(filename, prefixes, inputs):
+    """
+    Function that gives the name of the output file of a sample from the name
+    of the output file of the batch : the prefix of the concatenated file is
+    replaced by the prefix of the read file of the sample.
+
+    Takes three arguments :
+        - filename [string] : basename of the output file of the batch
+        - prefixes [list] : prefix of each concatenated file
+        - inputs [list] : read file(s) of the sample
+
+    Returns one argument : name [string] : basename of the output of the sample
+    """
+
+    mate = output_mate(filename, prefixes)
+    if mate == None :
+        return filename
+
+    return filename.replace(prefixes[mate], ce.get_file_prefix(inputs[mate]))
+
+
+
+def demultiplex(filename, batch, outputs, param):
+    """
+    Function that demultiplexes an output file of a batch into the output
+    directory of each sample, the tag being removed from the headers. The file
+    of a sample is opened at its first read (records of a sample are
+    contiguous, as the trimming keeps the order of the reads).
+
+    Takes four arguments :
+        - filename [string] : output file of the batch
+        - batch [list] : list of (name, layout, files)
+        - outputs [list] : output file of each sample
+        - param [dict] : dictionnary containing all parameters
+
+    Returns one argument : counts [list] : number of reads of each sample
+    """
+
+    counts = [0] * len(batch)
+    writers = dict()
+
+    reader = fq.open_fastq(filename)
+
+    for records in fq.read_batches(reader):
+        groups = dict()
+
+        for record in records:
+            fields = record[0].rsplit(TAG, 1)
+            if (len(fields) != 2):
+                sys.exit("/!\ Read '{0}' of {1} has no batch tag.".format(
+                         record[0], filename))
+
+            groups.setdefault(int(fields[1]), []).append((fields[0],) +
+                                                         record[1:])
+
+        for index, group in groups.items():
+            if not index in writers:
+                writers[index] = fq.open_fastq(outputs[index], 'w',
+                                               param.get('compress_level'))
+            fq.write_records(writers[index], group)
+            counts[index] += len(group)
+
+    reader.close()
+
+    # samples without any read get an empty file
+    for index, output in enumerate(outputs):
+        if not index in writers:
+            writers[index] = fq.open_fastq(output, 'w',
+                                           param.get('compress_level'))
+
+    for writer in writers.values():
+        writer.close()
+
+    return counts
+
+
+
+def survival_rows(layout, counts, kept):
+    """
+    Function that gives the survival of the trimming of each sample of a batch,
+    as Trimmomatic reports it, from the reads of the sample in the outputs :
+    pairs of the trimmed (and merged) files survived, reads of the singleton
+    files survived alone, and reads removed by the contaminant screening are
+    dropped.
+
+    Takes three arguments :
+        - layout [string] : 'SE' or 'PE'
+        - counts [list] : number of input reads (or pairs) of each sample
+        - kept [dict] : number of reads of each sample in the output files of
+                        the first mate (and singletons of each mate), by
+                        kind of file ('trimmed', 'merged', 'single_1', ...)
+
+    Returns two arguments : - header [list] : columns of the survival
+                            - rows [list] : survival of each sample
+    """
+
+    nothing = [0] * len(counts)
+    both = [trimmed + merged for trimmed, merged in
+            zip(kept.get('trimmed', nothing), kept.get('merged', nothing))]
+
+    if (layout == 'SE'):
+        header = ['Input Reads', 'Surviving', 'Surviving Percentage',
+                  'Dropped', 'Dropped Percentage']
+        columns = [both]
+    else:
+        header = ['Input Read Pairs', 'Both Surviving',
+                  'Both Surviving Percentage', 'Forward Only Surviving',
+                  'Forward Only Surviving Percentage',
+                  'Reverse Only Surviving', 'Reverse Only Surviving Percentage',
+                  'Dropped', 'Dropped Percentage']
+        columns = [both, kept.get('single_1', nothing),
+                   kept.get('single_2', nothing)]
+
+    rows = []
+    for index, total in enumerate(counts):
+        numbers = [column[index] for column in columns]
+        numbers.append(total - sum(numbers))
+
+        row = [total]
+        for number in numbers:
+            row += [number, round(100.0 * number / max(total, 1), 2)]
+        rows.append(row)
+
+    return header, rows
+
+
+
+def split_batch(param, batch, directory, prefixes, counts, cmd, seconds):
+    """
+    Function that demultiplexes all output files of a batch run into the
+    output directory of each sample, writes the statistic file (with the
+    trimming survival of the sample) and the marker file of each sample, and
+    removes the demultiplexed files of the batch. Singletons of PE batches are
+    always kept to count the survival, and removed if not asked.
+
+    Takes seven arguments :
+        - param [dict] : dictionnary containing all parameters
+        - batch [list] : list of (name, layout, files)
+        - directory [string] : output directory of the batch
+        - prefixes [list] : prefix of each concatenated file
+        - counts [list] : number of input reads of each sample
+        - cmd [list] : commandline of the batch
+        - seconds [float] : duration of the batch
+
+    Returns anything.
+    """
+
+    samples = ["{0}/{1}".format(param['output'], name)
+               for name, layout, files in batch]
+    for output in samples:
+        ce.check_output_dir(output)
+
+    rows = [[] for sample in batch]
+    survival = dict()
+
+    for filename in sorted(os.listdir(directory)):
+        if not FASTQ.search(filename):
+            continue
+
+        outputs = ["{0}/{1}".format(output, output_name(filename, prefixes,
+                                                        files))
+                   for output, (name, layout, files) in zip(samples, batch)]
+
+        kept = demultiplex("{0}/{1}".format(directory, filename), batch,
+                           outputs, param)
+        os.remove("{0}/{1}".format(directory, filename))
+
+        # reads of the first mate (both mates for singletons)
+        kind = filename.split('_', 1)[0]
+        mate = output_mate(filename, prefixes)
+        if (kind in ['trimmed', 'merged'] and mate == 0):
+            survival[kind] = kept
+        elif (kind == 'single' and mate != None):
+            survival['single_{0}'.format(mate + 1)] = kept
+
+            if param.get('keep_singleton') == None :
+                for output in outputs:
+                    os.remove(output)
+                continue
+
+        for index, output in enumerate(outputs):
+            rows[index].append([os.path.basename(output),
+                                os.path.basename(directory), counts[index],
+                                kept[index],
+                                round(100.0 * kept[index] /
+                                      max(counts[index], 1), 2)])
+
+    header, survivals = survival_rows(batch[0][1], counts, survival)
+
+    for index, output in enumerate(samples):
+        io = cl.add_stat_section(dict(), 'Batched Trimming',
+                                 ['Filename', 'Batch', 'Reads', 'Output Reads',
+                                  'Output Percentage'],
+                                 rows[index])
+        if 'trimmed' in survival :
+            io = cl.add_stat_section(io, 'Trimming Survival', header,
+                                     [survivals[index]])
+        cl.write_stat_file([], {'output': output}, io)
+
+        ss.mark_done(output, cmd, seconds)
+
+
+
+# RUN BATCHES ------------------------------------------------------------------
+
+def run_batches(script, param, samples, size=SIZE, task=None):
+    """
+    Function that runs the share of the samples of this array task in batches
+    of at most 'size' samples : one premseq run per batch, in
+    '<output>/<batch>/', demultiplexed into '<output>/<sample>/'. Samples
+    whose marker file exists are not run again. The samples of a batch have
+    the same layout and phred offset.
+
+    Takes five arguments :
+        - script [string] : path to premseq.py
+        - param [dict] : dictionnary containing all parameters
+        - samples [list] : list of (name, layout, files)
+        - size [integer] : maximal number of samples in a batch
+        - task [string] : value of the '--task' option or None
+
+    Returns anything.
+    """
+
+    if (size < 1):
+        sys.exit("/!\ Number of samples in a batch must be a positive integer.")
+
+    index, number = ss.get_task(task)
+    share = ss.split_samples(samples, number)[index]
+
+    todo = [sample for sample in share
+            if not os.path.isfile("{0}/{1}/{2}".format(param['output'],
+                                                       sample[0],
+                                                       ss.DONE_MARKER))]
+
+    batches = make_batches(todo, size, param.get('phred'))
+
+    options = ss.sample_options(sys.argv[1:])
+    scratch = param['scratch'] if param.get('scratch') != None \
+              else param['output']
+    failed = []
+
+    print "Array task {0}/{1} : {2} sample(s), {3} already done, {4} " \
+          "batch(es)".format(index + 1, number, len(share),
+                             len(share) - len(todo), len(batches))
+
+    for nb, batch in enumerate(batches, 1):
+        name = "psbatch{0}_{1}".format(index + 1, nb)
+        layout = batch[0][1]
+
+        start = time.time()
+        files, counts = concatenate(batch, name, scratch)
+        prefixes = [ce.get_file_prefix(filename) for filename in files]
+
+        # singletons are needed to count the survival of each sample
+        batch_options = options
+        if (layout == 'PE' and param.get('keep_singleton') == None):
+            batch_options = options + ['-keep-singleton']
+
+        cmd, output = ss.sample_command(script, param, name, layout, files,
+                                        batch_options)
+        status = subprocess.call(cmd)
+
+        for filename in files:
+            os.remove(filename)
+
+        if (status != 0):
+            print "  {0} ({1} samples) : failed".format(name, len(batch))
+            failed += [sample[0] for sample in batch]
+            continue
+
+        split_batch(param, batch, output, prefixes, counts, cmd,
+                    time.time() - start)
+
+        print "  {0} ({1} samples) : done in {2:.1f} s".format(
+            name, len(batch), time.time() - start)
+
+    if failed :
+        sys.exit("/!\ Sample(s) failed : {0}".format(', '.join(failed)))
@@ -16,6 +16,11 @@ __date__ = "2015/07"
 import xml.etree.ElementTree as ET
 import sys
 import os.path
+from distutils.spawn import find_executable
+
+
+# usual compression ratio of FASTQ files for each format
+RATIOS = {'.gz': 4.0, '.bz2': 5.0, '.zst': 4.0}
 
 #-------------------------- FUNCTIONS DEFINITION ------------------------------#
 
@@ -362,12 +367,13 @@ def check_xml_file(text):
 
 
 
-def check_output_dir(text):
+def check_output_dir(text, create=True):
     """
     Function that check that a output directory is given, that it exists, if not
-    create it
+    create it (unless 'create' is False, for the plan of a run)
 
-    Takes one argument : text [string] : path to the directory
+    Takes two arguments : - text [string] : path to the directory
+                          - create [boolean] : create the directory if needed
 
     Returns one argument : text [string] : clean directory path
     """
@@ -383,10 +389,167 @@ def check_output_dir(text):
             clean_text = clean_text[:-1]
 
         # if the directory did not exist create it
-        if not (os.path.isdir(clean_text)):
+        if create and not (os.path.isdir(clean_text)):
             os.mkdir(clean_text)
         
         return clean_text
 
     sys.exit("/!\ You must enter a 'output-directory' where the new output will\
  be written")
+
+
+
+def check_compression(text):
+    """
+    Function that check the compression format of final outputs and its
+    optional level, given as '<format>[:<level>]'. Formats are gzip (gz),
+    bzip2 (bz2) and zstd (zst), with or without the dot.
+
+    Takes one argument : text [string]
+
+    Returns two arguments :
+        - suffix [string] : '.gz', '.bz2' or '.zst'
+        - level [integer] : compression level, or None for the default level
+        - or quit, if not conform
+    """
+
+    # maximal level of each format
+    levels = {'.gz': 9, '.bz2': 9, '.zst': 19}
+
+    if empty(text):
+        sys.exit("/!\ You haven't enter a compression format.")
+
+    values = text.strip().lower().split(':')
+
+    # add the dot if missing
+    suffix = values[0] if values[0].startswith('.') else '.' + values[0]
+
+    if not suffix in levels :
+        sys.exit("/!\ Compression format can only be 'gz', 'bz2' or 'zst'.")
+
+    if (suffix == '.zst' and find_executable('zstd') == None):
+        sys.exit("/!\ The 'zstd' program is needed to compress in zstd.")
+
+    if (len(values) == 1):
+        return suffix, None
+
+    if (len(values) > 2 or not values[1].isdigit() or 
+        not 1 <= int(values[1]) <= levels[suffix]):
+        sys.exit("/!\ Compression level of '{0}' must be an integer between 1 \
+and {1}.".format(suffix, levels[suffix]))
+
+    return suffix, int(values[1])
+
+
+
+def estimate_space(param):
+    """
+    Function that estimates the disk space needed by a run in the scratch
+    directory (intermediate files) and in the output directory (final 
+    outputs), from the size of input files and the compression.
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns two arguments :
+        - scratch [integer] : bytes needed in the scratch directory
+        - output [integer] : bytes needed in the output directory
+    """
+
+    inputs = list(param['input'])
+    if param['layout'] == 'SE' :
+        inputs = inputs[:1]
+
+    # uncompressed size of reads
+    size = 0.0
+    for filename in inputs:
+        ext = os.path.splitext(filename)[1]
+        size += os.path.getsize(filename) * RATIOS.get(ext, 1.0)
+
+    scratch = 0.0
+    output = 0.0
+
+    # step 1 outputs are kept uncompressed until the end of step 2
+    if 'illuminaclip' in param and 'quality' in param :
+        scratch += size
+
+    # poly-X trimmed reads too
+    if 'polyx' in param :
+        scratch += size
+
+    # kept singleton reads (at most one tenth of reads), the other ones are
+    # sent to the null device
+    if param['layout'] == 'PE' and 'keep_singleton' in param :
+        output += size * 0.1
+
+    # trimmed reads are written uncompressed before being compressed, unless
+    # Trimmomatic compresses them
+    if 'compress' in param :
+        compressed = size / RATIOS[param['compress']]
+        if 'compress_level' in param or param['compress'] == '.zst' :
+            output += size + compressed
+        else :
+            output += compressed
+    else :
+        output += size
+
+    # normalized reads
+    if 'normalize' in param :
+        output += output
+
+    # FastQC reports
+    if 'fastqc' in param :
+        scratch += 50 * 1024 * 1024
+
+    return int(scratch), int(output)
+
+
+
+def free_space(directory):
+    """
+    Function that gives the available disk space of a directory, or of its
+    nearest existing parent if it is not created yet (plan of a run).
+
+    Takes one argument : directory [string]
+
+    Returns one argument : space [integer] : available bytes
+    """
+
+    directory = os.path.abspath(directory)
+    while not os.path.isdir(directory):
+        directory = os.path.dirname(directory)
+
+    stat = os.statvfs(directory)
+
+    return stat.f_bavail * stat.f_frsize
+
+
+
+def check_disk_space(param):
+    """
+    Function that check that the scratch and output directories have enough
+    disk space for the run, before starting it.
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns one argument :
+        - 1 [integer] : if there is enough space
+        - or quit, if not
+    """
+
+    scratch, output = estimate_space(param)
+
+    # both directories on the same file system share the space
+    if os.stat(param['scratch']).st_dev == os.stat(param['output']).st_dev :
+        needs = [(param['output'], scratch + output)]
+    else :
+        needs = [(param['scratch'], scratch), (param['output'], output)]
+
+    for directory, need in needs :
+        available = free_space(directory)
+
+        if need > available :
+            sys.exit("/!\ Not enough disk space in '{0}' : about {1:.1f} GB \
+needed, {2:.1f} GB available.".format(directory, need / 1024.0 ** 3, 
+                                      available / 1024.0 ** 3))
+
+    return 1
@@ -5,7 +5,8 @@
 commandline.py : module containing all functions to generate command line for
                  Trimmomatic and FastQC.
 
-Dependency : check_entries (personal module)
+Dependency : check_entries, compression, governor, jvm, sinks (personal
+             modules)
 """
 
 __author__ = "Anita Annamalé"
@@ -20,9 +21,14 @@ __date__ = "2015/07"
 import os
 import os.path
 import re
+import shutil
 
-# Personal module
+# Personal modules
 import check_entries as ce
+import compression as cp
+import governor as gv
+import jvm as jv
+import sinks as sk
 
 #-------------------------- FUNCTIONS DEFINITION ------------------------------#
 
@@ -46,21 +52,53 @@ def commandline_input_output(param, cmd, nb, inout):
         - inout [dict] : with new files names
     """
     
+    # step 1 outputs are only intermediate files if step 2 follows, they are
+    # never compressed
+    final = not (nb == 0 and 'illuminaclip' in param and 'quality' in param)
+    suffix = cp.trimmomatic_suffix(param, final)
+
+    # final outputs are written in the output directory, intermediate files
+    # and singletons which are not kept in the scratch directory
+    if final :
+        trimmed_dir = param['output']
+    else :
+        trimmed_dir = param['scratch']
+
+    if final and 'keep_singleton' in param :
+        single_dir = param['output']
+    else :
+        single_dir = param['scratch']
+
+    # number of threads fitting in the memory budget
+    threads = gv.trimmomatic_resources(param)[0]
+
+    # log of every read, read by the survival monitor
+    trimlog = ''
+    if 'min_survival' in param :
+        trimlog = ' -trimlog {0}'.format(sk.get_sink(param, inout, 'trimlog',
+                                          "{0}/trimlog_{1}.txt".format(
+                                              param['scratch'], nb)))
+
+
     # SINGLE-END DATA ----------------------------------------------------------
 
     if(param['layout'] == 'SE'):
         cmd += ' SE'
-        cmd += ' -threads {0}'.format(param['threads'])
+        cmd += ' -threads {0}'.format(threads)
+        cmd += trimlog
         
         # Creating output filename(s) ------------------------------------------
     
         # get input file prefix to create new filename(s)
         prefix = ce.get_file_prefix(param['input'][0])
-        trimmed = "{0}/trimmed_{1}.fastq".format(param['output'],prefix)
+        trimmed = "{0}/trimmed_{1}.fastq".format(trimmed_dir,prefix)
         
-        # add the compression format if choosen
-        if 'compress' in param :
-            trimmed += "{0}".format(param['compress'])
+        # add the compression format if Trimmomatic compresses the file
+        trimmed += suffix
+
+        # final output can be sent to another sink than a file
+        if final :
+            trimmed = sk.get_sink(param, inout, 'trimmed', trimmed)
         
 
         # Generation of commandline --------------------------------------------
@@ -76,13 +114,15 @@ def commandline_input_output(param, cmd, nb, inout):
         # else step 2 input files are the output files of step 1
         elif (nb == 1):
             cmd += ' {0} {1}'.format(inout['tmp'], trimmed)
+
+            inout['trimmed'] = trimmed
         
     
     # PAIRED-END DATA ----------------------------------------------------------
 
     elif(param['layout'] == 'PE') :
         cmd += ' PE'
-        cmd += ' -threads {0} '.format(param['threads'])
+        cmd += ' -threads {0}{1} '.format(threads, trimlog)
         
         # Creating output filename(s) ------------------------------------------
 
@@ -90,20 +130,28 @@ def commandline_input_output(param, cmd, nb, inout):
         prefix_1 = ce.get_file_prefix(param['input'][0])
         prefix_2 = ce.get_file_prefix(param['input'][1])
         
-        trimmed_1 = "{0}/trimmed_{1}.fastq".format(param['output'],prefix_1)
-        trimmed_2 = "{0}/trimmed_{1}.fastq".format(param['output'],prefix_2)
+        trimmed_1 = "{0}/trimmed_{1}.fastq".format(trimmed_dir,prefix_1)
+        trimmed_2 = "{0}/trimmed_{1}.fastq".format(trimmed_dir,prefix_2)
         
-        single_1 = "{0}/single_{1}.fastq".format(param['output'],prefix_1)
-        single_2 = "{0}/single_{1}.fastq".format(param['output'],prefix_2)
+        single_1 = "{0}/single_{1}.fastq".format(single_dir,prefix_1)
+        single_2 = "{0}/single_{1}.fastq".format(single_dir,prefix_2)
         
         
-        # add the compression format if choosen
-        if 'compress' in param :
-            
-            trimmed_1 += "{0}".format(param['compress'])
-            trimmed_2 += "{0}".format(param['compress'])
-            single_1 += "{0}".format(param['compress'])
-            single_2 += "{0}".format(param['compress'])
+        # add the compression format if Trimmomatic compresses the files
+        trimmed_1 += suffix
+        trimmed_2 += suffix
+        single_1 += suffix
+        single_2 += suffix
+
+        # outputs nobody asked for (step 1 singletons, singletons which are
+        # not kept) are sent to the null device and never written
+        single_role = 'single' if final else 'step1_single'
+        single_1 = sk.get_sink(param, inout, single_role, single_1)
+        single_2 = sk.get_sink(param, inout, single_role, single_2)
+
+        if final :
+            trimmed_1 = sk.get_sink(param, inout, 'trimmed', trimmed_1)
+            trimmed_2 = sk.get_sink(param, inout, 'trimmed', trimmed_2)
             
         
         # Generation of commandline --------------------------------------------
@@ -127,11 +175,35 @@ def commandline_input_output(param, cmd, nb, inout):
                                                     inout['tmp'][1],
                                                     trimmed_1, single_1,
                                                     trimmed_2, single_2)
+
+            inout['trimmed'] = trimmed_1, trimmed_2
+            inout['single'] = single_1, single_2
             
     return cmd,inout
 
 
 
+def temporary_names(param):
+    """
+    Function that gives the names of the temporary files which step 1 outputs
+    become before step 2 (intermediate files are never compressed).
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns one argument :
+        tmp [string or tuple] : temporary filename (SE) or filenames (PE)
+    """
+
+    if(param['layout'] == 'SE'):
+        return '{0}/tmp{1}.fastq'.format(param['scratch'],
+                                         ce.get_file_prefix(param['input'][0]))
+
+    return tuple(['{0}/tmp{1}.fastq'.format(param['scratch'],
+                                            ce.get_file_prefix(filename))
+                  for filename in param['input'][:2]])
+
+
+
 def change_output_as_input(inout, param):
     """
     Function that change step1 output files into step2 input files.
@@ -144,67 +216,22 @@ def change_output_as_input(inout, param):
     Returns one argument:
         inout [dict] : containing the new files names
     """
-        
-    # SINGLE-END ---------------------------------------------------------------
 
-    if(param['layout'] == 'SE'):
-        
-        # Creating temporary filename(s) ---------------------------------------
-        
-        # get the prefix of the file
-        filename = ce.get_file_prefix(param['input'][0])
-        
-        # new temporary filename
-        tmp = '{0}/tmp{1}.fastq'.format(param['output'], filename)
-    
-        if 'compress' in param:
-            tmp += '{0}'.format(param['compress'])
+    tmp = temporary_names(param)
         
 
-        # Rename step 1 trimming file in temporary -----------------------------
+    # Rename step 1 trimming file in temporary ---------------------------------
 
+    if(param['layout'] == 'SE'):
         os.rename(inout['trimmed'], tmp)
-        
-
-        # Add the temporary file in io -----------------------------------------
-        
-        inout['tmp'] = tmp
-        
-        
-    # PAIRED-END ---------------------------------------------------------------
     else :
-        
-        # Creating temporary filename(s) ---------------------------------------
-
-        # get the prefix of files
-        filename_1 = ce.get_file_prefix(param['input'][0])
-        filename_2 = ce.get_file_prefix(param['input'][1])
-        
-        # new temporary filenames
-        tmp_1 = '{0}/tmp{1}.fastq'.format(param['output'],filename_1)
-        tmp_2 = '{0}/tmp{1}.fastq'.format(param['output'],filename_2)
-        
-        if 'compress' in param:
-            tmp_1 += '.{0}'.format(param['compress'])
-            tmp_2 += '.{0}'.format(param['compress'])
-        
-
-        # Rename step 1 trimming file in temporary -----------------------------
-        
-        os.rename(inout['trimmed'][0], tmp_1)
-        os.rename(inout['trimmed'][1], tmp_2)
+        os.rename(inout['trimmed'][0], tmp[0])
+        os.rename(inout['trimmed'][1], tmp[1])
         
 
-        # Add the temporary file in io -----------------------------------------
-        
-        inout['tmp'] = tmp_1, tmp_2
+    # Add the temporary file in io ---------------------------------------------
         
-
-        # Delete step1 singleton read files ------------------------------------
-
-        os.remove(inout['single'][0])
-        os.remove(inout['single'][1])
-    
+    inout['tmp'] = tmp
 
     return inout    
 
@@ -214,7 +241,8 @@ def change_output_as_input(inout, param):
 
 def commandline_fastqc(loc, param, inout):
     """
-    Function that generate commandline for FastQC
+    Function that generate commandline for FastQC, launched directly (as its
+    script would launch it) from the jar of its classes.
     
     Takes three arguments :
         - loc [string] : path where Fastqc program is located
@@ -224,30 +252,34 @@ def commandline_fastqc(loc, param, inout):
     Returns one argument :
         - cmd [string] : the commandline for fastqc
     """
-    
-    os.mkdir('{0}/Fastqc'.format(param['output']))
 
+    # check raw and trimmed reads quality
     if param['layout']=='SE':
-        cmd = '{0}Utils/FastQC/fastqc {1} {2} \
---outdir {3}/Fastqc \
---quiet \
---extract'.format(loc[:-3], 
-                  inout['input'][0], 
-                  inout['trimmed'], 
-                  param['output'])
+        files = [inout['input'][0], inout['trimmed']]
+    else :
+        files = list(inout['input'][:2]) + list(inout['trimmed'])
 
+    # number of threads and heap fitting in the memory budget (250 MB by
+    # default, as the fastqc script sets it)
+    threads, heap = gv.fastqc_resources(param, len(files))
+
+    # FastQC works in the scratch directory (created by the caller)
+    cmd = 'java {0}{1}-cp {2} \
+-Dfastqc.output_dir={3}/Fastqc \
+-Dfastqc.quiet=true \
+-Dfastqc.unzip=true \
+-Djava.awt.headless=true'.format(gv.java_options(heap or gv.FASTQC_THREAD),
+                                 jv.jvm_options(loc, param,
+                                                'fastqc-' + jv.FASTQC_VERSION),
+                                 ':'.join(jv.fastqc_classpath(
+                                     loc, 'dry_run' in param)),
+                                 param['scratch'])
+
+    if threads is not None :
+        cmd += ' -Dfastqc.threads={0}'.format(threads)
+
+    cmd += ' {0} {1}'.format(jv.FASTQC_MAIN, ' '.join(files))
 
-    else :
-        # check raw and trimmed reads quality
-        cmd = '{0}Utils/FastQC/fastqc {1} {2} {3} {4} \
---outdir {5}/Fastqc \
---quiet \
---extract'.format(loc[:-3], 
-                  inout['input'][0], 
-                  inout['input'][1], 
-                  inout['trimmed'][0], 
-                  inout['trimmed'][1], 
-                  param['output'])
     return cmd
 
 
@@ -273,8 +305,8 @@ def clean_fastqc_output(param,readfile):
     file_1 = ce.get_file_prefix(readfile)
     
     # delete
-    os.remove('{0}/Fastqc/{1}_fastqc.zip'.format(param['output'], file_1))
-    os.chdir('{0}/Fastqc/{1}_fastqc'.format(param['output'], file_1))
+    os.remove('{0}/Fastqc/{1}_fastqc.zip'.format(param['scratch'], file_1))
+    os.chdir('{0}/Fastqc/{1}_fastqc'.format(param['scratch'], file_1))
     os.system('mv ../{0}_fastqc.html .'.format(file_1))
     os.system('rm -r fastqc_report.html fastqc.fo summary.txt Icons')
 
@@ -321,27 +353,85 @@ def clean_fastqc_output(param,readfile):
     return file1
 
 
-def write_stat_file(dico,param):
+def move_fastqc_output(param):
+    """
+    Function that moves FastQC reports from the scratch directory to the 
+    output directory.
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns anything.
+    """
+
+    scratch = '{0}/Fastqc'.format(param['scratch'])
+    output = '{0}/Fastqc'.format(param['output'])
+
+    if os.path.abspath(scratch) == os.path.abspath(output):
+        return
+
+    if not os.path.isdir(output):
+        os.mkdir(output)
+
+    for report in os.listdir(scratch):
+        shutil.move('{0}/{1}'.format(scratch, report), output)
+
+    os.rmdir(scratch)
+
+
+
+def add_stat_section(inout, title, header, rows):
+    """
+    Function that adds a section to the statistic file.
+
+    Takes four arguments :
+        - inout [dict] : dictionnary containing all generated filenames
+        - title [string] : title of the section
+        - header [list] : names of the columns
+        - rows [list] : list of rows (lists of values)
+
+    Returns inout [dict] with the new section
+    """
+
+    if not 'stats' in inout:
+        inout['stats'] = []
+
+    inout['stats'].append((title, header, rows))
+
+    return inout
+
+
+
+def write_stat_file(dico,param,inout):
     """
     Function that write a file containing statistic of reads before and after 
     trimming.
 
-    Takes two arguments :
+    Takes three arguments :
         - dico [dict] : dictionnary containing quality control informations
         - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames and 
+                         the other sections of the statistic file
 
     Returns anything.
     """
 
     with open("{0}/statistic.txt".format(param['output']), "wt") as f:
-        f.write("##FastQC    0.11.3\n")
-        f.write("Filename\tEncoding\tTotal Sequences\tSequence Length\tGC Percentage\n")
-        for files in dico :
-            f.write( "{0}\t{1}\t{2}\t{3}\t{4}\n".format(files['filename'], 
-                                                        files['encoding'], 
-                                                        files['total_sequence'],
-                                                        files['sequence_length'],
-                                                        files['GC_perc']))
+        if dico :
+            f.write("##FastQC    0.11.3\n")
+            f.write("Filename\tEncoding\tTotal Sequences\tSequence Length\tGC Percentage\n")
+            for files in dico :
+                f.write( "{0}\t{1}\t{2}\t{3}\t{4}\n".format(files['filename'], 
+                                                            files['encoding'], 
+                                                            files['total_sequence'],
+                                                            files['sequence_length'],
+                                                            files['GC_perc']))
+
+        # other sections (normalization, ...)
+        for title, header, rows in inout.get('stats', []) :
+            f.write("##{0}\n".format(title))
+            f.write("\t".join(header) + "\n")
+            for row in rows :
+                f.write("\t".join([str(value) for value in row]) + "\n")
 
 
 
@@ -363,7 +453,9 @@ def commandline_step_1(loc,param, nb,inout):
     """
     
     # base command line
-    cmd = 'java -jar {0}/Utils/trimmomatic-0.33.jar'.format(loc[:-3])
+    cmd = 'java {0}{1}-jar {2}'.format(
+        gv.java_options(gv.trimmomatic_resources(param)[1]),
+        jv.jvm_options(loc, param, 'trimmomatic-0.33'), jv.trimmomatic_jar(loc))
     
     # adding input and output filename
     cmd, inout = commandline_input_output(param, cmd, nb, inout)
@@ -398,7 +490,9 @@ def commandline_step_2(loc,param, nb, inout):
     """
     
     # base command line
-    cmd = 'java -jar {0}Utils/trimmomatic-0.33.jar'.format(loc[:-3])
+    cmd = 'java {0}{1}-jar {2}'.format(
+        gv.java_options(gv.trimmomatic_resources(param)[1]),
+        jv.jvm_options(loc, param, 'trimmomatic-0.33'), jv.trimmomatic_jar(loc))
     
     # adding input and output filename
     cmd, inout = commandline_input_output(param,cmd,nb,inout)
@@ -0,0 +1,199 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+compression.py : module containing the compression policy of PREMSEQ.
+                 Intermediate files are never compressed. Final outputs are
+                 compressed by Trimmomatic when it can do it (gzip or bzip2 at
+                 its default level), and by PREMSEQ at the end of the run
+                 otherwise (choosen level, or zstd). Qualities of outputs
+                 written by Trimmomatic, and of the files made from them, are
+                 binned in the same final pass. The statistic file gives the
+                 final names of the outputs.
+
+Dependency : fastq, trimmer (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import itertools
+import os
+import shutil
+
+# Personal modules
+import fastq as fq
+import trimmer as tr
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def trimmomatic_suffix(param, final=True):
+    """
+    Function that gives the compression suffix of a file written by
+    Trimmomatic. Trimmomatic only compresses final outputs, and only in gzip
+    or bzip2 at their default level.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - final [boolean] : if the file is a final output
+
+    Returns one argument : suffix [string] : '.gz', '.bz2' or ''
+    """
+
+    if not final or not 'compress' in param :
+        return ''
+
+    # qualities are binned while compressing at the end of the run
+    if 'binquality' in param :
+        return ''
+
+    if 'compress_level' in param or param['compress'] == '.zst' :
+        return ''
+
+    return param['compress']
+
+
+
+def compress_file(filename, param, table=None):
+    """
+    Function that compresses a final output file with the choosen format and
+    level, and/or bins its qualities, and deletes the original file. A file
+    which is already compressed in the choosen format (normalized reads) is
+    only binned.
+
+    Takes three arguments :
+        - filename [string] : the output file
+        - param [dict] : dictionnary containing all parameters
+        - table [string] : quality binning table, or None
+
+    Returns one argument : compressed [string] : the new file
+    """
+
+    compressed = filename
+    if 'compress' in param and not filename.endswith(param['compress']):
+        compressed = filename + param['compress']
+
+    # a file binned without changing its name is written next to it first
+    target_name = compressed
+    if (compressed == filename):
+        target_name = os.path.join(os.path.dirname(filename),
+                                   'binned_' + os.path.basename(filename))
+
+    source = fq.open_fastq(filename)
+    target = fq.open_fastq(target_name, 'w', param.get('compress_level'))
+
+    if table is None:
+        shutil.copyfileobj(source, target, 1 << 20)
+    else:
+        # the fourth line of each record is the quality
+        for lines in iter(lambda: list(itertools.islice(source, 40000)), []):
+            lines[3::4] = [line.translate(table) for line in lines[3::4]]
+            target.write(''.join(lines))
+
+    source.close()
+    target.close()
+
+    os.remove(filename)
+
+    if (target_name != compressed):
+        os.rename(target_name, compressed)
+
+    return compressed
+
+
+
+def compress_outputs(inout, param, offset):
+    """
+    Function that compresses the final outputs (trimmed, singleton, merged,
+    contaminant and normalized reads) which haven't been compressed when they
+    were written, and bins their qualities if the trimmed reads have been
+    written by Trimmomatic (the other outputs are made from them). Sections of
+    the statistic file give then the new names.
+
+    Takes three arguments :
+        - inout [dict] : dictionnary containing all generated filenames
+        - param [dict] : dictionnary containing all parameters
+        - offset [integer] : phred offset of the outputs (needed to bin them)
+
+    Returns inout [dict] with the compressed filenames
+    """
+
+    # qualities written natively have already been binned
+    binning = 'binquality' in param and not 'binned' in inout
+
+    if not 'compress' in param and not binning :
+        return inout
+
+    # qualities of all outputs have the offset of the trimmed reads
+    table = binning_table(param, offset) if binning else None
+    renamed = dict()
+
+    for key in ['trimmed', 'single', 'merged', 'contaminant', 'normalized']:
+
+        if not key in inout :
+            continue
+
+        # SE trimmed file is a string, PE files are tuples
+        files = inout[key]
+        single = isinstance(files, str)
+        if single :
+            files = [files]
+
+        names = files
+        files = [filename if not os.path.isfile(filename) or
+                             (filename.endswith(param.get('compress', '')) and
+                              not binning)
+                 else compress_file(filename, param, table)
+                 for filename in names]
+
+        renamed.update(zip(names, files))
+
+        inout[key] = files[0] if single else tuple(files)
+
+    if 'stats' in inout :
+        inout['stats'] = [(title, header, [rename_cells(row, renamed)
+                                           for row in rows])
+                          for title, header, rows in inout['stats']]
+
+    return inout
+
+
+
+def rename_cells(row, renamed):
+    """
+    Function that replaces the names of compressed outputs by their new names
+    in a row of the statistic file (a cell can hold several names, separated
+    by spaces).
+
+    Takes two arguments : - row [list] : values of the row
+                          - renamed [dict] : new name of each compressed file
+
+    Returns one argument : row [list] : the row with the new names
+    """
+
+    return [' '.join([renamed.get(word, word) for word in value.split(' ')])
+            if isinstance(value, str) else value
+            for value in row]
+
+
+
+def binning_table(param, offset):
+    """
+    Function that creates the quality binning table of the outputs written by
+    Trimmomatic. Their qualities have already been re-encoded by Trimmomatic :
+    the offset is the one of the run (TOPHRED33/64, or the offset of the raw
+    inputs), never guessed from an output.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - offset [integer] : phred offset of the outputs
+
+    Returns one argument : table [string] : translation table
+    """
+
+    return tr.phred_table({'binquality': param['binquality']}, offset)
@@ -0,0 +1,268 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+fastq.py : module containing all functions to read and write FASTQ files
+           (plain, gzip, bzip2 or zstd compressed) for the native steps of 
+           PREMSEQ.
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import bz2
+import gzip
+import io
+import os.path
+import subprocess
+import sys
+
+
+# default compression level of each format
+LEVELS = {'.gz': 6, '.bz2': 9, '.zst': 3}
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class CommandWriter(object):
+    """
+    File-like object writing in the standard input of a command (used to
+    compress in zstd with the 'zstd' program).
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                        bufsize=1 << 20)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0 :
+            sys.exit("/!\ Command '{0}' failed".format(' '.join(self.args)))
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# OPEN FILES -------------------------------------------------------------------
+
+def open_fastq(filename, mode='r', level=None):
+    """
+    Function that opens a FASTQ file, the compression being auto-detected from
+    the file name (.gz, .bz2, .zst) as Trimmomatic does.
+
+    Takes three arguments :
+        - filename [string] : path to the file
+        - mode [string] : 'r' to read, 'w' to write
+        - level [integer] : compression level used when writing (default level
+                            of the format if None)
+
+    Returns one argument : handle [file] : the opened file
+    """
+
+    ext = os.path.splitext(filename)[1]
+
+    if (mode == 'r'):
+        if (ext == '.gz'):
+            return io.BufferedReader(gzip.open(filename, 'rb'), 1 << 20)
+        if (ext == '.bz2'):
+            return bz2.BZ2File(filename, 'r', 1 << 20)
+        if (ext == '.zst'):
+            return subprocess.Popen(['zstd', '-dcq', filename], bufsize=1 << 20,
+                                    stdout=subprocess.PIPE).stdout
+        return open(filename, 'rb', 1 << 20)
+
+    if level is None:
+        level = LEVELS.get(ext)
+
+    if (ext == '.zst'):
+        return CommandWriter(['zstd', '-qf', '-{0}'.format(level), '-o',
+                              filename])
+    if (ext == '.gz'):
+        return io.BufferedWriter(gzip.open(filename, 'wb', level), 1 << 20)
+    if (ext == '.bz2'):
+        return bz2.BZ2File(filename, 'w', 1 << 20, level)
+    return open(filename, 'wb', 1 << 20)
+
+
+
+# READ RECORDS -----------------------------------------------------------------
+
+def read_records(handle):
+    """
+    Generator that reads the records of a FASTQ file one by one.
+
+    Takes one argument : handle [file] : the opened FASTQ file
+
+    Yields one argument :
+        - record [tuple] : (header, sequence, separator, quality) without the
+                           end of line characters
+    """
+
+    lines = iter(handle)
+
+    for header in lines:
+
+        # skip blank lines at the end of the file
+        if not header.strip():
+            continue
+
+        try:
+            seq = next(lines)
+            plus = next(lines)
+            qual = next(lines)
+        except StopIteration:
+            sys.exit("/!\ FASTQ file ends with an incomplete record ({0})"
+                     .format(header.rstrip()))
+
+        yield (header.rstrip('\r\n'), seq.rstrip('\r\n'),
+               plus.rstrip('\r\n'), qual.rstrip('\r\n'))
+
+
+
+def read_batches(handle, size=10000):
+    """
+    Generator that reads the records of a FASTQ file by batches.
+
+    Takes two arguments :
+        - handle [file] : the opened FASTQ file
+        - size [integer] : number of records in a batch
+
+    Yields one argument : batch [list] : list of records
+    """
+
+    batch = []
+
+    for record in read_records(handle):
+        batch.append(record)
+
+        if (len(batch) == size):
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+
+def read_pairs(handle_1, handle_2):
+    """
+    Generator that reads the records of two FASTQ files (paired-end data)
+    together and checks that the mates are synchronised.
+
+    Takes two arguments : - handle_1 [file] : opened FASTQ file of reads 1
+                          - handle_2 [file] : opened FASTQ file of reads 2
+
+    Yields one argument : pair [tuple] : (record 1, record 2)
+    """
+
+    records_1 = read_records(handle_1)
+    records_2 = read_records(handle_2)
+
+    for record_1 in records_1:
+        record_2 = next(records_2, None)
+
+        if record_2 is None:
+            sys.exit("/!\ Paired-end files do not contain the same number of "
+                     "reads.")
+
+        yield record_1, record_2
+
+    if next(records_2, None) is not None:
+        sys.exit("/!\ Paired-end files do not contain the same number of reads.")
+
+
+
+# WRITE RECORDS ----------------------------------------------------------------
+
+def write_records(handle, records):
+    """
+    Function that writes a list of records in an opened FASTQ file.
+
+    Takes two arguments : - handle [file] : the opened FASTQ file
+                          - records [list] : list of records (tuples)
+
+    Returns anything.
+    """
+
+    handle.write(''.join(['{0}\n{1}\n{2}\n{3}\n'.format(*record)
+                          for record in records]))
+
+
+
+# PHRED ENCODING ---------------------------------------------------------------
+
+def detect_phred(filename, nb_reads=10000):
+    """
+    Function that detects the phred offset of a FASTQ file from the quality
+    characters of its first reads (as Trimmomatic does).
+
+    Takes two arguments : - filename [string] : the FASTQ file
+                          - nb_reads [integer] : number of reads to look at
+
+    Returns one argument : offset [integer] : 33 or 64
+    """
+
+    lowest = 127
+
+    handle = open_fastq(filename)
+    for nb, record in enumerate(read_records(handle)):
+        if (nb == nb_reads):
+            break
+        if record[3]:
+            lowest = min(lowest, ord(min(record[3])))
+    handle.close()
+
+    # phred 64 qualities never go below '@' (except 'B' used for Q2 by Illumina)
+    if (lowest < 59):
+        return 33
+
+    return 64
+
+
+
+def get_phred(param, filename):
+    """
+    Function that gets the phred offset of reads, either given by the user or
+    detected from the file.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - filename [string] : the FASTQ file
+
+    Returns one argument : offset [integer] : 33 or 64
+    """
+
+    if 'phred' in param :
+        return param['phred']
+
+    return detect_phred(filename)
+
+
+
+def get_output_phred(param, filename):
+    """
+    Function that gets the phred offset of trimmed reads, which have been
+    re-encoded if TOPHRED33 or TOPHRED64 is choosen.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - filename [string] : the trimmed FASTQ file
+
+    Returns one argument : offset [integer] : 33 or 64
+    """
+
+    if 'tophred33' in param :
+        return 33
+
+    if 'tophred64' in param :
+        return 64
+
+    return get_phred(param, filename)
@@ -0,0 +1,247 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+governor.py : module containing all functions to share a memory budget between
+              the Java programs (Trimmomatic and FastQC) of all premseq jobs
+              running on a node. The heap (-Xmx) and the number of threads of
+              each program are sized to fit in the budget, and every program
+              reserves its memory in a ledger file shared by the jobs of the
+              node before starting : if the budget is exhausted, the job waits
+              until other jobs release their memory.
+
+Dependency : none
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import contextlib
+import errno
+import fcntl
+import os
+import sys
+import tempfile
+import time
+
+
+# ledger of the memory reserved by the running jobs of the node ('pid MB' lines)
+LEDGER = os.path.join(tempfile.gettempdir(), 'premseq_memory.ledger')
+
+# memory of a JVM outside of its heap (metaspace, thread stacks, code cache) MB
+JVM_OVERHEAD = 128
+
+# heap of Trimmomatic : base, and reads buffered by each thread MB
+TRIMMOMATIC_BASE = 256
+TRIMMOMATIC_THREAD = 128
+
+# heap of FastQC for each thread (as the fastqc script sets it) MB
+FASTQC_THREAD = 250
+
+# seconds between two attempts to reserve memory
+POLL = 5
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# CHECK BUDGET -----------------------------------------------------------------
+
+def check_memory(text):
+    """
+    Function that checks the memory budget, given in MB or with a M or G unit.
+
+    Takes one argument : text [string] : memory budget, ex : 16000, 16G
+
+    Returns one argument : budget [integer] : memory budget in MB
+    """
+
+    text = str(text).strip().upper()
+    unit = 1
+
+    if text.endswith('G'):
+        text, unit = text[:-1], 1024
+    elif text.endswith('M'):
+        text = text[:-1]
+
+    try:
+        budget = int(float(text) * unit)
+    except ValueError:
+        sys.exit("/!\ Memory budget must be given in MB or with a unit, "
+                 "ex : 16000 or 16G")
+
+    minimum = TRIMMOMATIC_BASE + TRIMMOMATIC_THREAD + JVM_OVERHEAD
+    if (budget < minimum):
+        sys.exit("/!\ Memory budget must be at least {0} MB.".format(minimum))
+
+    return budget
+
+
+
+# SIZE PROGRAMS ----------------------------------------------------------------
+
+def trimmomatic_resources(param):
+    """
+    Function that gives the number of threads and the heap of Trimmomatic : as
+    many threads as asked, but not more than the budget allows.
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns two arguments : - threads [integer] : number of threads
+                            - heap [integer] : heap in MB, or None without budget
+    """
+
+    threads = int(param['threads'])
+
+    if not 'memory' in param :
+        return threads, None
+
+    available = param['memory'] - JVM_OVERHEAD - TRIMMOMATIC_BASE
+    threads = max(1, min(threads, available // TRIMMOMATIC_THREAD))
+
+    return threads, TRIMMOMATIC_BASE + TRIMMOMATIC_THREAD * threads
+
+
+
+def fastqc_resources(param, nb_files):
+    """
+    Function that gives the number of threads and the heap of FastQC : one
+    thread per file, but not more than asked nor than the budget allows.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - nb_files [integer] : number of files to control
+
+    Returns two arguments : - threads [integer] : number of threads
+                            - heap [integer] : heap in MB, or None without budget
+    """
+
+    if not 'memory' in param :
+        return None, None
+
+    available = (param['memory'] - JVM_OVERHEAD) // FASTQC_THREAD
+    threads = max(1, min(int(param['threads']), nb_files, available))
+
+    return threads, FASTQC_THREAD * threads
+
+
+
+def java_options(heap):
+    """
+    Function that gives the options of the JVM for a heap.
+
+    Takes one argument : heap [integer] : heap in MB, or None
+
+    Returns one argument : options [string] : '-Xmx' option, or ''
+    """
+
+    if heap is None:
+        return ''
+
+    return '-Xmx{0}m -Xms{0}m '.format(heap)
+
+
+
+# LEDGER -----------------------------------------------------------------------
+
+def alive(pid):
+    """
+    Function that checks if a process is running.
+
+    Takes one argument : pid [integer] : process identifier
+
+    Returns one argument : [boolean]
+    """
+
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+
+    return True
+
+
+
+def update_ledger(function):
+    """
+    Function that reads the reservations of the ledger (without the ones of
+    finished jobs), changes them and writes them back, the ledger being locked
+    for the jobs of the node.
+
+    Takes one argument :
+        function [function] : takes and returns the reservations [dict] (MB
+                              reserved by pid), and a result
+
+    Returns the result of 'function'.
+    """
+
+    descriptor = os.open(LEDGER, os.O_RDWR | os.O_CREAT, 0666)
+
+    with os.fdopen(descriptor, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+        reserved = dict()
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2 and alive(int(fields[0])):
+                reserved[int(fields[0])] = int(fields[1])
+
+        reserved, result = function(reserved)
+
+        f.seek(0)
+        f.truncate()
+        for pid, size in reserved.items():
+            f.write("{0}\t{1}\n".format(pid, size))
+        f.flush()
+
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+    return result
+
+
+
+@contextlib.contextmanager
+def reservation(param, heap):
+    """
+    Context in which a Java program can run : its memory (heap and JVM
+    overhead) is reserved in the ledger, waiting until the budget allows it,
+    and released at the end. Without budget, nothing is reserved.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - heap [integer] : heap of the program in MB, or None
+    """
+
+    if not 'memory' in param or heap is None:
+        yield
+        return
+
+    size = heap + JVM_OVERHEAD
+    pid = os.getpid()
+
+    def reserve(reserved):
+        used = sum(reserved.values())
+        if (used + size <= param['memory']):
+            reserved[pid] = size
+            return reserved, None
+        return reserved, used
+
+    used = update_ledger(reserve)
+    if used is not None:
+        print "Waiting for {0} MB of memory ({1} MB of {2} MB used) ..." \
+              .format(size, used, param['memory'])
+        while used is not None:
+            time.sleep(POLL)
+            used = update_ledger(reserve)
+
+    def release(reserved):
+        reserved.pop(pid, None)
+        return reserved, None
+
+    try:
+        yield
+    finally:
+        update_ledger(release)
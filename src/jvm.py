@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+jvm.py : module containing all functions to cut the start of the Java programs
+         (Trimmomatic and FastQC). FastQC is launched directly (main class and
+         classpath, without its Perl script), from a jar of its classes built
+         at first use. With Java 13 or newer, the classes loaded by the first
+         run of each program are saved in a class data sharing archive
+         (AppCDS), which the next runs map instead of loading and verifying
+         the classes again. The compiler and the garbage collector are chosen
+         from the size of the inputs.
+
+Dependency : governor (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import glob
+import os
+import re
+import subprocess
+import zipfile
+
+# Personal modules
+import governor as gv
+
+
+# version of FastQC, and its main class
+FASTQC_VERSION = '0.11.3'
+FASTQC_MAIN = 'uk.ac.babraham.FastQC.FastQCApplication'
+
+# classes and resources of FastQC put in its jar, and the jars it needs
+FASTQC_CONTENT = ['uk', 'net', 'org', 'Configuration', 'Templates']
+FASTQC_JARS = ['sam-1.103.jar', 'jbzip2-0.9.jar', 'cisd-jhdf5.jar']
+
+# first version of Java writing an archive at the exit of a program
+DYNAMIC_CDS = 13
+
+# inputs (bytes) below which the JVM is tuned for its start rather than for
+# its throughput (first tier compiler only, serial garbage collector)
+SMALL_INPUT = 32 * 1024 * 1024
+
+# version of java, detected once
+JAVA = {}
+
+# suffix of an archive written at the exit of a program : '.<pid>'
+PID_SUFFIX = re.compile(r"^\.(\d+)$")
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# JAVA -------------------------------------------------------------------------
+
+def java_version():
+    """
+    Function that gives the major version of java (8 for '1.8.0_292', 17 for
+    '17.0.2'), detected once.
+
+    Takes no argument.
+
+    Returns one argument : version [integer] : 0 if it is not known
+    """
+
+    if not 'version' in JAVA :
+        try:
+            process = subprocess.Popen(['java', '-version'],
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+            text = ''.join(process.communicate())
+        except OSError:
+            text = ''
+
+        match = re.search(r'version "(\d+)(?:\.(\d+))?', text)
+        if not match :
+            JAVA['version'] = 0
+        elif (match.group(1) == '1'):
+            JAVA['version'] = int(match.group(2) or 0)
+        else:
+            JAVA['version'] = int(match.group(1))
+
+    return JAVA['version']
+
+
+
+def cache_dir(loc, dry=False):
+    """
+    Function that gives the directory of the FastQC jar and of the archives :
+    'Utils/cds' if it can be written, '~/.cache/premseq' otherwise. It is
+    created if needed, unless for a dry run.
+
+    Takes two arguments :
+        - loc [string] : path where the personal modules are located
+        - dry [boolean] : only give the directory (plan of a run)
+
+    Returns one argument : directory [string]
+    """
+
+    utils = os.path.abspath(loc[:-3] + 'Utils')
+    directory = os.path.join(utils, 'cds')
+
+    if not os.access(utils, os.W_OK) and not os.path.isdir(directory):
+        directory = os.path.expanduser('~/.cache/premseq')
+
+    if not dry and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+    return directory
+
+
+
+# CLASSPATHS -------------------------------------------------------------------
+
+def trimmomatic_jar(loc):
+    """
+    Function that gives the jar of Trimmomatic (an absolute path, the same for
+    every step, as archives are only used with the classpath they were made
+    with).
+
+    Takes one argument : loc [string] : path where the personal modules are
+                                        located
+
+    Returns one argument : jar [string]
+    """
+
+    return os.path.abspath(loc[:-3] + 'Utils/trimmomatic-0.33.jar')
+
+
+
+def fastqc_classpath(loc, dry=False):
+    """
+    Function that gives the classpath of FastQC : the jar of its classes and
+    the jars it needs.
+
+    Takes two arguments :
+        - loc [string] : path where the personal modules are located
+        - dry [boolean] : nothing is created (plan of a run)
+
+    Returns one argument : classpath [list] : list of jars
+    """
+
+    fastqc = os.path.abspath(loc[:-3] + 'Utils/FastQC')
+
+    jar = "{0}/fastqc-{1}.jar".format(cache_dir(loc, dry), FASTQC_VERSION)
+
+    return [jar] + [os.path.join(fastqc, name) for name in FASTQC_JARS
+                    if os.path.isfile(os.path.join(fastqc, name))]
+
+
+
+def build_fastqc_jar(loc):
+    """
+    Function that builds the jar of the classes and resources of FastQC, if it
+    does not exist (archives only keep classes loaded from jars, and FastQC
+    reads its resources from its classpath).
+
+    Takes one argument : loc [string] : path where the personal modules are
+                                        located
+
+    Returns one argument : jar [string]
+    """
+
+    jar = fastqc_classpath(loc)[0]
+
+    if os.path.isfile(jar):
+        return jar
+
+    fastqc = os.path.abspath(loc[:-3] + 'Utils/FastQC')
+
+    # written in a temporary file first, so that concurrent runs never read
+    # an incomplete jar
+    tmp = "{0}.{1}".format(jar, os.getpid())
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as f:
+        f.writestr('META-INF/MANIFEST.MF', "Manifest-Version: 1.0\r\n"
+                   "Main-Class: {0}\r\n\r\n".format(FASTQC_MAIN))
+
+        for content in FASTQC_CONTENT:
+            for root, dirs, files in os.walk(os.path.join(fastqc, content)):
+                dirs.sort()
+                for name in sorted(files):
+                    filename = os.path.join(root, name)
+                    f.write(filename, os.path.relpath(filename, fastqc))
+
+    os.rename(tmp, jar)
+
+    return jar
+
+
+
+# JVM OPTIONS ------------------------------------------------------------------
+
+def promote_archives(archive):
+    """
+    Function that gives its final name to the archive written at the exit of
+    a finished program (of this run, or of a run which is not running
+    anymore), and removes the other archives of finished programs.
+
+    Takes one argument : archive [string] : final name of the archive
+
+    Returns anything.
+    """
+
+    for filename in glob.glob("{0}.*".format(archive)):
+
+        # only '<archive>.<pid>' files (not backups, ...)
+        match = PID_SUFFIX.search(filename[len(archive):])
+        if match is None:
+            continue
+
+        pid = int(match.group(1))
+        if pid == os.getpid() or not gv.alive(pid):
+            # (another premseq may have renamed or removed it meanwhile)
+            try:
+                if os.path.getsize(filename) > 0 and \
+                   not os.path.isfile(archive):
+                    os.rename(filename, archive)
+                else:
+                    os.remove(filename)
+            except OSError:
+                pass
+
+
+
+def archive_options(loc, name, dry=False):
+    """
+    Function that gives the class data sharing options of a program : its
+    archive if it exists, otherwise the archive written at its exit (in a
+    file of the running premseq, given its final name once the program has
+    finished). Archives are made for each version of java, and need Java 13.
+    For a dry run, archives of finished programs are not renamed nor removed.
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - name [string] : name of the program (with its version)
+        - dry [boolean] : nothing is created, renamed nor removed
+
+    Returns one argument : options [string] : options, or ''
+    """
+
+    version = java_version()
+    if (version < DYNAMIC_CDS):
+        return ''
+
+    archive = "{0}/{1}-jdk{2}.jsa".format(cache_dir(loc, dry), name, version)
+    quiet = '-Xshare:auto -Xlog:cds*=off '
+
+    # archives of finished programs (of this run, or of runs which are not
+    # running anymore) get their final name
+    if not dry :
+        promote_archives(archive)
+
+    if os.path.isfile(archive):
+        return quiet + '-XX:SharedArchiveFile={0} '.format(archive)
+
+    # another running premseq is already writing it
+    if glob.glob("{0}.*".format(archive)):
+        return ''
+
+    return quiet + '-XX:ArchiveClassesAtExit={0}.{1} '.format(archive,
+                                                             os.getpid())
+
+
+
+def tuning_options(param, name):
+    """
+    Function that gives the compiler and garbage collector options of a
+    program : for small inputs, the first tier compiler (no optimising
+    compiler to warm up) and the serial collector, otherwise the parallel
+    collector (with one thread for FastQC, as its script does).
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - name [string] : name of the program
+
+    Returns one argument : options [string]
+    """
+
+    size = sum([os.path.getsize(filename) for filename in param['input']
+                if os.path.isfile(filename)])
+
+    if (size < SMALL_INPUT):
+        return '-XX:TieredStopAtLevel=1 -XX:+UseSerialGC '
+
+    if name.startswith('fastqc'):
+        return '-XX:+UseParallelGC -XX:ParallelGCThreads=1 '
+
+    return '-XX:+UseParallelGC '
+
+
+
+def jvm_options(loc, param, name):
+    """
+    Function that gives the options of the JVM of a program (after its heap) :
+    tuning and class data sharing. Nothing is created, renamed nor removed
+    for the plan of a run ('dry_run' in param).
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - name [string] : name of the program (with its version)
+
+    Returns one argument : options [string]
+    """
+
+    return tuning_options(param, name) + archive_options(loc, name,
+                                                         'dry_run' in param)
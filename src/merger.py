@@ -0,0 +1,258 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+merger.py : module containing all functions to merge the overlapping pairs of
+            trimmed paired-end reads. The best ungapped overlap of read 1 with
+            the reverse complement of read 2 is found from k-mer seeds (found
+            with str.find) and from the short overlaps at the end of read 1.
+            Merged pairs are written in 'merged_<prefix>.fastq', and the
+            trimmed files keep the pairs which could not be merged. Qualities
+            are binned with the other outputs, at the end of the run.
+
+Dependency : check_entries, commandline, fastq, normalize (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import itertools
+import os
+import shutil
+import sys
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+import normalize as nm
+
+
+# size of the seeds, and number of seeds taken at the start of read 2
+SEED_SIZE = 12
+SEED_NUMBER = 3
+
+# lowest quality given to a base of the overlap
+MIN_QUALITY = 2
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# OVERLAP ----------------------------------------------------------------------
+
+def mismatches(seq_1, seq_2):
+    """
+    Function that counts the mismatches between two sequences of same length.
+
+    Takes two arguments : - seq_1 [string]
+                          - seq_2 [string]
+
+    Returns one argument : nb [integer] : number of mismatches
+    """
+
+    if (seq_1 == seq_2):
+        return 0
+
+    return sum(itertools.imap(str.__ne__, seq_1, seq_2))
+
+
+
+def best_overlap(seq_1, seq_2, min_overlap, max_density):
+    """
+    Function that finds the best overlap between the end of read 1 and the
+    start of the reverse complement of read 2 : the lowest mismatch density,
+    then the longest overlap.
+
+    Takes four arguments :
+        - seq_1 [string] : read 1
+        - seq_2 [string] : reverse complement of read 2
+        - min_overlap [integer] : minimal length of the overlap
+        - max_density [float] : maximal proportion of mismatches
+
+    Returns one argument :
+        position [integer] : start of read 2 on read 1, or None
+    """
+
+    length = len(seq_1)
+
+    # positions of read 2 on read 1 : seeded ones, and short overlaps
+    positions = set(range(max(0, length - SEED_SIZE - 1),
+                          length - min_overlap + 1))
+
+    for nb in range(SEED_NUMBER):
+        seed = seq_2[nb * SEED_SIZE:(nb + 1) * SEED_SIZE]
+        if (len(seed) < SEED_SIZE):
+            break
+
+        hit = seq_1.find(seed)
+        while (hit >= 0):
+            positions.add(hit - nb * SEED_SIZE)
+            hit = seq_1.find(seed, hit + 1)
+
+    best = None
+    best_score = None
+
+    for position in positions:
+        if not 0 <= position <= length - min_overlap:
+            continue
+
+        overlap = min(length - position, len(seq_2))
+        density = float(mismatches(seq_1[position:position + overlap],
+                                   seq_2[:overlap])) / overlap
+
+        if density <= max_density:
+            score = (density, -overlap)
+            if best_score is None or score < best_score:
+                best, best_score = position, score
+
+    return best
+
+
+
+def merge_pair(record_1, seq_2, qual_2, position, offset):
+    """
+    Function that merges a pair of reads overlapping at a position. In the
+    overlap, bases which agree keep the highest quality, and for bases which
+    disagree the base of highest quality is kept with the difference of the
+    qualities.
+
+    Takes five arguments :
+        - record_1 [tuple] : FASTQ record of read 1
+        - seq_2 [string] : reverse complement of read 2
+        - qual_2 [string] : reversed qualities of read 2
+        - position [integer] : start of read 2 on read 1
+        - offset [integer] : phred offset of the qualities
+
+    Returns one argument : record [tuple] : the merged record
+    """
+
+    seq_1, qual_1 = record_1[1], record_1[3]
+    overlap = min(len(seq_1) - position, len(seq_2))
+
+    bases = []
+    quals = []
+
+    for base_1, char_1, base_2, char_2 in itertools.izip(
+            seq_1[position:position + overlap], qual_1[position:position + overlap],
+            seq_2[:overlap], qual_2[:overlap]):
+
+        if (base_1 == base_2):
+            bases.append(base_1)
+            quals.append(max(char_1, char_2))
+        else:
+            bases.append(base_1 if char_1 >= char_2 else base_2)
+            quals.append(chr(offset + max(MIN_QUALITY,
+                                          abs(ord(char_1) - ord(char_2)))))
+
+    # read 1 before the overlap, overlap, read 2 after the overlap (the end of
+    # read 1 past read 2 is adapter and is not kept)
+    seq = seq_1[:position] + ''.join(bases) + seq_2[overlap:]
+    qual = qual_1[:position] + ''.join(quals) + qual_2[overlap:]
+
+    return (record_1[0], seq, '+', qual)
+
+
+
+# MERGING STEP -----------------------------------------------------------------
+
+def merge_step(param, inout, size=10000):
+    """
+    Function that merges the overlapping pairs of the trimmed reads. Merged
+    pairs are written in 'merged_<prefix>.fastq' in the output directory, and
+    the trimmed files keep the other pairs.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames
+        - size [integer] : number of pairs in a batch
+
+    Returns inout [dict] with the merged file
+    """
+
+    trimmed = list(inout['trimmed'])
+
+    # reads sent to another sink than a file can't be read again
+    if not all([os.path.isfile(filename) for filename in trimmed]):
+        print "Trimmed reads are not written in files, they are not merged."
+        return inout
+
+    min_overlap, max_density = param['merge'].split(':')
+    min_overlap, max_density = int(min_overlap), float(max_density)
+
+    # offset of the run (trimmed reads may have been re-encoded)
+    offset = fq.get_output_phred(param, param['input'][0])
+
+    # merged and unmerged reads have the compression of trimmed reads
+    suffix = ''
+    if os.path.splitext(trimmed[0])[1] in fq.LEVELS:
+        suffix = os.path.splitext(trimmed[0])[1]
+
+    merged = "{0}/merged_{1}.fastq{2}".format(
+        param['output'], ce.get_file_prefix(param['input'][0]), suffix)
+    unmerged = ["{0}/unmerged_{1}".format(param['scratch'],
+                                           os.path.basename(filename))
+                for filename in trimmed]
+
+    readers = [fq.open_fastq(filename) for filename in trimmed]
+    writers = [fq.open_fastq(filename, 'w', param.get('compress_level'))
+               for filename in [merged] + unmerged]
+
+    pairs = nb_merged = merged_bases = 0
+
+    batches = itertools.izip(fq.read_batches(readers[0], size),
+                             fq.read_batches(readers[1], size))
+
+    for batch_1, batch_2 in batches:
+        if (len(batch_1) != len(batch_2)):
+            sys.exit("/!\ Trimmed files do not contain the same number of "
+                     "reads.")
+
+        records = ([], [], [])
+
+        for record_1, record_2 in itertools.izip(batch_1, batch_2):
+            seq_2 = record_2[1].translate(nm.COMPLEMENT)[::-1]
+            position = best_overlap(record_1[1], seq_2, min_overlap,
+                                    max_density)
+
+            if position is None:
+                records[1].append(record_1)
+                records[2].append(record_2)
+                continue
+
+            record = merge_pair(record_1, seq_2, record_2[3][::-1], position,
+                                offset)
+
+            records[0].append(record)
+            merged_bases += len(record[1])
+
+        pairs += len(batch_1)
+        nb_merged += len(records[0])
+
+        for writer, batch in zip(writers, records):
+            fq.write_records(writer, batch)
+
+    for handle in readers + writers:
+        handle.close()
+
+    # trimmed files keep the pairs which have not been merged
+    for filename, new in zip(trimmed, unmerged):
+        os.remove(filename)
+        shutil.move(new, filename)
+
+    inout['merged'] = merged
+
+    inout = cl.add_stat_section(inout, 'Read Merging',
+                                ['Pairs', 'Merged', 'Merged Percentage',
+                                 'Mean Merged Length'],
+                                [[pairs, nb_merged,
+                                  round(100.0 * nb_merged / max(pairs, 1), 2),
+                                  round(float(merged_bases) / max(nb_merged, 1),
+                                        1)]])
+
+    return inout
@@ -0,0 +1,358 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+native.py : module containing the native multi-core quality trimming (step 2
+            without Trimmomatic). The main process reads the input(s) by
+            chunks of raw FASTQ text, worker processes (one per thread) parse
+            and trim the chunks, and a writer process writes the trimmed
+            chunks in the original order (compressing them if needed), so that
+            the main process only reads. At most two chunks per worker are in
+            flight, so memory is bounded. The survival of the first chunks can
+            stop the trimming early.
+
+Dependency : commandline, fastq, survival, sweep, trimmer (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import collections
+import cStringIO
+import itertools
+import multiprocessing
+import Queue
+import sys
+
+# Personal modules
+import commandline as cl
+import fastq as fq
+import survival as sv
+import sweep as sw
+import trimmer as tr
+
+
+# steps, phred table and phred offset of the worker processes (given by
+# init_worker)
+STEPS = None
+TABLE = None
+OFFSET = None
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# WORKERS ----------------------------------------------------------------------
+
+def init_worker(steps, table, offset):
+    """
+    Function that gives the trimming steps, the phred table and the phred
+    offset to a worker process, once.
+
+    Takes three arguments : - steps [list] : list of (function, arguments)
+                            - table [string] : phred re-encoding table or None
+                            - offset [integer] : phred offset of reads
+
+    Returns anything.
+    """
+
+    global STEPS, TABLE, OFFSET
+
+    STEPS = steps
+    TABLE = table
+    OFFSET = offset
+
+
+
+def trim_chunk(chunks):
+    """
+    Function that trims a chunk of reads (or of pairs) given as raw FASTQ
+    text.
+
+    Takes one argument : chunks [list] : FASTQ text of each input file
+
+    Returns two arguments :
+        - outputs [list] : FASTQ text of trimmed reads, then of singletons
+        - stats [dict] : counters of the chunk (as in sweep)
+    """
+
+    batches = [list(fq.read_records(chunk.splitlines(True)))
+               for chunk in chunks]
+    kept = [tr.trim_batch(STEPS, [tr.trimming_quals(record, OFFSET)
+                                  for record in batch])
+            for batch in batches]
+
+    stats = sw.new_statistics()
+    stats['input'] = len(batches[0])
+
+    if (len(kept) == 1):
+        sw.count_single(stats, kept[0])
+    else:
+        sw.count_pairs(stats, kept[0], kept[1])
+
+    # trimmed files, then singletons for PE data (as sweep.open_outputs)
+    nb_outputs = 1 if len(chunks) == 1 else 2 * len(chunks)
+    handles = [cStringIO.StringIO() for nb in range(nb_outputs)]
+    sw.write_outputs(handles, batches, kept, TABLE)
+
+    return [handle.getvalue() for handle in handles], stats
+
+
+
+# WRITER PROCESS ---------------------------------------------------------------
+
+def write_chunks(queue, outputs, level):
+    """
+    Function run by the writer process : writes (and compresses) the trimmed
+    chunks in the order they are received, until None is received.
+
+    Takes three arguments :
+        - queue [Queue] : FASTQ text of each output file, chunk by chunk
+        - outputs [list] : output files
+        - level [integer] : compression level or None
+
+    Returns anything.
+    """
+
+    writers = [fq.open_fastq(filename, 'w', level) for filename in outputs]
+
+    for texts in iter(queue.get, None):
+        for writer, text in zip(writers, texts):
+            writer.write(text)
+
+    for writer in writers:
+        writer.close()
+
+
+
+def send(queue, process, item):
+    """
+    Function that gives a chunk (or None at the end) to the writer process,
+    waiting while the queue is full. Premseq quits if the writer has died.
+
+    Takes three arguments : - queue [Queue] : queue of the writer process
+                            - process [Process] : the writer process
+                            - item [list] : FASTQ text of each output file
+
+    Returns anything.
+    """
+
+    while True:
+        try:
+            queue.put(item, True, 1)
+            return
+        except Queue.Full:
+            if not process.is_alive():
+                sys.exit("/!\ Writing of the trimmed reads failed.")
+
+
+
+# MAIN PROCESS -----------------------------------------------------------------
+
+def read_chunks(handles, size):
+    """
+    Generator that reads the input(s) by chunks of 'size' reads (or pairs),
+    without parsing them.
+
+    Takes two arguments : - handles [list] : opened input files
+                          - size [integer] : number of reads in a chunk
+
+    Yields one argument : chunks [list] : FASTQ text of each input file
+    """
+
+    while True:
+        chunks = [''.join(itertools.islice(handle, 4 * size))
+                  for handle in handles]
+
+        if not any(chunks):
+            break
+
+        if (len(chunks) == 2 and chunks[0].count('\n') != chunks[1].count('\n')):
+            sys.exit("/!\ Paired-end files do not contain the same number of "
+                     "reads.")
+
+        yield chunks
+
+
+
+def write_log(filename, layout, stats):
+    """
+    Function that writes the summary of the trimming as Trimmomatic does.
+
+    Takes three arguments :
+        - filename [string] : the log file
+        - layout [string] : 'SE' or 'PE'
+        - stats [dict] : counters of the trimming
+
+    Returns anything.
+    """
+
+    nb = max(stats['input'], 1)
+
+    if (layout == 'SE'):
+        dropped = stats['input'] - stats['surviving']
+        summary = ("Input Reads: {0} Surviving: {1} ({2:.2f}%) "
+                   "Dropped: {3} ({4:.2f}%)".format(
+                       stats['input'], stats['surviving'],
+                       100.0 * stats['surviving'] / nb,
+                       dropped, 100.0 * dropped / nb))
+    else:
+        dropped = (stats['input'] - stats['surviving'] -
+                   stats['forward_only'] - stats['reverse_only'])
+        summary = ("Input Read Pairs: {0} Both Surviving: {1} ({2:.2f}%) "
+                   "Forward Only Surviving: {3} ({4:.2f}%) "
+                   "Reverse Only Surviving: {5} ({6:.2f}%) "
+                   "Dropped: {7} ({8:.2f}%)".format(
+                       stats['input'], stats['surviving'],
+                       100.0 * stats['surviving'] / nb,
+                       stats['forward_only'], 100.0 * stats['forward_only'] / nb,
+                       stats['reverse_only'], 100.0 * stats['reverse_only'] / nb,
+                       dropped, 100.0 * dropped / nb))
+
+    with open(filename, 'wt') as f:
+        f.write(summary + "\n")
+        f.write("Native quality trimming completed successfully\n")
+
+
+
+def native_step_2(param, nb, inout, size=20000):
+    """
+    Function that runs the quality trimming (step 2) natively, on as many
+    processes as threads. Output names are the ones Trimmomatic would have
+    written, and a Trimmomatic-like summary is written in 'step2_output.out'.
+
+    Takes four arguments :
+        - param [dict] : dictionnary containing all parameters
+        - nb [integer] : number of executed trimming command
+        - inout [dict] : dictionnary containing all generated filenames
+        - size [integer] : number of reads in a chunk
+
+    Returns inout [dict] with the trimmed files
+    """
+
+    if (nb == 1):
+        inputs = inout['tmp']
+        inputs = [inputs] if param['layout'] == 'SE' else list(inputs)
+    else:
+        inputs = list(param['input'])
+        if (param['layout'] == 'SE'):
+            inputs = inputs[:1]
+
+    # output names (and sinks) as for Trimmomatic
+    cmd, inout = cl.commandline_input_output(param, '', nb, inout)
+
+    outputs = [inout['trimmed']]
+    if (param['layout'] == 'PE'):
+        outputs = list(inout['trimmed']) + list(inout['single'])
+
+    # offset of the raw reads, or the one of step 1 if it re-encoded them (the
+    # offset is never guessed from intermediate files)
+    if 'illuminaclip' in param :
+        offset = fq.get_output_phred(param, param['input'][0])
+    else :
+        offset = fq.get_phred(param, param['input'][0])
+
+    steps = tr.get_steps(param, offset)
+
+    # qualities are binned while writing, unless pairs are merged : merged
+    # qualities are computed from the original ones, and all outputs are
+    # binned at the end of the run
+    table_param = param
+    if 'merge' in param :
+        table_param = dict(param)
+        table_param.pop('binquality', None)
+    table = tr.phred_table(table_param, offset)
+
+    nb_process = int(param.get('threads', 1))
+
+    readers = [fq.open_fastq(filename) for filename in inputs]
+
+    # with several processes, outputs are written by a writer process,
+    # otherwise by the main process
+    writers = []
+    writer = None
+    if (nb_process > 1):
+        queue = multiprocessing.Queue(2)
+        writer = multiprocessing.Process(target=write_chunks,
+                                         args=(queue, outputs,
+                                               param.get('compress_level')))
+        writer.start()
+    else:
+        writers = [fq.open_fastq(filename, 'w', param.get('compress_level'))
+                   for filename in outputs]
+
+    stats = collections.Counter()
+
+    # survival of the first reads
+    monitor = None
+    if 'min_survival' in param :
+        monitor = sv.SurvivalMonitor(param, 'quality trimming (step 2)')
+
+    def write(result):
+        texts, chunk_stats = result
+        if writer is not None:
+            send(queue, writer, texts)
+        for handle, text in zip(writers, texts):
+            handle.write(text)
+        stats.update(chunk_stats)
+        if monitor is not None:
+            monitor.add(chunk_stats['input'] * len(inputs),
+                        chunk_stats['surviving_reads'])
+
+    def aborted():
+        return monitor is not None and monitor.aborted
+
+    if (nb_process > 1):
+        pool = multiprocessing.Pool(nb_process, init_worker,
+                                    (steps, table, offset))
+        pending = collections.deque()
+
+        for chunks in read_chunks(readers, size):
+            pending.append(pool.apply_async(trim_chunk, (chunks,)))
+
+            # chunks are written in order, at most two per worker in flight
+            if (len(pending) >= 2 * nb_process):
+                write(pending.popleft().get())
+                if aborted():
+                    break
+
+        while pending and not aborted():
+            write(pending.popleft().get())
+
+        if aborted():
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+    else:
+        init_worker(steps, table, offset)
+        for chunks in read_chunks(readers, size):
+            write(trim_chunk(chunks))
+            if aborted():
+                break
+
+    for handle in readers + writers:
+        handle.close()
+
+    if writer is not None:
+        send(queue, writer, None)
+        writer.join()
+        if (writer.exitcode != 0):
+            sys.exit("/!\ Writing of the trimmed reads failed.")
+
+    sv.check(param, monitor, inout)
+
+    write_log("{0}/step2_output.out".format(param['output']), param['layout'],
+              stats)
+
+    # qualities have been binned while writing
+    if 'binquality' in param and not 'merge' in param :
+        inout['binned'] = 'yes'
+
+    return inout
@@ -0,0 +1,281 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+normalize.py : module containing all functions to do a digital normalization
+               of trimmed reads. The median k-mer abundance of each read is
+               estimated with a count-min sketch of fixed size and reads whose
+               coverage is already above the target are dropped.
+
+Dependency : check_entries, fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import string
+
+# Personal modules
+import check_entries as ce
+import fastq as fq
+
+
+# translation table giving the complement of bases
+COMPLEMENT = string.maketrans('ACGTN', 'TGCAN')
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class CountMinSketch(object):
+    """
+    Count-min sketch of k-mer abundances. Each row is a table of 1 byte
+    counters (saturating at 255) whose size is a prime number, a k-mer being
+    counted in a row at the position 'hash % size'.
+    """
+
+    def __init__(self, ksize, memory, depth=4):
+        """
+        Takes three arguments :
+            - ksize [integer] : length of k-mers
+            - memory [integer] : memory used by the sketch (in bytes)
+            - depth [integer] : number of rows (hash functions)
+        """
+
+        self.ksize = ksize
+        self.sizes = get_primes(memory // depth, depth)
+        self.tables = [bytearray(size) for size in self.sizes]
+
+
+    def hashes(self, seq):
+        """
+        Returns the hash values of all canonical k-mers of a sequence.
+        """
+
+        k = self.ksize
+        nb = len(seq) - k + 1
+
+        if (nb < 1):
+            return []
+
+        # N are counted as A, as they would break k-mers
+        seq = seq.upper().replace('N', 'A')
+        rev = seq.translate(COMPLEMENT)[::-1]
+
+        # canonical k-mers are the smallest of a k-mer and its reverse
+        # complement, all slices, min and hash being done in C by map()
+        forward = [seq[i:i + k] for i in xrange(nb)]
+        reverse = [rev[i:i + k] for i in xrange(nb - 1, -1, -1)]
+
+        return map(hash, map(min, forward, reverse))
+
+
+    def counts(self, hashes):
+        """
+        Returns the estimated abundance of each k-mer (minimum of the rows).
+        """
+
+        rows = [[table[h % size] for h in hashes]
+                for table, size in zip(self.tables, self.sizes)]
+
+        return map(min, *rows)
+
+
+    def median(self, hashes):
+        """
+        Returns the median abundance of the k-mers of a read.
+        """
+
+        if not hashes:
+            return 0
+
+        if (len(hashes) == 1):
+            return min(self.counts(hashes))
+
+        counts = sorted(self.counts(hashes))
+
+        return counts[len(counts) // 2]
+
+
+    def add(self, hashes):
+        """
+        Counts all k-mers of a read.
+        """
+
+        for table, size in zip(self.tables, self.sizes):
+            for h in hashes:
+                index = h % size
+                if (table[index] < 255):
+                    table[index] += 1
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def is_prime(number):
+    """
+    Booleen that checks if a number is prime.
+
+    Takes one argument : number [integer]
+
+    Returns one argument :
+        - True : if the number is prime
+        - False : if not
+    """
+
+    if (number < 2):
+        return False
+
+    if (number % 2 == 0):
+        return number == 2
+
+    divisor = 3
+    while (divisor * divisor <= number):
+        if (number % divisor == 0):
+            return False
+        divisor += 2
+
+    return True
+
+
+
+def get_primes(maximum, number):
+    """
+    Function that gets the 'number' greatest different primes lower or equal
+    to 'maximum', used as sizes of the rows of the count-min sketch.
+
+    Takes two arguments : - maximum [integer]
+                          - number [integer]
+
+    Returns one argument : primes [list]
+    """
+
+    primes = []
+    candidate = maximum
+
+    while (len(primes) < number and candidate > 1):
+        if is_prime(candidate):
+            primes.append(candidate)
+        candidate -= 1
+
+    return primes
+
+
+
+def normalize_files(param, inputs, outputs):
+    """
+    Function that does the digital normalization of a single-end file or a
+    pair of paired-end files. For paired-end data, both mates are kept if one
+    of them has a median k-mer abundance below the target coverage.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - inputs [list] : trimmed read file(s)
+        - outputs [list] : normalized read file(s)
+
+    Returns two arguments :
+        - total [integer] : number of reads (or pairs) read
+        - kept [integer] : number of reads (or pairs) kept
+    """
+
+    ksize, coverage, memory = param['normalize'].split(':')
+    coverage = int(coverage)
+
+    sketch = CountMinSketch(int(ksize), int(memory) * 1024 * 1024)
+
+    handles = [fq.open_fastq(filename) for filename in inputs]
+    writers = [fq.open_fastq(filename, 'w', param.get('compress_level'))
+               for filename in outputs]
+
+    total = 0
+    kept = 0
+
+    # SINGLE-END ---------------------------------------------------------------
+
+    if (len(inputs) == 1):
+
+        for batch in fq.read_batches(handles[0]):
+            selected = []
+
+            for record in batch:
+                hashes = sketch.hashes(record[1])
+
+                if (sketch.median(hashes) < coverage):
+                    sketch.add(hashes)
+                    selected.append(record)
+
+            total += len(batch)
+            kept += len(selected)
+            fq.write_records(writers[0], selected)
+
+
+    # PAIRED-END ---------------------------------------------------------------
+
+    else:
+        selected_1 = []
+        selected_2 = []
+
+        for record_1, record_2 in fq.read_pairs(handles[0], handles[1]):
+            total += 1
+            hashes_1 = sketch.hashes(record_1[1])
+            hashes_2 = sketch.hashes(record_2[1])
+
+            if (sketch.median(hashes_1) < coverage or
+                sketch.median(hashes_2) < coverage):
+
+                sketch.add(hashes_1)
+                sketch.add(hashes_2)
+                selected_1.append(record_1)
+                selected_2.append(record_2)
+
+            if (len(selected_1) == 10000):
+                kept += len(selected_1)
+                fq.write_records(writers[0], selected_1)
+                fq.write_records(writers[1], selected_2)
+                selected_1 = []
+                selected_2 = []
+
+        kept += len(selected_1)
+        fq.write_records(writers[0], selected_1)
+        fq.write_records(writers[1], selected_2)
+
+
+    for handle in handles + writers:
+        handle.close()
+
+    return total, kept
+
+
+
+def normalized_names(param, inputs):
+    """
+    Function that creates the names of normalized read files.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - inputs [list] : trimmed read file(s)
+
+    Returns one argument : outputs [list] : normalized read file(s)
+    """
+
+    outputs = []
+
+    for filename in inputs:
+        prefix = ce.get_file_prefix(filename)
+
+        # trimmed files keep their prefix, raw files get one
+        if prefix.startswith('trimmed_'):
+            prefix = prefix[len('trimmed_'):]
+
+        normalized = "{0}/normalized_{1}.fastq".format(param['output'], prefix)
+
+        if 'compress' in param :
+            normalized += "{0}".format(param['compress'])
+
+        outputs.append(normalized)
+
+    return outputs
@@ -0,0 +1,218 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+overrepresented.py : module containing all functions to detect overrepresented
+                     sequences (adapter dimers, rRNA, ...) over whole read
+                     files in fixed memory. The start of each read is counted
+                     in a Misra-Gries summary, updated by batches, which can be
+                     merged across shards. The most frequent sequences are
+                     matched against adapter sequences to give a possible
+                     source.
+
+Dependency : adapters, check_entries, fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import collections
+import multiprocessing
+
+# Personal modules
+import adapters as ad
+import check_entries as ce
+import fastq as fq
+
+
+# only the start of reads is counted (as FastQC does for long reads)
+PREFIX_LENGTH = 50
+
+# number of counters of the summary : every sequence more frequent than
+# 1 / (CAPACITY + 1) of reads is found
+CAPACITY = 2000
+
+# reported sequences
+TOP = 20
+MIN_PERCENTAGE = 0.1
+
+# length of the exact match needed between a sequence and a source
+MATCH_SIZE = 16
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class MisraGries(object):
+    """
+    Misra-Gries summary of at most 'capacity' counters. Counts are lower bounds
+    of the true counts, under by at most (number of items) / (capacity + 1).
+    Batches are counted exactly, added to the summary, and the summary is
+    reduced by subtracting its (capacity + 1)-th largest count, which keeps the
+    same guarantee and allows merging summaries of shards.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.counts = collections.Counter()
+        self.total = 0
+
+
+    def reduce(self):
+        """
+        Keeps at most 'capacity' counters.
+        """
+
+        if len(self.counts) <= self.capacity:
+            return
+
+        threshold = sorted(self.counts.itervalues(),
+                           reverse=True)[self.capacity]
+
+        self.counts = collections.Counter(
+            dict([(item, count - threshold)
+                  for item, count in self.counts.iteritems()
+                  if count > threshold]))
+
+
+    def update(self, items):
+        """
+        Counts a batch of items.
+        """
+
+        self.total += len(items)
+        self.counts.update(items)
+        self.reduce()
+
+
+    def merge(self, other):
+        """
+        Adds the summary of another shard.
+        """
+
+        self.total += other.total
+        self.counts.update(other.counts)
+        self.reduce()
+
+        return self
+
+
+    def top(self, number):
+        """
+        Returns the 'number' most frequent items with their counts.
+        """
+
+        return self.counts.most_common(number)
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def file_summary(filename, size=10000):
+    """
+    Function that counts the start of the reads of a file by batches.
+
+    Takes two arguments : - filename [string] : the FASTQ file
+                          - size [integer] : number of reads in a batch
+
+    Returns one argument : summary [MisraGries]
+    """
+
+    summary = MisraGries()
+
+    handle = fq.open_fastq(filename)
+    for batch in fq.read_batches(handle, size):
+        summary.update([record[1][:PREFIX_LENGTH] for record in batch])
+    handle.close()
+
+    return summary
+
+
+
+def get_sources(loc, param):
+    """
+    Function that reads the sequences used as possible sources : the bundled
+    adapter library and the adapter file of illuminaclip.
+
+    Takes two arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+
+    Returns one argument : index [dict] : set of source names for each k-mer
+    """
+
+    entries = ad.read_fasta('{0}AdaptersLibrary.fasta'.format(loc[:-3]))
+
+    if 'illuminaclip' in param :
+        names = set([name for name, seq in entries])
+        entries += [entry for entry in
+                    ad.read_fasta(param['illuminaclip'].split(':')[0])
+                    if not entry[0] in names]
+
+    return ad.kmer_index(entries, MATCH_SIZE)
+
+
+
+def possible_source(seq, index):
+    """
+    Function that finds the sources sharing at least MATCH_SIZE bases with a
+    sequence (in both orientations).
+
+    Takes two arguments : - seq [string] : the overrepresented sequence
+                          - index [dict] : set of source names for each k-mer
+
+    Returns one argument : source [string] : source names, or 'No Hit'
+    """
+
+    names = set()
+    for i in range(len(seq) - MATCH_SIZE + 1):
+        names.update(index.get(seq[i:i + MATCH_SIZE], ()))
+
+    if not names:
+        return 'No Hit'
+
+    return ', '.join(sorted(names))
+
+
+
+def overrepresented_sequences(loc, param, files):
+    """
+    Function that finds the overrepresented sequences of read files (one
+    process per file, up to the number of threads).
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - files [list] : read files
+
+    Returns one argument :
+        rows [list] : (filename, sequence, count, percentage, possible source)
+                      of each overrepresented sequence
+    """
+
+    nb_process = min(int(param.get('threads', 1)), len(files))
+
+    if (nb_process > 1):
+        pool = multiprocessing.Pool(nb_process)
+        summaries = pool.map(file_summary, files)
+        pool.close()
+        pool.join()
+    else:
+        summaries = map(file_summary, files)
+
+    index = get_sources(loc, param)
+    rows = []
+
+    for filename, summary in zip(files, summaries):
+        for seq, count in summary.top(TOP):
+            percentage = 100.0 * count / max(summary.total, 1)
+            if (percentage >= MIN_PERCENTAGE):
+                rows.append([filename, seq, count, round(percentage, 2),
+                             possible_source(seq, index)])
+
+    return rows
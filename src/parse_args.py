@@ -16,6 +16,7 @@ __date__ = "2015/07"
 
 
 import argparse
+import re
 import sys
 import os.path
 from argparse import RawTextHelpFormatter
@@ -54,15 +55,28 @@ def premseq_parser():
 
 "\n\nSYNOPSIS\n\n" + color.END +
 
-"  (A)\t%(prog)s --XML file.xml\n\n"
+"  (A)\t%(prog)s --XML file.xml [--preview N | --plan] [--memory NN]\n\n"
 "  (B)\t%(prog)s SE input.fastq [options]\n\t"
 "or\n\t%(prog)s PE input1.fastq input2.fastq [options]\n\n"
-
-"    options : [-threads NN] [-output directory] [-phred {33,64}] \n"
-"              [-illuminaclip file:NN:NN:NN] [-slidingwindow NN:NN] \n"
+"  (C)\t%(prog)s --samples sheet.txt [--task i/N | --gather] [--batch N]\n"
+"\t\t[options]\n\n"
+"  (D)\t%(prog)s --rundb runs.sqlite --query query\n\n"
+"  (E)\t%(prog)s --watch directory {SE,PE} [--watch-workers N] [options]\n\n"
+
+"    options : [--preview N] [--plan] [--sweep file.xml [--sweep-outputs]]\n"
+"              [--memory NN] [--no-preflight] [--rundb file.sqlite]\n"
+"              [-threads NN [-native]] [-output directory] [-scratch directory]\n"
+"              [-phred {33,64}] \n"
+"              [-illuminaclip file:NN:NN:NN [-detect-adapters [file]]] \n"
+"              [-slidingwindow NN:NN] \n"
 "              [-maxinfo NN:NN] [-leading NN] [-trailing NN] [-headcrop NN] \n"
-"              [[-crop NN] [-avgqual NN] -minlen NN] [-keep-singleton] \n"
-"              [-tophred33 | -tophred64] [-fastqc] \n",
+"              [[-crop NN] [-avgqual NN] -minlen NN] [-polyx XX:NN:NN] \n"
+"              [-keep-singleton] [-merge NN:N.N] [-min-survival NN:NN] \n"
+"              [-screen file:NN:N.N[:{drop,split}]] \n"
+"              [-tophred33 | -tophred64] [-binquality [scheme]] \n"
+"              [-fastqc] [-qc] [-overrepresented] \n"
+"              [-exclude-tiles {auto,lane:tile,...}] \n"
+"              [-normalize NN:NN:NN] \n",
 
         description= color.BOLD + "\n\nDESCRIPTION\n\n" + 
 "    PREMSEQ" + color.END +
@@ -107,6 +121,139 @@ def premseq_parser():
                         action='store', 
                         help="Take trimming parameter from a given xml file.\n"
                         "  Usage:\n    '--XML file.xml'\n\n")
+
+    parser.add_argument("--preview",
+                        type=int,
+                        action='store',
+                        help="Run the trimming on N reads (or pairs) sampled from the\n"
+                        "whole input, and report the projected survival rate,\n"
+                        "length distribution and runtime. Works with the\n"
+                        "commandline mode and with the XML file.\n"
+                        "  Usage:\n    '--preview 100000'\n\n")
+
+    parser.add_argument("--plan",
+                        action='store_const',
+                        const='yes',
+                        help="Dry run : print in JSON the commands of Trimmomatic and\n"
+                        "FastQC, the disk footprint of intermediate and final\n"
+                        "files, and the estimated wall time, CPU time and memory\n"
+                        "of each step (calibrated on the runs of '--rundb' if\n"
+                        "given). Nothing is run.\n"
+                        "  Usage:\n    '--plan' or '--plan --rundb runs.sqlite'\n\n")
+
+    parser.add_argument("--sweep",
+                        type=str,
+                        action='store',
+                        help="Compare several quality trimming configurations in one\n"
+                        "pass over the input(s). The file contains one XML\n"
+                        "'quality-trimming' category per configuration (with an\n"
+                        "optional 'label' attribute). Survival, mean length and\n"
+                        "retained bases of each configuration are written in\n"
+                        "'sweep.txt'.\n"
+                        "  Usage:\n    '--sweep sweep.xml'\n\n")
+
+    parser.add_argument("--sweep-outputs",
+                        action='store_const',
+                        const='yes',
+                        help="Also write the trimmed reads of each configuration in\n"
+                        "'sweep/<label>/'.\n"
+                        "  Usage:\n    '--sweep sweep.xml --sweep-outputs'\n\n")
+
+    parser.add_argument("--memory",
+                        type=str,
+                        action='store',
+                        help="Memory budget of the node, shared by the Trimmomatic\n"
+                        "and FastQC programs of all premseq jobs running on it.\n"
+                        "The heap and threads of each program are sized to fit,\n"
+                        "and jobs wait while the budget is exhausted. In MB or\n"
+                        "with a unit (M, G).\n"
+                        "  Usage:\n    '--memory 16G'\n\n")
+
+    parser.add_argument("--no-preflight",
+                        action='store_const',
+                        const='yes',
+                        help="Do not check the integrity of the input files before\n"
+                        "trimming (compressed streams, record structure and\n"
+                        "number of records of paired files).\n"
+                        "  Usage:\n    '--no-preflight'\n\n")
+
+    parser.add_argument("--rundb",
+                        type=str,
+                        action='store',
+                        help="Append the parameters, the survival and duration of\n"
+                        "each trimming step and the statistic file of the run\n"
+                        "to a SQLite database (which can be shared by\n"
+                        "concurrent runs).\n"
+                        "  Usage:\n    '--rundb runs.sqlite'\n\n")
+
+    parser.add_argument("--query",
+                        type=str,
+                        action='store',
+                        help="Print the result of a query on the run database : an\n"
+                        "SQL query, or 'runs', 'steps' or 'survival'.\n"
+                        "  Usage:\n    '--rundb runs.sqlite --query survival'\n\n")
+
+    parser.add_argument("--samples",
+                        type=str,
+                        action='store',
+                        help="Run the samples of a sample sheet as a cluster array\n"
+                        "job. Each line gives a sample name and its read file(s)\n"
+                        "(one for SE, two for PE). The array task is read from\n"
+                        "SLURM_ARRAY_TASK_ID or SGE_TASK_ID (or '--task') and\n"
+                        "runs its share of the samples, balanced on input size,\n"
+                        "with the other options, in '<output>/<sample>/'.\n"
+                        "  Usage:\n    '--samples sheet.txt -minlen 36'\n\n")
+
+    parser.add_argument("--task",
+                        type=str,
+                        action='store',
+                        help="Array task to run with '--samples', and number of\n"
+                        "tasks.\n"
+                        "  Usage:\n    '--samples sheet.txt --task 3/10'\n\n")
+
+    parser.add_argument("--gather",
+                        action='store_const',
+                        const='yes',
+                        help="Merge the statistic files of all samples of a sample\n"
+                        "sheet in '<output>/statistic.txt'.\n"
+                        "  Usage:\n    '--samples sheet.txt --gather'\n\n")
+
+    parser.add_argument("--batch",
+                        type=int,
+                        action='store',
+                        help="Run the samples of a sample sheet in batches of at\n"
+                        "most N samples (of same layout and phred offset), for\n"
+                        "many small files : the reads of a batch are concatenated\n"
+                        "(each read tagged with its sample), trimmed in one run in\n"
+                        "'<output>/<batch>/', and demultiplexed in\n"
+                        "'<output>/<sample>/' with the statistics of each sample.\n"
+                        "  Usage:\n    '--samples sheet.txt --batch 200 -minlen 36'\n\n")
+    
+    
+    parser.add_argument("--watch",
+                        type=str,
+                        action='store',
+                        help="Daemon mode : watch a directory and run premseq on each\n"
+                        "sample as soon as its FASTQ files are complete (size\n"
+                        "unchanged for '--watch-settle' seconds, both mates for\n"
+                        "PE data), with the other options, in\n"
+                        "'<output>/<sample>/'. Processed samples are recorded in\n"
+                        "'<output>/.premseq_watch.json' and are not run again\n"
+                        "after a restart. Stops on Ctrl-C or SIGTERM.\n"
+                        "  Usage:\n    '--watch incoming PE -minlen 36'\n\n")
+
+    parser.add_argument("--watch-workers",
+                        type=int,
+                        action='store',
+                        help="Number of samples run at a time by '--watch'.\n"
+                        "  Default 1\n\n")
+
+    parser.add_argument("--watch-settle",
+                        type=int,
+                        action='store',
+                        help="Seconds without change of size after which a file is\n"
+                        "complete for '--watch'.\n"
+                        "  Default 60\n\n")
     
     
     group = parser.add_argument_group(
@@ -141,12 +288,30 @@ def premseq_parser():
                         "doesn't already exist).\n"
                         "  Default '%s' \n\n" %os.getcwd())
     
+    group.add_argument("-scratch",
+                        type=str,
+                        action='store',
+                        help="Name of directory for temporary files (will be created\n"
+                        "if it doesn't already exist), ideally on a fast local\n"
+                        "disk. Only final outputs are written in the output\n"
+                        "directory.\n"
+                        "  Default : the output directory\n\n")
+    
     group.add_argument("-threads",
                         type=int,
                         action='store',
                         default= 1,
                         help = "Number of threads to use.\n"
                         "  Usage : '-threads 5'\n\n")
+
+    group.add_argument("-native",
+                       action='store_const',
+                       const='yes',
+                       help="Do the quality trimming (step 2) natively instead of\n"
+                       "with Trimmomatic, on as many processes as threads.\n"
+                       "Outputs are the same as Trimmomatic ones.\n"
+                       "  Usage:\n"
+                       "   -native -threads 8\n\n")
     
     group.add_argument("-phred",
                         type=int,
@@ -166,6 +331,19 @@ def premseq_parser():
                         "  Usage: \n   -illuminaclip <fastaWithAdaptersEtc>:"
                         "<seed mismatches>:\n   <palindrome clip threshold>:<simple"
                         " clip threshold>\n  Recommendation: fasta-file:2:30:10\n\n")
+
+    group.add_argument("-detect-adapters",
+                        type=str,
+                        nargs='?',
+                        const='yes',
+                        action='store',
+                        help= "Detect the adapters present at the 3' end of the first\n"
+                        "reads, by matching overrepresented k-mers against a\n"
+                        "library of known adapters (AdaptersLibrary.fasta by\n"
+                        "default). Only the detected adapters are searched by\n"
+                        "illuminaclip, whose thresholds are used.\n"
+                        "  Usage: \n   -detect-adapters   or   -detect-adapters"
+                        " <library.fasta>\n\n")
     
     group.add_argument("-slidingwindow",
                         type=str,
@@ -200,6 +378,20 @@ def premseq_parser():
                         "  Usage: \n"
                         "   -maxinfo <target-length>:<strictness>\n\n")
     
+    group.add_argument("-polyx",
+                        type=str,
+                        action='store',
+                        help="Removes poly-X tails (poly-A, poly-T, poly-G of NextSeq\n"
+                        "and NovaSeq, ...) from the end of the reads, after adapter\n"
+                        "trimming and before the other quality trimming steps.\n"
+                        "Parameters:\n"
+                        "-bases : bases of the tails (ex : AGT)\n"
+                        "-min-length : minimal length of a tail\n"
+                        "-mismatches : maximal number of mismatches in a tail\n"
+                        "  Usage: \n"
+                        "   -polyx <bases>:<min-length>:<mismatches>\n"
+                        "  Recommended: AGT:10:1\n\n")
+    
     group.add_argument("-leading",
                         type=int,
                         action='store',
@@ -253,6 +445,57 @@ def premseq_parser():
                         "  Usage:\n"
                         "   -minlen <length>\n\n")
 
+    group.add_argument("-merge",
+                        type=str,
+                        action='store',
+                        help="Merges the overlapping pairs of trimmed PE reads. The\n"
+                        "best ungapped overlap of read 1 with the reverse\n"
+                        "complement of read 2 is searched, merged reads are\n"
+                        "written in 'merged_<file>.fastq' and the trimmed files\n"
+                        "keep the pairs which could not be merged.\n"
+                        "Parameters:\n"
+                        "-min-overlap : minimal length of the overlap\n"
+                        "-max-mismatch : maximal proportion of mismatches in the\n"
+                        "\t       overlap, from 0 to 1\n"
+                        "  Usage: \n"
+                        "   -merge <min-overlap>:<max-mismatch>\n"
+                        "  Recommended: 10:0.1\n\n")
+
+    group.add_argument("-min-survival",
+                        type=str,
+                        action='store',
+                        help="Aborts the run early if too few reads survive : the\n"
+                        "survival of the first reads (or pairs) of each trimming\n"
+                        "step is read from the trimlog of Trimmomatic as it is\n"
+                        "written (or from the native trimming), and if it is\n"
+                        "below the floor, the step is stopped and the remaining\n"
+                        "steps are not run.\n"
+                        "Parameters:\n"
+                        "-floor : minimal percentage of surviving reads\n"
+                        "-reads : number of reads (or pairs) monitored\n"
+                        "  Usage: \n"
+                        "   -min-survival <floor>:<reads>\n"
+                        "  Recommended: 20:100000\n\n")
+
+    group.add_argument("-screen",
+                        type=str,
+                        action='store',
+                        help="Screens the trimmed reads for contaminants (rRNA,\n"
+                        "PhiX, ...). The k-mers of the contaminant FASTA file\n"
+                        "are stored in a Bloom filter cached next to it, and a\n"
+                        "read (or a pair) is a contaminant if enough of its\n"
+                        "k-mers are in the filter.\n"
+                        "Parameters:\n"
+                        "-contaminants-fasta-file : contaminant sequences\n"
+                        "-kmer-size : size of k-mers\n"
+                        "-min-fraction : minimal proportion of contaminant\n"
+                        "\t       k-mers, from 0 to 1\n"
+                        "-mode : 'drop' contaminants (default), or 'split' them\n"
+                        "\t       in 'contaminant_<file>.fastq'\n"
+                        "  Usage: \n"
+                        "   -screen <fasta-file>:<kmer-size>:<min-fraction>[:<mode>]\n"
+                        "  Recommended: phix.fasta:25:0.5\n\n")
+
     group.add_argument("-keep-singleton",
                        action='store_const',
                        const='yes',
@@ -262,12 +505,14 @@ def premseq_parser():
                        "    -keep-singleton\n\n")
 
     group.add_argument("-compress",
-                          type =str,
+                       type =str,
                        action='store',
-                       choices=['.gz','.bz2'],
-                       help="Compress output files in zip or bzip2 format.\n"
+                       help="Compress final output files in gzip, bzip2 or zstd\n"
+                       "format, with an optional compression level. Temporary\n"
+                       "files are never compressed.\n"
                        "  Usage:\n"
-                       "    -compress .gz || -compress .bz2\n\n")
+                       "    -compress .gz || -compress .bz2 || -compress .zst\n"
+                       "    -compress .gz:<level>   (level from 1 to 9, 19 for zst)\n\n")
     
     exclu = group.add_mutually_exclusive_group()
     
@@ -285,6 +530,20 @@ def premseq_parser():
                         "  Usage:\n"
                         "   -tophred64'\n\n")
 
+    group.add_argument("-binquality",
+                        type=str,
+                        nargs='?',
+                        const='illumina',
+                        action='store',
+                        help="Bins the qualities of the trimmed reads to shrink the\n"
+                        "compressed outputs, after trimming (trimming is not\n"
+                        "affected). Default : the Illumina 8-level scheme\n"
+                        "(2-9:6, 10-19:15, 20-24:22, 25-29:27, 30-34:33,\n"
+                        "35-39:37, 40 and more:40). Other schemes are given as\n"
+                        "bins <lowest>-<highest>:<quality> separated by commas.\n"
+                        "  Usage:\n"
+                        "   -binquality   or   -binquality 0-19:10,20-29:25,30-:35\n\n")
+
     group.add_argument("-fastqc",
                        action='store_const',
                        const='FASTQC',
@@ -292,6 +551,52 @@ def premseq_parser():
                        "a quality control tool for high throughput sequence data.\n"
                        "  Usage:\n"
                        "    -fastqc\n\n")    
+
+    group.add_argument("-qc",
+                       action='store_const',
+                       const='yes',
+                       help= "Native quality control of raw reads and trimmed reads :\n"
+                       "per cycle quality percentiles, per cycle base composition\n"
+                       "(and N content) and length distribution are written in\n"
+                       "'qc_<file>.txt', and a summary in the statistic file.\n"
+                       "  Usage:\n"
+                       "    -qc\n\n")
+
+    group.add_argument("-exclude-tiles",
+                       type=str,
+                       action='store',
+                       help= "Remove the reads (or pairs) of bad tiles before trimming.\n"
+                       "Tiles are given as a list of lane:tile, or found with\n"
+                       "'auto' (mean quality 5 below the median tile). Lane and\n"
+                       "tile are read from Illumina read names.\n"
+                       "  Usage:\n"
+                       "    -exclude-tiles 1:1101,1:2204   or   -exclude-tiles auto\n\n")
+
+    group.add_argument("-overrepresented",
+                       action='store_const',
+                       const='yes',
+                       help= "Find the overrepresented sequences of raw reads and\n"
+                       "trimmed reads over the whole files, in fixed memory, and\n"
+                       "their possible source (adapter sequences). They are\n"
+                       "written in the statistic file.\n"
+                       "  Usage:\n"
+                       "    -overrepresented\n\n")
+
+    group.add_argument("-normalize",
+                       type=str,
+                       action='store',
+                       help="Digital normalization of trimmed reads. The median\n"
+                       "k-mer abundance of each read is estimated with a count-\n"
+                       "min sketch of fixed size, and reads whose coverage is\n"
+                       "above the target coverage are dropped (both mates are\n"
+                       "kept for PE data if one of them is below the target).\n"
+                       "Parameters:\n"
+                       "-kmer-size : length of k-mers\n"
+                       "-coverage : target coverage (below 255)\n"
+                       "-memory : memory used by the sketch (in MB)\n"
+                       "  Usage: \n"
+                       "   -normalize <kmer-size>:<coverage>:<memory>\n"
+                       "  Recommended: 20:20:1024\n\n")
     
 
     return parser
@@ -399,5 +704,249 @@ def check_maxinfo(text):
         sys.exit("/!\ Value for strictness must be a float between 0 and 1")
         
     return 1
+
+
+
+def check_normalize(text):
+    """
+    Function that check normalize (digital normalization) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+        
+    # separates arguments
+    norm = text.split(':')
+        
+    # verify the number of arguments between ':'.
+    if not len(norm) == 3:
+        sys.exit("/!\ Option normalize must have 3 elements between ':'")
+    
+    # check that integers are entered for all arguments
+    for value, name in zip(norm, ['kmer-size', 'coverage', 'memory']):
+        if not value.isdigit() or int(value) == 0:
+            sys.exit("/!\ Value for %s (normalize) must be a positive integer" 
+                     %name)
+
+    # counters of the sketch are saturating at 255
+    if int(norm[1]) > 254:
+        sys.exit("/!\ Value for coverage (normalize) must be below 255")
+        
+    return 1
+
+
+
+def check_exclude_tiles(text):
+    """
+    Function that check exclude-tiles (tile filter) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+
+    if (text == 'auto'):
+        return 1
+
+    # each tile is given as lane:tile
+    for tile in text.split(','):
+        if not len(tile.strip().split(':')) == 2 :
+            sys.exit("/!\ Tiles to exclude must be given as lane:tile, separated \
+by ',' (or 'auto')")
+        
+    return 1
+
+
+
+def check_binquality(text):
+    """
+    Function that check binquality (quality binning scheme) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+
+    if (text == 'illumina'):
+        return 1
+
+    highest = -1
+
+    # each bin is <lowest>-<highest>:<quality>, the last highest is optional
+    for nb, element in enumerate(text.split(',')):
+        match = re.match(r'^(\d+)-(\d*):(\d+)$', element)
+
+        if not match:
+            sys.exit("/!\ Bins of binquality must be given as "
+                     "<lowest>-<highest>:<quality>, ex : 0-19:10,20-:30")
+
+        lowest, high, quality = match.groups()
+
+        if int(lowest) <= highest or (high and int(high) < int(lowest)):
+            sys.exit("/!\ Bins of binquality must be given in increasing order "
+                     "and must not overlap")
+
+        if not high and nb != len(text.split(',')) - 1:
+            sys.exit("/!\ Only the last bin of binquality can be open")
+
+        if int(quality) > 93:
+            sys.exit("/!\ Binned qualities (binquality) must be at most 93")
+
+        highest = int(high) if high else 1000
+
+    return 1
+
+
+
+def check_merge(text):
+    """
+    Function that check merge (paired-end read merging) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+        
+    # separates arguments
+    merge = text.split(':')
+        
+    # verify the number of arguments between ':'.
+    if not len(merge) == 2:
+        sys.exit("/!\ Option merge must have 2 elements between ':'")
     
+    # check that an integer is entered for min-overlap
+    if not merge[0].isdigit() or int(merge[0]) == 0:
+        sys.exit("/!\ Value for min-overlap (merge) must be a positive integer")
+
+    # check that max-mismatch is a proportion
+    try :
+        if not 0 <= float(merge[1]) <= 1:
+            raise ValueError
+    except ValueError :
+        sys.exit("/!\ Value for max-mismatch (merge) must be between 0 and 1")
+        
+    return 1
+
 
+
+def check_min_survival(text):
+    """
+    Function that check min-survival (early abort) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+        
+    # separates arguments
+    survival = text.split(':')
+        
+    # verify the number of arguments between ':'.
+    if not len(survival) == 2:
+        sys.exit("/!\ Option min-survival must have 2 elements between ':'")
+
+    # check that floor is a percentage
+    try :
+        if not 0 <= float(survival[0]) <= 100:
+            raise ValueError
+    except ValueError :
+        sys.exit("/!\ Value for floor (min-survival) must be between 0 and 100")
+    
+    # check that an integer is entered for reads
+    if not survival[1].isdigit() or int(survival[1]) == 0:
+        sys.exit("/!\ Value for reads (min-survival) must be a positive integer")
+        
+    return 1
+
+
+
+def check_screen(text):
+    """
+    Function that check screen (contaminant screening) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+        
+    # separates arguments
+    screen = text.split(':')
+        
+    # verify the number of arguments between ':'.
+    if not len(screen) in (3, 4):
+        sys.exit("/!\ Option screen must have 3 or 4 elements between ':'")
+    
+    # get & check fasta file
+    ce.check_fasta_file(screen[0])
+
+    # check that an integer is entered for kmer-size (hashed as a string)
+    if not screen[1].isdigit() or not 8 <= int(screen[1]) <= 64:
+        sys.exit("/!\ Value for kmer-size (screen) must be an integer from 8 "
+                 "to 64")
+
+    # check that min-fraction is a proportion
+    try :
+        if not 0 < float(screen[2]) <= 1:
+            raise ValueError
+    except ValueError :
+        sys.exit("/!\ Value for min-fraction (screen) must be between 0 "
+                 "(excluded) and 1")
+
+    # check the mode
+    if len(screen) == 4 and not screen[3] in ('drop', 'split'):
+        sys.exit("/!\ Mode (screen) must be 'drop' or 'split'")
+        
+    return 1
+
+
+
+def check_polyx(text):
+    """
+    Function that check polyx (poly-X tail trimming) arguments.
+    
+    Takes one argument :
+        text [string] : given argument by user
+    
+    Returns one argument :
+        - 1 [integer] : if argument is confrom
+        - or quit, if not
+    """
+        
+    # separates arguments
+    polyx = text.split(':')
+        
+    # verify the number of arguments between ':'.
+    if not len(polyx) == 3:
+        sys.exit("/!\ Option polyx must have 3 elements between ':'")
+    
+    # check the bases of tails
+    if not polyx[0] or polyx[0].upper().strip('ACGTN'):
+        sys.exit("/!\ Bases (polyx) must be among A, C, G, T and N")
+
+    # check that integers are entered for min-length and mismatches
+    if not polyx[1].isdigit() or int(polyx[1]) == 0:
+        sys.exit("/!\ Value for min-length (polyx) must be a positive integer")
+
+    if not polyx[2].isdigit():
+        sys.exit("/!\ Value for mismatches (polyx) must be an integer")
+        
+    return 1
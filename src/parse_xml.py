@@ -4,7 +4,7 @@
 """
 parse_xml.py : module containing all functions to parse a XML file.
 
-Dependency : check_entries (personal module)
+Dependency : check_entries, parse_args (personal modules)
 """
 
 __author__ = "Anita Annamalé"
@@ -18,8 +18,9 @@ __date__ = "2015/07"
 import xml.etree.ElementTree as ET
 import sys
 
-# Personal module
+# Personal modules
 import check_entries as ce
+import parse_args as pa
 
 
 #-------------------------- FUNCTIONS DEFINITION ------------------------------#
@@ -69,22 +70,25 @@ or one of program names (fastqc of trimmomatic) have been modified")
 
 # INPUT / OUTPUT INFORMATION ---------------------------------------------------
 
-def get_input_output_parameters(Puts, param):
+def get_input_output_parameters(Puts, param, create=True):
     """
     Function that gets inputs and outputs parameters
     
-    Takes two arguments : - Puts [ElementTree] : subtree which contains inputs 
-                            and outputs information's
-                          - param [dict] : dictionnary containing all 
-                            parameters
+    Takes three arguments : - Puts [ElementTree] : subtree which contains inputs 
+                              and outputs information's
+                            - param [dict] : dictionnary containing all 
+                              parameters
+                            - create [boolean] : create the output (and
+                              scratch) directories if needed
     
     Returns param[dict] where have been added inputs and outputs parameters
     """
     
-    # check if the section 'input-output' contains 4 parameters
-    if not check_child_number(Puts,4):
+    # check if the section 'input-output' contains 4 parameters (and the 
+    # optional scratch directory)
+    if not (ce.check_child_number(Puts,4) or ce.check_child_number(Puts,5)):
         sys.exit("/!\ Warning : The XML file must contain exactly 4 parameters \
-in the section 'input-output'!")
+(and an optional 'scratch-directory') in the section 'input-output'!")
     
 
     # LAYOUT -------------------------------------------------------------------
@@ -103,7 +107,7 @@ in the section 'input-output'!")
 
     # get input(s)
 
-    if(checked_layout == 'SE') :
+    if(layout == 'SE') :
 
         # get the subtree which contain SE input and get the input file
         SE = Puts.find('single-ends')
@@ -146,11 +150,17 @@ modified")
     directory = Puts.find('output-directory').text
     
     # check that output-directory is given and if it exists
-    directory =  ce.check_output_dir(directory)
+    directory =  ce.check_output_dir(directory, create)
 
     # add into the dictionnary
     param['output']= directory
 
+    # get the optional scratch-directory where temporary files are written
+    scratch = Puts.find('scratch-directory')
+
+    if (scratch != None) :
+        param['scratch'] = ce.check_output_dir(scratch.text, create)
+
     return param
 
 
@@ -206,12 +216,17 @@ def separate_categories_Trimmo(Trimmomatic):
         - Quality [ElementTree] : subtree which contains quality trimming 
         parameters
         - Useful [ElementTree] : subtree which contains uselful parameters
+        - Screening [ElementTree] : subtree which contains contaminant
+        screening parameters, or None if the category is absent
     """
     
-    # check that the number of categories is 3   
-    if not ce.check_child_number(Trimmomatic,3) : 
+    # check that the number of categories is 3 (or 4 with contaminant screening)
+    if not (ce.check_child_number(Trimmomatic,3) or 
+            ce.check_child_number(Trimmomatic,4)) : 
         sys.exit("/!\ The XML file must contain exactly 3 categories for \
-Trimmomatic!")
+Trimmomatic (and an optional 'contaminant-screening')!")
+    
+    Screening = None
     
     # separates categories of Trimmomatic
     for category in Trimmomatic :
@@ -231,12 +246,17 @@ Trimmomatic!")
             Useful = category
             continue
         
+        # get parameters for 'Contaminant-Screening' in a subtree
+        elif(category.get('name') == 'contaminant-screening') :
+            Screening = category
+            continue
+        
         else :
             sys.exit("/!\ Atleast one category haven't been recognized.\n\
 Please, have a look at the name of Trimmomatic categories, atleast one of them \
 have been modified.")
     
-    return Adapter, Quality, Useful
+    return Adapter, Quality, Useful, Screening
 
 
 
@@ -324,6 +344,21 @@ option and 1 parameter for adapter trimming.")
                                           'keep-both-reads in adapter trimming')
             else:
                 keep = 'true' # default value
+
+
+                # optional adapter detection
+            detect = Clip.find('detect-adapters')
+
+            if detect is not None :
+                detect_skip = ce.check_yes_no(detect.find('skip').text,
+                                     'detect-adapters skip in adapter trimming')
+
+                if(detect_skip == 'no'):
+                    library = detect.find('library')
+                    if library is None or ce.empty(library.text) :
+                        param['detect_adapters'] = 'yes' # bundled library
+                    else :
+                        param['detect_adapters'] = ce.check_fasta_file(library.text)
             
             # Add all parameters to dictionnary --------------------------------
 
@@ -353,10 +388,12 @@ def get_quality_parameters(Quality, param) :
     Returns param [dict] with added quality trimming parameters
     """
     
-    # check that quality trimming subtree have 9 child (skip and 9 parameters)
-    if not ce.check_child_number(Quality,9) :
+    # check that quality trimming subtree have 9 child (skip and 8 parameters)
+    # or 10 with the poly-X parameter
+    if not (ce.check_child_number(Quality,9) or 
+            ce.check_child_number(Quality,10)) :
             sys.exit("/!\ The XML file must contain exactly one skip option \
-skip and 8 parameters for quality trimming.")
+skip and 8 parameters (9 with poly-x) for quality trimming.")
     
 
     # SKIP ---------------------------------------------------------------------
@@ -462,6 +499,24 @@ skip and 8 parameters for quality trimming.")
                     continue
                 
 
+                # POLY-X -------------------------------------------------------
+
+                elif(parameter.get('name') == 'poly-x'):
+                    bases = parameter.find('bases').text
+                    if ce.empty(bases) or bases.strip().upper().strip('ACGTN'):
+                        sys.exit("/!\ Bases in 'poly-x' quality trimming must \
+be among A, C, G, T and N")
+                    PX_length = ce.check_integer(parameter.find('min-length').text,
+                                        "min-length in 'poly-x' quality trimming")
+                    PX_mismatches = ce.check_integer(parameter.find('mismatches').text,
+                                        "mismatches in 'poly-x' quality trimming")
+
+                    param['polyx'] = '{0}:{1}:{2}'.format(bases.strip().upper(),
+                                                          PX_length,
+                                                          PX_mismatches)
+                    continue
+
+
                 # AVERAGE-QUALITY ----------------------------------------------
 
                 elif(parameter.get('name') == 'average-quality'):
@@ -479,6 +534,72 @@ skip and 8 parameters for quality trimming.")
 
 
 
+def get_screening_parameters(Screening, param):
+    """
+    Function that gets contaminant screening parameters.
+    
+    Takes two arguments:
+        - Screening [ElementTree] : subtree which contains contaminant 
+          screening parameters, or None
+        - param [dict] : dictionnary containing all parameters
+        
+    Returns param [dict] with added contaminant screening parameters
+    """
+    
+    # the category is optional
+    if Screening is None :
+        return param
+
+    # check screening section have 2 child (skip and parameter)
+    if not ce.check_child_number(Screening,2):
+            sys.exit("/!\ Warning : The XML file must contain exactly 1 skip \
+option and 1 parameter for contaminant screening.")
+    
+
+    # SKIP ---------------------------------------------------------------------
+
+    skip = ce.check_yes_no(Screening.find('skip').text, 
+                           'skip in contaminant screening')
+    
+
+    # PARAMETERS ---------------------------------------------------------------
+    
+    if(skip == 'no') :
+        
+        parameter = Screening.find('parameter')
+        
+        if(parameter.get('name') == 'kmer-screening') :
+            
+            fasta_file = ce.check_fasta_file(
+                             parameter.find('contaminants-fasta-file').text)
+            
+            ksize = ce.check_integer(parameter.find('kmer-size').text,
+                                     'kmer-size in kmer-screening')
+
+            fraction = parameter.find('min-fraction').text
+            if ce.empty(fraction):
+                sys.exit("/!\ min-fraction in kmer-screening is empty")
+
+            # mode is optional, contaminants are dropped by default
+            mode = parameter.find('mode')
+            if (mode == None) or ce.empty(mode.text):
+                mode = 'drop'
+            else :
+                mode = mode.text.strip().lower()
+
+            param['screen'] = "{0}:{1}:{2}:{3}".format(fasta_file, ksize,
+                                                       fraction.strip(), mode)
+            pa.check_screen(param['screen'])
+
+        # if parameter name is not 'kmer-screening'
+        else :
+            sys.exit("/!\ Name of parameter 'kmer-screening' have been modified\
+ or replaced by something else. Please rename it 'kmer-screening'")
+            
+    return param
+
+
+
 def get_useful_parameters(Useful, param) :
     """
     Function that gets useful parameters.
@@ -490,9 +611,10 @@ def get_useful_parameters(Useful, param) :
     Returns param [dict] with added quality trimming parameters
     """
     
-    # check that useful parameter have 4 child
-    if not ce.check_child_number(Useful,4):
-        sys.exit("/!\ The XML file must contain exactly 4 useful parameters.")
+    # check that useful parameter have 4 child (or 5 with quality-binning)
+    if not (ce.check_child_number(Useful,4) or ce.check_child_number(Useful,5)):
+        sys.exit("/!\ The XML file must contain exactly 4 useful parameters \
+(and an optional 'quality-binning').")
         
 
     # PARAMETERS ---------------------------------------------------------------
@@ -536,6 +658,26 @@ def get_useful_parameters(Useful, param) :
 phred33 or phred64.")
                     
               
+        # QUALITY-BINNING -----------------------------------------------------
+
+        elif(parameter.get('name') == 'quality-binning') :
+
+            # get and check if skip text is not empty and if it's yes or no
+            skip = ce.check_yes_no(parameter.find('skip').text,
+                              'skip in quality-binning from useful parameters')
+
+            if(skip == 'no'):
+                # get the scheme, the Illumina one by default
+                scheme = parameter.find('scheme')
+                if (scheme == None) or ce.empty(scheme.text):
+                    param['binquality'] = 'illumina'
+                else :
+                    param['binquality'] = scheme.text.strip()
+
+                pa.check_binquality(param['binquality'])
+            continue
+
+
         # THREADS --------------------------------------------------------------      
         
         elif (parameter.get('name') == 'threads') :
@@ -558,24 +700,22 @@ phred33 or phred64.")
             
             if(skip == 'no') :
                 
-                # get compression format
+                # get compression format ('gz', 'bz2' or 'zst') and level
                 format = parameter.find('format').text
-                
-                # check if the text is not empty and lower it
-                if not empty(format) :
-                    format = format.strip()
-                    format = format.lower()
+                level = parameter.find('level')
 
-                    if(format == '.bz2' or format == '.gz'):
-                        param['compress'] = format
+                if (level != None) and not ce.empty(level.text) and \
+                   not ce.empty(format):
+                    format = '{0}:{1}'.format(format.strip(), level.text.strip())
 
-                    sys.exit("/!\ Value for format in compressed-output in \
-useful parameters can only be 'bz2' or 'gz'.")
+                # check the format and the level
+                format, level = ce.check_compression(format)
 
-                sys.exit("/!\ You haven't enter a text for format in \
-compressed-output in useful parameters.")
+                param['compress'] = format
+                if level != None :
+                    param['compress_level'] = level
 
-                continue
+            continue
                 
         else :
             sys.exit("You have modified a useful parameter name or enter a new \
@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+pipeline.py : module containing all functions that run the trimming steps of
+              PREMSEQ (Trimmomatic step 1, poly-X tail trimming and
+              Trimmomatic or native step 2), with the survival monitor of
+              each step.
+
+Dependency : commandline, governor, native, sinks, survival, trimmer (personal
+             modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import shlex, subprocess
+import time
+
+# Personal modules
+import commandline as cl
+import governor as gv
+import native as nt
+import sinks as sk
+import survival as sv
+import trimmer as tr
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def call(args, out, monitor=None):
+    """
+    Function that runs Trimmomatic. The process is given to the survival
+    monitor, which kills it if the survival is too low.
+
+    Takes three arguments :
+        - args [list] : the commandline
+        - out [file] : file receiving the standard error
+        - monitor [SurvivalMonitor] : or None
+
+    Returns anything (raises CalledProcessError if Trimmomatic fails).
+    """
+
+    process = subprocess.Popen(args, stderr=out)
+
+    if monitor is not None:
+        monitor.process = process
+        # the survival may have been decided before the process was known
+        if monitor.aborted and process.poll() is None:
+            process.kill()
+
+    if (process.wait() != 0) and not (monitor is not None and monitor.aborted):
+        raise subprocess.CalledProcessError(process.returncode, args)
+
+
+
+
+def run_trimming(loc, param, io):
+    """
+    Function that runs adapter trimming (step 1), poly-X tail trimming and
+    quality trimming (step 2) and deletes temporary files.
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - io [dict] : dictionnary which will contain all created files
+
+    Returns io [dict] : with the created files
+    """
+
+    nb = 0 # number of executed command
+
+    # duration of each step
+    if not 'timings' in io :
+        io['timings'] = []
+
+
+    # STEP 1 : ADAPTER TRIMMING ------------------------------------------------
+
+    if 'illuminaclip' in param :
+
+        start = time.time()
+
+        # survival of the first reads, from the trimlog
+        monitor = None
+        step_param = param
+        if 'min_survival' in param :
+            monitor = sv.SurvivalMonitor(param, 'adapter trimming (step 1)')
+            step_param = sv.monitored(param, monitor)
+
+        # Commandline generation
+        cmd_step1, io = cl.commandline_step_1(loc,step_param,nb,io)
+
+        # Launch commandline
+        args_1 = shlex.split(cmd_step1)
+        with open("{0}/step1_output.out".format(param['output']),"wt") as out1:
+            with gv.reservation(param, gv.trimmomatic_resources(param)[1]):
+                call(args_1, out1, monitor)
+
+        io = sk.close_sinks(io)
+        sv.check(param, monitor, io)
+        io['timings'].append(('step1', time.time() - start))
+
+        # Number of executed commandline becomes 1
+        nb = 1
+
+
+    # POLY-X TAIL TRIMMING -----------------------------------------------------
+
+    if 'polyx' in param :
+
+        start = time.time()
+        io = tr.polyx_step(param, nb, io)
+        io['timings'].append(('polyx', time.time() - start))
+
+        # poly-X trimmed files are the input of step 2
+        nb = 1
+
+
+    # STEP 2 : QUALITY TRIMMING ------------------------------------------------
+
+    if 'quality' in param :
+
+        start = time.time()
+
+        if(nb==1):
+            # Change step1 output files into step2 input files
+            io = cl.change_output_as_input(io, param)
+
+        if 'native' in param :
+            # multi-core native trimming, without the JVM
+            io = nt.native_step_2(param, nb, io)
+
+        else :
+            # survival of the first reads, from the trimlog
+            monitor = None
+            step_param = param
+            if 'min_survival' in param :
+                monitor = sv.SurvivalMonitor(param, 'quality trimming (step 2)')
+                step_param = sv.monitored(param, monitor)
+
+            # Commandline generation
+            cmd_step2 = cl.commandline_step_2(loc,step_param, nb, io)
+
+            # Launch commandline
+            args_2 = shlex.split(cmd_step2)
+            with open("{0}/step2_output.out".format(param['output']),"wt") as out2:
+                with gv.reservation(param, gv.trimmomatic_resources(param)[1]):
+                    call(args_2, out2, monitor)
+
+            io = sk.close_sinks(io)
+            sv.check(param, monitor, io)
+
+        io = sk.close_sinks(io)
+        io['timings'].append(('step2', time.time() - start))
+
+
+    # DELETE TEMPORARY FILES ---------------------------------------------------
+
+    if 'tmp' in io :
+
+        if param['layout'] == 'SE' :
+            os.remove(io['tmp'])
+
+        else:
+            os.remove(io['tmp'][0])
+            os.remove(io['tmp'][1])
+
+    # singletons which are not kept have been sent to the null device
+    if 'single' in io and os.devnull in io['single'] :
+        del io['single']
+
+    return io
@@ -0,0 +1,406 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+plan.py : module containing all functions to plan a run without running it
+          (dry run). The commands of Trimmomatic (step 1 and 2) and FastQC are
+          generated as the run would generate them, the disk footprint of each
+          intermediate and final file is estimated, and the wall time, CPU
+          time and memory of each step are estimated from the number of input
+          reads and a throughput model, calibrated from the runs recorded in
+          the run database if one is given. The plan is printed in JSON.
+
+Dependency : check_entries, commandline, fastq, governor, rundb (personal
+             modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import bz2
+import json
+import os
+import zlib
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+import governor as gv
+import rundb as db
+
+
+# default throughput of each step, in reads per second and per thread
+RATES = {'step1': 20000.0, 'polyx': 40000.0, 'step2': 60000.0,
+         'step2-native': 10000.0, 'fastqc': 25000.0}
+
+# seconds to start a JVM and load Trimmomatic or FastQC
+JVM_START = 1.5
+
+# memory of a native worker process MB
+NATIVE_WORKER = 64
+
+# size of the beginning of input files read to estimate their number of reads
+SAMPLE_BYTES = 1 << 20
+
+# disk footprint of FastQC work files
+FASTQC_BYTES = 50 * 1024 * 1024
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# INPUT SIZE -------------------------------------------------------------------
+
+def estimate_records(filename):
+    """
+    Function that estimates the number of records and the uncompressed size of
+    a FASTQ file from its beginning : gzip and bzip2 blocks are decompressed
+    to measure the compression ratio, zstd files get the usual ratio.
+
+    Takes one argument : filename [string] : the FASTQ file
+
+    Returns two arguments : - records [integer] : number of records
+                            - size [integer] : uncompressed size in bytes
+    """
+
+    ext = os.path.splitext(filename)[1]
+    size = os.path.getsize(filename)
+
+    if (ext == '.zst'):
+        handle = fq.open_fastq(filename)
+        text = handle.read(SAMPLE_BYTES)
+        handle.close()
+        consumed = min(size, len(text) / ce.RATIOS[ext])
+    else:
+        with open(filename, 'rb') as f:
+            data = f.read(SAMPLE_BYTES)
+        consumed = len(data)
+
+        if (ext == '.gz'):
+            new = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif (ext == '.bz2'):
+            new = bz2.BZ2Decompressor
+        else:
+            new = None
+
+        if new is None:
+            text = data
+        else:
+            # concatenated streams (bgzip blocks, ...) are all decompressed
+            chunks = []
+            while data:
+                decompressor = new()
+                try:
+                    chunks.append(decompressor.decompress(data))
+                except (zlib.error, IOError, EOFError):
+                    break
+                data = decompressor.unused_data
+            text = ''.join(chunks)
+
+    if not consumed or not text:
+        return 0, 0
+
+    scale = float(size) / consumed
+
+    return int(text.count('\n') / 4.0 * scale), int(len(text) * scale)
+
+
+
+# THROUGHPUT MODEL -------------------------------------------------------------
+
+def step_threads(param, step, nb_files=1):
+    """
+    Function that gives the number of threads of a step, as the run sizes it.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - step [string] : name of the step
+        - nb_files [integer] : number of files controlled by FastQC
+
+    Returns one argument : threads [integer]
+    """
+
+    if step in ('step1', 'step2'):
+        return gv.trimmomatic_resources(param)[0]
+
+    if (step == 'step2-native'):
+        return int(param['threads'])
+
+    if (step == 'fastqc'):
+        return gv.fastqc_resources(param, nb_files)[0] or 1
+
+    return 1
+
+
+
+def step_memory(param, step, threads):
+    """
+    Function that estimates the memory of a step, with the sizing of the
+    memory budget (which is also the memory used without budget).
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - step [string] : name of the step
+        - threads [integer] : number of threads of the step
+
+    Returns one argument : memory [integer] : MB
+    """
+
+    if step in ('step1', 'step2'):
+        return gv.TRIMMOMATIC_BASE + gv.TRIMMOMATIC_THREAD * threads + \
+               gv.JVM_OVERHEAD
+
+    if (step == 'fastqc'):
+        return gv.FASTQC_THREAD * threads + gv.JVM_OVERHEAD
+
+    if (step == 'step2-native'):
+        return NATIVE_WORKER * (threads + 1)
+
+    return NATIVE_WORKER
+
+
+
+def calibrate(filename):
+    """
+    Function that calibrates the throughput of each step (reads per second and
+    per thread) on the runs of the run database : the median of the recorded
+    runs, or the default throughput for steps which have never been recorded.
+
+    Takes one argument : filename [string] : the SQLite database, or None
+
+    Returns two arguments : - rates [dict] : throughput of each step
+                            - runs [dict] : number of runs used for each step
+    """
+
+    rates = dict(RATES)
+    runs = dict([(step, 0) for step in RATES])
+
+    if filename is None:
+        return rates, runs
+
+    measures = dict()
+
+    for layout, param, step, seconds, records in db.step_timings(filename):
+
+        if (step == 'step2' and 'native' in param):
+            step = 'step2-native'
+        if not step in RATES :
+            continue
+
+        # FastQC controls raw and trimmed files
+        nb_files = 2 if layout == 'SE' else 4
+        reads = records * (1 if layout == 'SE' else 2)
+        if (step == 'fastqc'):
+            reads *= 2
+
+        if step in ('step1', 'step2', 'fastqc'):
+            seconds -= JVM_START
+
+        threads = step_threads(param, step, nb_files)
+
+        if (seconds > 0):
+            measures.setdefault(step, []).append(reads / seconds / threads)
+
+    for step, values in measures.items():
+        values.sort()
+        rates[step] = values[len(values) // 2]
+        runs[step] = len(values)
+
+    return rates, runs
+
+
+
+def estimate_step(param, step, reads, rates, nb_files=1):
+    """
+    Function that estimates the wall time, CPU time and memory of a step.
+
+    Takes five arguments :
+        - param [dict] : dictionnary containing all parameters
+        - step [string] : name of the step
+        - reads [integer] : number of reads processed by the step
+        - rates [dict] : throughput of each step
+        - nb_files [integer] : number of files controlled by FastQC
+
+    Returns one argument : estimate [dict]
+    """
+
+    threads = step_threads(param, step, nb_files)
+    seconds = float(reads) / rates[step] / threads
+    start = JVM_START if step in ('step1', 'step2', 'fastqc') else 0
+
+    return {'threads': threads,
+            'wall_seconds': round(seconds + start, 1),
+            'cpu_seconds': round(seconds * threads + start, 1),
+            'memory_mb': step_memory(param, step, threads)}
+
+
+
+# PLAN -------------------------------------------------------------------------
+
+def listed(files):
+    """
+    Function that gives the files of an output as a list (SE outputs are
+    strings, PE outputs are tuples), without the null device.
+
+    Takes one argument : files [string or tuple] : output file(s)
+
+    Returns one argument : files [list]
+    """
+
+    files = [files] if isinstance(files, str) else list(files)
+
+    return [filename for filename in files if filename != os.devnull]
+
+
+
+def plan(loc, param, rundb=None):
+    """
+    Function that prints (in JSON) the plan of a run : the commands of step 1,
+    step 2 and FastQC, the disk footprint of intermediate and final files, and
+    the estimated wall time, CPU time and memory of each step and of the run.
+    Nothing is run nor written.
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - rundb [string] : run database calibrating the model, or None
+
+    Returns one argument : plan [dict]
+    """
+
+    inputs = list(param['input'])
+    if (param['layout'] == 'SE'):
+        inputs = inputs[:1]
+
+    # commands are built without creating, renaming or removing any file
+    param = dict(param)
+    param['dry_run'] = 'yes'
+
+    sizes = [estimate_records(filename) for filename in inputs]
+
+    # reads (not pairs) go through each step, and their uncompressed size
+    reads = sum([records for records, size in sizes])
+    volume = sum([size for records, size in sizes])
+
+    rates, runs = calibrate(rundb)
+
+    io = dict()
+    nb = 0
+    steps = []
+    intermediates = []
+
+    def add_step(step, program, command):
+        estimate = estimate_step(param, step, reads, rates)
+        estimate.update({'step': step, 'program': program, 'command': command})
+        steps.append(estimate)
+
+
+    # STEP 1 : ADAPTER TRIMMING ------------------------------------------------
+
+    if 'illuminaclip' in param :
+        cmd, io = cl.commandline_step_1(loc, param, nb, io)
+        add_step('step1', 'trimmomatic', cmd)
+
+        if 'quality' in param :
+            intermediates += [(filename, volume / len(inputs))
+                              for filename in listed(io['trimmed'])]
+        nb = 1
+
+
+    # POLY-X TAIL TRIMMING -----------------------------------------------------
+
+    if 'polyx' in param :
+        add_step('polyx', 'premseq', None)
+
+        io['trimmed'] = tuple(["{0}/polyx_{1}.fastq".format(param['scratch'],
+                                                ce.get_file_prefix(filename))
+                               for filename in inputs])
+        if (param['layout'] == 'SE'):
+            io['trimmed'] = io['trimmed'][0]
+
+        intermediates += [(filename, volume / len(inputs))
+                          for filename in listed(io['trimmed'])]
+        nb = 1
+
+
+    # STEP 2 : QUALITY TRIMMING ------------------------------------------------
+
+    if 'quality' in param :
+
+        if (nb == 1):
+            # step 1 outputs are renamed, they keep their footprint
+            io['tmp'] = cl.temporary_names(param)
+
+        if 'native' in param :
+            cmd, io = cl.commandline_input_output(param, '', nb, io)
+            add_step('step2-native', 'premseq', None)
+        else :
+            cmd = cl.commandline_step_2(loc, param, nb, io)
+            add_step('step2', 'trimmomatic', cmd)
+
+
+    # STEP 3 : QUALITY CONTROL -------------------------------------------------
+
+    if 'fastqc' in param and 'trimmed' in io :
+        nb_files = 2 * len(inputs)
+        cmd = cl.commandline_fastqc(loc, param, io)
+
+        estimate = estimate_step(param, 'fastqc', 2 * reads, rates, nb_files)
+        estimate.update({'step': 'fastqc', 'program': 'fastqc',
+                         'command': cmd})
+        steps.append(estimate)
+
+        intermediates.append(("{0}/Fastqc".format(param['scratch']),
+                              FASTQC_BYTES))
+
+
+    # FOOTPRINTS & TOTALS ------------------------------------------------------
+
+    scratch, output = ce.estimate_space(param)
+
+    outputs = []
+    for key in ['trimmed', 'single']:
+        if key in io :
+            outputs += listed(io[key])
+
+    # other native steps of the run are not in the throughput model
+    others = [key for key in ['exclude_tiles', 'detect_adapters', 'screen',
+                              'merge', 'normalize', 'qc', 'overrepresented',
+                              'compress', 'binquality'] if key in param]
+
+    result = {
+        'layout': param['layout'],
+        'inputs': [{'filename': filename,
+                    'size': os.path.getsize(filename),
+                    'uncompressed_size': size,
+                    'records': records}
+                   for filename, (records, size) in zip(inputs, sizes)],
+        'steps': steps,
+        'intermediates': [{'filename': filename, 'bytes': int(size)}
+                          for filename, size in intermediates],
+        'outputs': outputs,
+        'disk': {'scratch': {'directory': param['scratch'], 'bytes': scratch,
+                             'available': ce.free_space(param['scratch'])},
+                 'output': {'directory': param['output'], 'bytes': output,
+                            'available': ce.free_space(param['output'])}},
+        'estimate': {
+            'wall_seconds': round(sum([step['wall_seconds']
+                                       for step in steps]), 1),
+            'cpu_seconds': round(sum([step['cpu_seconds']
+                                      for step in steps]), 1),
+            'memory_mb': max([step['memory_mb'] for step in steps] or [0]),
+            'threads': max([step['threads'] for step in steps] or [1])},
+        'model': {'rates': rates, 'calibration_runs': runs,
+                  'database': rundb},
+        'not_estimated': others,
+    }
+
+    print json.dumps(result, indent=2, sort_keys=True)
+
+    return result
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+preflight.py : module containing all functions to check the integrity of the
+               input files before the trimming starts, one process per file.
+               Each file is read by blocks in one pass : the decompression
+               checks the gzip, bzip2 and zstd streams and trailers (CRC and
+               size), records are counted, and a sample of records is checked for the
+               FASTQ structure. Paired files must have the same number of
+               records. Record counts are written in the statistic file.
+
+Dependency : commandline, fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Personal modules
+import commandline as cl
+import fastq as fq
+
+
+# size of the read blocks
+BLOCK_SIZE = 1 << 20
+
+# the records of one block every SAMPLE_EVERY blocks are checked (and the
+# records of the first and last blocks)
+SAMPLE_EVERY = 16
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# CHECK RECORDS ----------------------------------------------------------------
+
+def check_block(block, line):
+    """
+    Function that checks the structure of the complete records of a block :
+    header beginning with '@', separator beginning with '+', sequence and
+    quality of the same length, and printable quality characters.
+
+    Takes two arguments :
+        - block [string] : a block of the file
+        - line [integer] : index of the line following the first end of line
+                           of the block, or 0 for the first block of the file
+
+    Returns one argument : error [string] : the first error found, or None
+    """
+
+    lines = block.split('\n')
+
+    # the last line may be incomplete
+    lines.pop()
+
+    # skip the first line, which may have begun in the previous block
+    if (line > 0):
+        lines = lines[1:]
+
+    # skip the end of the first record
+    skip = (4 - line % 4) % 4
+    line += skip
+    lines = lines[skip:]
+
+    for i in range(0, len(lines) - 3, 4):
+        header, seq, plus, qual = [text.rstrip('\r') for text in lines[i:i + 4]]
+
+        if not header.startswith('@') or not plus.startswith('+'):
+            return "record at line {0} is not a FASTQ record".format(line + i + 1)
+
+        if (len(seq) != len(qual)):
+            return "record at line {0} has a sequence and a quality of " \
+                   "different lengths".format(line + i + 1)
+
+        if qual and (min(qual) < '!' or max(qual) > '~'):
+            return "record at line {0} has invalid quality characters" \
+                   .format(line + i + 1)
+
+    return None
+
+
+
+def check_file(filename):
+    """
+    Function that checks the integrity of a FASTQ file (compressed or not) and
+    counts its records.
+
+    Takes one argument : filename [string] : the FASTQ file
+
+    Returns two arguments : - records [integer] : number of records
+                            - error [string] : the error found, or None
+    """
+
+    # zstd files are decompressed by the 'zstd' program, whose exit status
+    # tells if the file is valid
+    process = None
+    if (os.path.splitext(filename)[1] == '.zst'):
+        try:
+            process = subprocess.Popen(['zstd', '-dcq', filename],
+                                       bufsize=BLOCK_SIZE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+        except OSError as exception:
+            return 0, "can't run zstd ({0})".format(exception)
+        handle = process.stdout
+    else:
+        handle = fq.open_fastq(filename)
+
+    lines = 0
+    nb = 0
+    last = ''
+    error = None
+
+    try:
+        block = handle.read(BLOCK_SIZE)
+
+        while block:
+            following = handle.read(BLOCK_SIZE)
+
+            if (nb % SAMPLE_EVERY == 0 or not following) and error is None:
+                # the line following the first end of line of the block
+                error = check_block(block, lines + 1 if nb > 0 else 0)
+
+            lines += block.count('\n')
+            last = block
+            block = following
+            nb += 1
+
+    # the decompressors raise IOError, EOFError, struct.error or zlib.error
+    # depending on where the file is corrupted or truncated
+    except Exception as exception:
+        return 0, "corrupted or truncated compressed file ({0})".format(exception)
+
+    finally:
+        handle.close()
+
+        if process is not None:
+            message = process.stderr.read().strip()
+            if (process.wait() != 0):
+                error = "corrupted or truncated compressed file ({0})".format(
+                        message or 'zstd failed')
+
+    if error is not None:
+        return 0, error
+
+    # blank lines at the end of the file, or last line without end of line
+    if last.endswith('\n'):
+        lines -= len(last) - len(last.rstrip('\n')) - 1
+    elif last:
+        lines += 1
+
+    if (lines % 4 != 0):
+        return 0, "file ends with an incomplete record ({0} lines)".format(lines)
+
+    return lines // 4, None
+
+
+
+# PREFLIGHT --------------------------------------------------------------------
+
+def preflight(param, files, inout):
+    """
+    Function that checks all input files in parallel (one process per file) and
+    stops with all errors found. The number of records of each file is written
+    in the statistic file.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - files [list] : input read files
+        - inout [dict] : dictionnary containing all generated filenames
+
+    Returns inout [dict] with the statistic section of input files
+    """
+
+    if (len(files) > 1):
+        pool = multiprocessing.Pool(len(files))
+        results = pool.map(check_file, files)
+        pool.close()
+        pool.join()
+    else:
+        results = map(check_file, files)
+
+    errors = ["{0} : {1}".format(filename, error)
+              for filename, (records, error) in zip(files, results)
+              if error is not None]
+
+    if not errors and len(files) == 2 and results[0][0] != results[1][0]:
+        errors = ["paired files do not have the same number of records "
+                  "({0} and {1})".format(results[0][0], results[1][0])]
+
+    if errors :
+        sys.exit("/!\ Input files are not valid :\n    " + "\n    ".join(errors))
+
+    inout = cl.add_stat_section(inout, 'Input Files',
+                                ['Filename', 'Size', 'Records'],
+                                [[filename, os.path.getsize(filename), records]
+                                 for filename, (records, error)
+                                 in zip(files, results)])
+
+    return inout
@@ -0,0 +1,298 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+preview.py : module containing all functions to preview the trimming of a
+             library. A subset of reads (or pairs) is reservoir-sampled in one
+             pass over the input(s), the configured trimming is run on this
+             subset only, and the survival rate, the length distribution and
+             the runtime projected for the whole input are reported.
+
+Dependency : check_entries, fastq, pipeline, plan (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import random
+import shutil
+import sys
+import time
+
+# Personal modules
+import check_entries as ce
+import fastq as fq
+import pipeline as pl
+import plan as pn
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# SAMPLING ---------------------------------------------------------------------
+
+def reservoir_sample(inputs, size, seed=0):
+    """
+    Function that samples uniformly 'size' reads (SE) or pairs (PE) in one
+    streaming pass over the input file(s) (reservoir sampling).
+
+    Takes three arguments :
+        - inputs [list] : input read file(s)
+        - size [integer] : number of reads or pairs to sample
+        - seed [integer] : seed of the random generator
+
+    Returns two arguments :
+        - sample [list] : sampled reads (tuples of one record for SE data and
+                          of two records for PE data)
+        - total [integer] : number of reads or pairs in the input(s)
+    """
+
+    generator = random.Random(seed)
+
+    handles = [fq.open_fastq(filename) for filename in inputs]
+
+    if (len(handles) == 1):
+        records = ((record,) for record in fq.read_records(handles[0]))
+    else:
+        records = fq.read_pairs(handles[0], handles[1])
+
+    sample = []
+    total = 0
+
+    for item in records:
+        total += 1
+
+        # fill the reservoir, then replace its elements with a decreasing
+        # probability
+        if (total <= size):
+            sample.append(item)
+        else:
+            index = generator.randrange(total)
+            if (index < size):
+                sample[index] = item
+
+    for handle in handles:
+        handle.close()
+
+    return sample, total
+
+
+
+def write_sample(sample, inputs, directory):
+    """
+    Function that writes sampled reads in the preview directory, with the
+    same prefix as the input files.
+
+    Takes three arguments :
+        - sample [list] : sampled reads
+        - inputs [list] : input read file(s)
+        - directory [string] : preview directory
+
+    Returns one argument : files [list] : the sampled read file(s)
+    """
+
+    files = []
+
+    for nb, filename in enumerate(inputs):
+        prefix = ce.get_file_prefix(filename)
+        sampled = "{0}/{1}.fastq".format(directory, prefix)
+
+        handle = fq.open_fastq(sampled, 'w')
+        fq.write_records(handle, [item[nb] for item in sample])
+        handle.close()
+
+        files.append(sampled)
+
+    return files
+
+
+
+# PROJECTION -------------------------------------------------------------------
+
+def projected_time(param, seconds, scale):
+    """
+    Function that projects the trimming time of the sample on all reads : the
+    start of each Trimmomatic call (step 1 and step 2, JVM_START seconds of the
+    throughput model of plan) is paid once whatever the number of reads, only
+    the rest of the time is scaled.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - seconds [float] : trimming time of the sample
+        - scale [float] : number of reads over number of sampled reads
+
+    Returns one argument : seconds [float] : projected trimming time
+    """
+
+    calls = ('illuminaclip' in param) + \
+            ('quality' in param and not 'native' in param)
+    start = min(seconds, calls * pn.JVM_START)
+
+    return start + (seconds - start) * scale
+
+
+
+# REPORT -----------------------------------------------------------------------
+
+def read_lengths(filename):
+    """
+    Function that gets the length of all reads of a FASTQ file.
+
+    Takes one argument : filename [string]
+
+    Returns one argument : lengths [list]
+    """
+
+    handle = fq.open_fastq(filename)
+    lengths = [len(record[1]) for record in fq.read_records(handle)]
+    handle.close()
+
+    return lengths
+
+
+
+def length_distribution(lengths, bins=10):
+    """
+    Function that summarises a length distribution.
+
+    Takes two arguments : - lengths [list] : length of reads
+                          - bins [integer] : width of histogram bins
+
+    Returns one argument : lines [list] : lines of the report
+    """
+
+    if not lengths:
+        return ["  no surviving read"]
+
+    lengths = sorted(lengths)
+    nb = len(lengths)
+
+    lines = ["  min {0}   mean {1:.1f}   median {2}   max {3}".format(
+             lengths[0], float(sum(lengths)) / nb, lengths[nb // 2],
+             lengths[-1])]
+
+    histogram = dict()
+    for length in lengths:
+        start = (length // bins) * bins
+        histogram[start] = histogram.get(start, 0) + 1
+
+    for start in sorted(histogram):
+        lines.append("  {0:>4}-{1:<4} {2:>6.2f}%".format(start, start + bins - 1,
+                                               100.0 * histogram[start] / nb))
+
+    return lines
+
+
+
+def preview(loc, param, size):
+    """
+    Function that runs the trimming on a reservoir-sampled subset of reads and
+    reports the projected survival rate, length distribution and runtime. The
+    sampled and trimmed reads are written in 'preview_reads/' in the scratch
+    directory (removed at the end), and the report is printed and written in
+    'preview/preview.txt'.
+
+    Takes three arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - size [integer] : number of reads (SE) or pairs (PE) to sample
+
+    Returns anything.
+    """
+
+    if ('illuminaclip' not in param) and ('quality' not in param):
+        sys.exit("/!\ Preview needs adapter or quality trimming parameters.")
+
+    if (size < 1):
+        sys.exit("/!\ Number of reads to preview must be a positive integer.")
+
+    inputs = list(param['input'])
+    if (param['layout'] == 'SE'):
+        inputs = inputs[:1]
+
+    directory = "{0}/preview_reads".format(param['scratch'])
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+
+
+    # SAMPLING -----------------------------------------------------------------
+
+    start = time.time()
+    sample, total = reservoir_sample(inputs, size)
+    files = write_sample(sample, inputs, directory)
+    sampling_time = time.time() - start
+
+    nb = len(sample)
+    del sample
+
+
+    # TRIMMING OF THE SAMPLE ---------------------------------------------------
+
+    # same parameters, without the steps that come after trimming
+    sub_param = dict(param)
+    sub_param['input'] = files
+    sub_param['output'] = directory
+    sub_param['scratch'] = directory
+    sub_param['keep_singleton'] = 'yes'
+
+    for key in ['fastqc', 'normalize', 'compress']:
+        sub_param.pop(key, None)
+
+    start = time.time()
+    io = pl.run_trimming(loc, sub_param, dict())
+    trimming_time = time.time() - start
+
+
+    # REPORT -------------------------------------------------------------------
+
+    if (param['layout'] == 'SE'):
+        lengths = read_lengths(io['trimmed'])
+        survivors = len(lengths)
+        unit = 'reads'
+    else:
+        lengths_1 = read_lengths(io['trimmed'][0])
+        lengths_2 = read_lengths(io['trimmed'][1])
+        single_1 = len(read_lengths(io['single'][0]))
+        single_2 = len(read_lengths(io['single'][1]))
+        lengths = lengths_1 + lengths_2
+        survivors = len(lengths_1)
+        unit = 'pairs'
+
+    scale = float(total) / max(nb, 1)
+
+    lines = ["PREMSEQ preview",
+             "Sampled {0}: {1} out of {2} ({3:.2f}%)".format(unit, nb, total,
+                                                100.0 * nb / max(total, 1)),
+             "Surviving {0}: {1} ({2:.2f}%)".format(unit, survivors,
+                                              100.0 * survivors / max(nb, 1))]
+
+    if (param['layout'] == 'PE'):
+        lines.append("Forward only surviving: {0} ({1:.2f}%)".format(single_1,
+                                               100.0 * single_1 / max(nb, 1)))
+        lines.append("Reverse only surviving: {0} ({1:.2f}%)".format(single_2,
+                                               100.0 * single_2 / max(nb, 1)))
+
+    lines.append("Length distribution of surviving reads:")
+    lines += length_distribution(lengths)
+
+    lines.append("Sampling time: {0:.1f} s".format(sampling_time))
+    lines.append("Trimming time on sample: {0:.1f} s".format(trimming_time))
+    lines.append("Projected trimming time for all {0}: {1:.1f} s".format(unit,
+                        projected_time(param, trimming_time, scale)))
+
+    shutil.rmtree(directory)
+
+    report = "{0}/preview".format(param['output'])
+    if not os.path.isdir(report):
+        os.mkdir(report)
+
+    with open("{0}/preview.txt".format(report), "wt") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print "\n".join(lines)
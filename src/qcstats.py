@@ -0,0 +1,626 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+qcstats.py : module containing the native quality control of PREMSEQ. For each
+             read file, per cycle quality counts (cycle x quality character),
+             per cycle base counts (cycle x base) and the length histogram are
+             accumulated by batches in fixed-size count arrays. Reads, bases
+             and qualities are also counted per lane and tile, parsed from the
+             Illumina read names. Statistics of batches, shards or files can be
+             merged, and quantiles and percentages are only computed from the
+             counts at the end. Reads of bad tiles can be removed before
+             trimming.
+
+Dependency : check_entries, commandline, fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import array
+import collections
+import itertools
+import multiprocessing
+import os
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+
+
+# counted bases, other characters are counted as N
+BASES = 'ACGTN'
+
+# reported quality percentiles
+PERCENTILES = [10, 25, 50, 75, 90]
+
+# tiles whose mean quality is this much below the median tile are bad
+AUTO_DROP = 5
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class TileStats(object):
+    """
+    Counters of reads, bases and quality characters (sum of their codes) of
+    each (lane, tile). A tile is given a slot in the arrays the first time it
+    is seen.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.index = {}
+        self.reads = array.array('L')
+        self.bases = array.array('L')
+        self.quals = array.array('d')
+
+
+    def slot(self, key):
+        """
+        Returns the slot of a tile in the arrays.
+        """
+
+        i = self.index.get(key)
+
+        if i is None:
+            i = len(self.keys)
+            self.index[key] = i
+            self.keys.append(key)
+            self.reads.append(0)
+            self.bases.append(0)
+            self.quals.append(0)
+
+        return i
+
+
+    def add_batch(self, records):
+        """
+        Counts a batch of records.
+        """
+
+        slots = [self.slot(key) for key in
+                 map(parse_tile, [record[0] for record in records])]
+
+        for i, record in zip(slots, records):
+            self.reads[i] += 1
+            self.bases[i] += len(record[3])
+            self.quals[i] += sum(bytearray(record[3]))
+
+
+    def merge(self, other):
+        """
+        Adds the counters of another TileStats.
+        """
+
+        for j, key in enumerate(other.keys):
+            i = self.slot(key)
+            self.reads[i] += other.reads[j]
+            self.bases[i] += other.bases[j]
+            self.quals[i] += other.quals[j]
+
+        return self
+
+
+    def mean_quality(self, i, offset):
+        """
+        Returns the mean quality of the bases of a tile.
+        """
+
+        return self.quals[i] / max(self.bases[i], 1) - offset
+
+
+
+class QualityStats(object):
+    """
+    Count arrays of a read file : for each cycle, an array of 128 counters
+    indexed by the quality character and an array of counters of bases
+    (A, C, G, T, N), the histogram of read lengths and the counters of each
+    tile.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.quals = []
+        self.bases = []
+        self.lengths = collections.Counter()
+        self.tiles = TileStats()
+
+
+    def grow(self, cycles):
+        """
+        Adds the count arrays of new cycles.
+        """
+
+        while len(self.quals) < cycles:
+            self.quals.append(array.array('L', [0] * 128))
+            self.bases.append(array.array('L', [0] * len(BASES)))
+
+
+    def add_batch(self, records):
+        """
+        Counts a batch of records. Reads are transposed into cycle columns, and
+        each column is counted with string methods.
+        """
+
+        if not records:
+            return
+
+        seqs = [record[1] for record in records]
+        quals = [record[3] for record in records]
+
+        lengths = map(len, seqs)
+        self.reads += len(records)
+        self.lengths.update(lengths)
+        self.grow(max(lengths))
+
+        for counts, column in zip(self.quals,
+                                  itertools.izip_longest(*quals, fillvalue='')):
+            column = ''.join(column)
+            for char in set(column):
+                counts[ord(char)] += column.count(char)
+
+        for counts, column in zip(self.bases,
+                                  itertools.izip_longest(*seqs, fillvalue='')):
+            column = ''.join(column).upper()
+            known = 0
+            for i, base in enumerate(BASES[:-1]):
+                nb = column.count(base)
+                counts[i] += nb
+                known += nb
+            counts[-1] += len(column) - known
+
+        self.tiles.add_batch(records)
+
+
+    def merge(self, other):
+        """
+        Adds the counts of another QualityStats (batch, shard or file).
+        """
+
+        self.grow(len(other.quals))
+        self.reads += other.reads
+        self.lengths.update(other.lengths)
+        self.tiles.merge(other.tiles)
+
+        for counts, other_counts in zip(self.quals, other.quals):
+            for i, nb in enumerate(other_counts):
+                if nb:
+                    counts[i] += nb
+
+        for counts, other_counts in zip(self.bases, other.bases):
+            for i, nb in enumerate(other_counts):
+                counts[i] += nb
+
+        return self
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# READ NAMES -------------------------------------------------------------------
+
+def parse_tile(header):
+    """
+    Function that gets the lane and the tile of a read from its name, without
+    regular expressions. Two formats are known :
+        - Casava 1.8 : @<instrument>:<run>:<flowcell>:<lane>:<tile>:<x>:<y> ...
+        - older : @<instrument>:<lane>:<tile>:<x>:<y>#<index>/<read>
+
+    Takes one argument : header [string] : the header line of the read
+
+    Returns one argument : (lane, tile) [tuple] : ('0', '0') if unknown
+    """
+
+    fields = header.split(' ', 1)[0].split(':')
+
+    if (len(fields) >= 7):
+        return fields[3], fields[4]
+
+    if (len(fields) == 5):
+        return fields[1], fields[2]
+
+    return '0', '0'
+
+
+
+def tile_order(key):
+    """
+    Function giving the sort key of a (lane, tile), numbers being sorted as
+    numbers.
+    """
+
+    return [int(field) if field.isdigit() else field for field in key]
+
+
+
+# STATISTICS -------------------------------------------------------------------
+
+def percentiles(counts, offset, wanted=PERCENTILES):
+    """
+    Function that computes the mean and percentiles of a quality histogram.
+
+    Takes three arguments :
+        - counts [array] : counts of each quality character
+        - offset [integer] : phred offset of qualities
+        - wanted [list] : percentiles to compute
+
+    Returns one argument : values [list] : mean, then percentiles
+    """
+
+    total = sum(counts)
+    if not total:
+        return [0] + [0 for percent in wanted]
+
+    mean = float(sum([i * nb for i, nb in enumerate(counts)])) / total - offset
+
+    values = []
+    cumul = 0
+    targets = iter([percent * total / 100.0 for percent in wanted])
+    target = next(targets, None)
+
+    for i, nb in enumerate(counts):
+        cumul += nb
+        while target is not None and cumul >= target :
+            values.append(i - offset)
+            target = next(targets, None)
+
+    return [round(mean, 2)] + values
+
+
+
+def file_stats(filename, size=10000):
+    """
+    Function that counts the statistics of a read file by batches.
+
+    Takes two arguments : - filename [string] : the FASTQ file
+                          - size [integer] : number of reads in a batch
+
+    Returns one argument : stats [QualityStats]
+    """
+
+    stats = QualityStats()
+
+    handle = fq.open_fastq(filename)
+    for batch in fq.read_batches(handle, size):
+        stats.add_batch(batch)
+    handle.close()
+
+    return stats
+
+
+
+def summary(filename, stats, offset):
+    """
+    Function that summarises the statistics of a read file.
+
+    Takes three arguments : - filename [string] : the FASTQ file
+                            - stats [QualityStats]
+                            - offset [integer] : phred offset of the reads
+
+    Returns one argument : row [list] : row of the statistic file
+    """
+
+    bases = [sum([counts[i] for counts in stats.bases])
+             for i in range(len(BASES))]
+    total = max(sum(bases), 1)
+
+    quals = array.array('L', [0] * 128)
+    for counts in stats.quals:
+        for i, nb in enumerate(counts):
+            quals[i] += nb
+
+    return [filename, stats.reads, sum(bases),
+            round(float(sum(bases)) / max(stats.reads, 1), 2),
+            percentiles(quals, offset, [])[0],
+            round(100.0 * (bases[1] + bases[2]) / total, 2),
+            round(100.0 * bases[4] / total, 2)]
+
+
+
+# OUTPUTS ----------------------------------------------------------------------
+
+def write_qc_file(filename, stats, offset):
+    """
+    Function that writes the per cycle quality, the per cycle composition and
+    the length distribution of a read file, in sections as in the statistic
+    file.
+
+    Takes three arguments : - filename [string] : the output file
+                            - stats [QualityStats]
+                            - offset [integer] : phred offset of the reads
+
+    Returns anything.
+    """
+
+    with open(filename, 'wt') as f:
+
+        f.write("##Per Cycle Quality\n")
+        f.write("\t".join(["Cycle", "Mean"] +
+                          ["Percentile {0}".format(percent)
+                           for percent in PERCENTILES]) + "\n")
+        for cycle, counts in enumerate(stats.quals):
+            f.write("\t".join([str(value) for value in
+                               [cycle + 1] + percentiles(counts, offset)]) + "\n")
+
+        f.write("##Per Cycle Composition\n")
+        f.write("\t".join(["Cycle"] + list(BASES)) + "\n")
+        for cycle, counts in enumerate(stats.bases):
+            total = max(sum(counts), 1)
+            f.write("\t".join([str(value) for value in
+                               [cycle + 1] + [round(100.0 * nb / total, 2)
+                                              for nb in counts]]) + "\n")
+
+        f.write("##Length Distribution\n")
+        f.write("Length\tReads\n")
+        for length in sorted(stats.lengths):
+            f.write("{0}\t{1}\n".format(length, stats.lengths[length]))
+
+
+
+def tile_rows(filename, raw, offset, trimmed=None):
+    """
+    Function that gives the statistics of each tile of a read file : reads,
+    mean quality and, if the file has been trimmed, the percentage of
+    surviving reads and the percentage of bases trimmed away.
+
+    Takes four arguments :
+        - filename [string] : the raw read file
+        - raw [QualityStats] : statistics of the raw reads
+        - offset [integer] : phred offset of the raw reads
+        - trimmed [TileStats] : tiles of the trimming output or None
+
+    Returns one argument : rows [list] : one row per tile
+    """
+
+    tiles = raw.tiles
+    rows = []
+
+    for key in sorted(tiles.keys, key=tile_order):
+        i = tiles.index[key]
+        row = [filename, key[0], key[1], tiles.reads[i],
+               round(tiles.mean_quality(i, offset), 2)]
+
+        if trimmed is not None:
+            j = trimmed.index.get(key)
+            reads = trimmed.reads[j] if j is not None else 0
+            bases = trimmed.bases[j] if j is not None else 0
+            row += [round(100.0 * reads / max(tiles.reads[i], 1), 2),
+                    round(100.0 - 100.0 * bases / max(tiles.bases[i], 1), 2)]
+        else:
+            row += ['NA', 'NA']
+
+        rows.append(row)
+
+    return rows
+
+
+
+def quality_control(param, raw, trimmed, tiles=None):
+    """
+    Function that runs the native quality control on raw and trimmed read
+    files (one process per file, up to the number of threads). Statistics of
+    each file are written in 'qc_<file prefix>.txt' in the output directory.
+    The phred offset is the one of the run (given, or detected on the raw
+    reads) : trimmed reads keep it, unless TOPHRED33 or TOPHRED64 is choosen.
+    The surviving reads of each tile are those of the trimming outputs : tiles
+    counted before screening and merging are given if these steps changed the
+    trimmed files.
+
+    Takes four arguments :
+        - param [dict] : dictionnary containing all parameters
+        - raw [list] : raw read files
+        - trimmed [list] : trimmed read files (same order, or empty)
+        - tiles [list] : tiles of the trimming outputs [TileStats], or None
+                         to use those of the trimmed files
+
+    Returns two arguments :
+        - rows [list] : summary row of each file
+        - tiles [list] : rows of each tile of raw files
+    """
+
+    files = raw + trimmed
+    nb_process = min(int(param.get('threads', 1)), len(files))
+
+    if (nb_process > 1):
+        pool = multiprocessing.Pool(nb_process)
+        all_stats = pool.map(file_stats, files)
+        pool.close()
+        pool.join()
+    else:
+        all_stats = map(file_stats, files)
+
+    # offsets are never guessed from trimmed reads, whose lowest qualities may
+    # have been trimmed away : they are those of the raw reads, re-encoded
+    offsets = [fq.get_phred(param, filename) for filename in raw]
+    offsets += [fq.get_output_phred(param, filename)
+                for filename in raw[:len(trimmed)]]
+
+    rows = []
+    for filename, stats, offset in zip(files, all_stats, offsets):
+        write_qc_file("{0}/qc_{1}.txt".format(param['output'],
+                                             ce.get_file_prefix(filename)),
+                      stats, offset)
+        rows.append(summary(filename, stats, offset))
+
+    if tiles is None and trimmed :
+        tiles = [stats.tiles for stats in all_stats[len(raw):]]
+
+    rows_tiles = []
+    for nb, filename in enumerate(raw):
+        trimmed_tiles = tiles[nb] if tiles else None
+        rows_tiles += tile_rows(filename, all_stats[nb], offsets[nb],
+                                trimmed_tiles)
+
+    return rows, rows_tiles
+
+
+
+# TILES ------------------------------------------------------------------------
+
+def file_tiles(filename, size=10000):
+    """
+    Function that counts the tile statistics of a read file.
+
+    Takes two arguments : - filename [string] : the FASTQ file
+                          - size [integer] : number of reads in a batch
+
+    Returns one argument : tiles [TileStats]
+    """
+
+    tiles = TileStats()
+
+    handle = fq.open_fastq(filename)
+    for batch in fq.read_batches(handle, size):
+        tiles.add_batch(batch)
+    handle.close()
+
+    return tiles
+
+
+
+def output_tiles(param, files):
+    """
+    Function that counts the tile statistics of the trimming outputs (one
+    process per file, up to the number of threads), before other steps remove
+    reads from them.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - files [list] : trimmed read files
+
+    Returns one argument : tiles [list] : tiles of each file [TileStats], or
+                                          None if reads are not in files
+    """
+
+    # reads sent to another sink than a file can't be read again
+    if not all([os.path.isfile(filename) for filename in files]):
+        return None
+
+    nb_process = min(int(param.get('threads', 1)), len(files))
+
+    if (nb_process > 1):
+        pool = multiprocessing.Pool(nb_process)
+        tiles = pool.map(file_tiles, files)
+        pool.close()
+        pool.join()
+    else:
+        tiles = map(file_tiles, files)
+
+    return tiles
+
+
+
+# TILE FILTER ------------------------------------------------------------------
+
+
+def bad_tiles(param, filename):
+    """
+    Function that gets the tiles to exclude : the given list of lane:tile, or
+    with 'auto', the tiles whose mean quality is AUTO_DROP below the median
+    tile.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - filename [string] : read file used by 'auto'
+
+    Returns one argument : excluded [set] : (lane, tile) to exclude
+    """
+
+    if (param['exclude_tiles'] != 'auto'):
+        return set([tuple(item.strip().split(':'))
+                    for item in param['exclude_tiles'].split(',')])
+
+    tiles = file_tiles(filename)
+    offset = fq.get_phred(param, filename)
+
+    means = [tiles.mean_quality(i, offset) for i in range(len(tiles.keys))]
+    if not means :
+        return set()
+
+    median = sorted(means)[len(means) // 2]
+
+    return set([key for key, mean in zip(tiles.keys, means)
+                if mean < median - AUTO_DROP])
+
+
+
+def filter_tiles(param, inout, size=10000):
+    """
+    Function that removes the reads (or pairs, from the tile of read 1) of
+    bad tiles before trimming. Filtered inputs are written in 'filtered/' in
+    the scratch directory, with the same prefix as the inputs, and are used
+    as inputs of the trimming.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames
+        - size [integer] : number of reads in a batch
+
+    Returns two arguments :
+        - param [dict] : with the filtered inputs
+        - inout [dict] : with the filtered files and the removed reads
+    """
+
+    inputs = list(param['input'])
+    if (param['layout'] == 'SE'):
+        inputs = inputs[:1]
+
+    excluded = bad_tiles(param, inputs[0])
+
+    # no bad tile : inputs are used as they are
+    if not excluded :
+        print "No tile excluded."
+        return param, inout
+
+    directory = "{0}/filtered".format(param['scratch'])
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+
+    filtered = ["{0}/{1}.fastq".format(directory, ce.get_file_prefix(filename))
+                for filename in inputs]
+
+    readers = [fq.open_fastq(filename) for filename in inputs]
+    writers = [fq.open_fastq(filename, 'w') for filename in filtered]
+    removed = collections.Counter()
+
+    if (len(inputs) == 1):
+        records = ((record,) for record in fq.read_records(readers[0]))
+    else:
+        records = fq.read_pairs(readers[0], readers[1])
+
+    batch = []
+    for item in records:
+        key = parse_tile(item[0][0])
+
+        if key in excluded:
+            removed[key] += 1
+            continue
+
+        batch.append(item)
+
+        if (len(batch) == size):
+            for nb, writer in enumerate(writers):
+                fq.write_records(writer, [reads[nb] for reads in batch])
+            batch = []
+
+    for nb, writer in enumerate(writers):
+        fq.write_records(writer, [reads[nb] for reads in batch])
+
+    for handle in readers + writers:
+        handle.close()
+
+    param['input'] = filtered
+    inout['filtered'] = filtered
+
+    inout = cl.add_stat_section(inout, 'Excluded Tiles',
+                                ['Lane', 'Tile', 'Removed Reads'],
+                                [[key[0], key[1], removed[key]]
+                                 for key in sorted(excluded, key=tile_order)])
+
+    return param, inout
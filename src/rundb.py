@@ -0,0 +1,274 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+rundb.py : module containing all functions to record premseq runs in a SQLite
+           database and to query it. Each run appends its parameters, the
+           survival and timing of each trimming step (read from the
+           Trimmomatic or native logs) and all the sections of its statistic
+           file, in one transaction. The database is in WAL mode with a busy
+           timeout, so concurrent runs can write in the same database.
+
+Dependency : none
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import time
+
+
+# seconds to wait for the lock of the database held by another run
+BUSY_TIMEOUT = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT,
+    host TEXT,
+    layout TEXT,
+    inputs TEXT,
+    output TEXT,
+    parameters TEXT,
+    duration REAL
+);
+
+CREATE TABLE IF NOT EXISTS steps (
+    id INTEGER PRIMARY KEY,
+    run INTEGER REFERENCES runs(id),
+    step TEXT,
+    seconds REAL,
+    input INTEGER,
+    surviving INTEGER,
+    forward_only INTEGER,
+    reverse_only INTEGER,
+    dropped INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS stats (
+    run INTEGER REFERENCES runs(id),
+    section TEXT,
+    line INTEGER,
+    name TEXT,
+    value TEXT
+);
+
+CREATE INDEX IF NOT EXISTS steps_run ON steps(run);
+CREATE INDEX IF NOT EXISTS stats_run ON stats(run, section);
+
+CREATE VIEW IF NOT EXISTS run_survival AS
+    SELECT runs.id AS run, runs.started, runs.inputs, runs.output,
+           first.input AS input, last.surviving AS surviving,
+           ROUND(100.0 * last.surviving / MAX(first.input, 1), 2) AS percentage
+    FROM runs
+    JOIN steps AS first
+      ON first.id = (SELECT MIN(id) FROM steps
+                     WHERE steps.run = runs.id AND input IS NOT NULL)
+    JOIN steps AS last
+      ON last.id = (SELECT MAX(id) FROM steps
+                    WHERE steps.run = runs.id AND input IS NOT NULL);
+"""
+
+# queries given by name to '--query'
+QUERIES = {
+    'runs': "SELECT id, started, host, layout, inputs, output, "
+            "ROUND(duration, 1) AS duration FROM runs ORDER BY id",
+    'steps': "SELECT run, step, ROUND(seconds, 1) AS seconds, input, surviving, "
+             "forward_only, reverse_only, dropped FROM steps ORDER BY run, id",
+    'survival': "SELECT * FROM run_survival ORDER BY percentage",
+}
+
+# summary lines of the Trimmomatic (and native) logs
+SE_SUMMARY = re.compile(r"Input Reads: (\d+) Surviving: (\d+) .*Dropped: (\d+)")
+PE_SUMMARY = re.compile(r"Input Read Pairs: (\d+) Both Surviving: (\d+) "
+                        r".*Forward Only Surviving: (\d+) "
+                        r".*Reverse Only Surviving: (\d+) .*Dropped: (\d+)")
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# DATABASE ---------------------------------------------------------------------
+
+def connect(filename):
+    """
+    Function that opens the database (creating it if needed) in WAL mode.
+
+    Takes one argument : filename [string] : the SQLite database
+
+    Returns one argument : connection [sqlite3.Connection]
+    """
+
+    connection = sqlite3.connect(filename, timeout=BUSY_TIMEOUT)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+
+# RECORD A RUN -----------------------------------------------------------------
+
+def read_log(filename):
+    """
+    Function that reads the summary of a Trimmomatic (or native) log.
+
+    Takes one argument : filename [string] : the log file
+
+    Returns one argument :
+        counts [list] : input, surviving, forward only, reverse only and dropped
+                        reads (or pairs), or None if there is no summary
+    """
+
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, 'rt') as f:
+        text = f.read()
+
+    match = PE_SUMMARY.search(text)
+    if match:
+        return [int(value) for value in match.groups()]
+
+    match = SE_SUMMARY.search(text)
+    if match:
+        total, surviving, dropped = [int(value) for value in match.groups()]
+        return [total, surviving, None, None, dropped]
+
+    return None
+
+
+
+def record_run(filename, param, inout, start):
+    """
+    Function that appends a run to the database : its parameters, the survival
+    and timing of its steps and the sections of its statistic file.
+
+    Takes four arguments :
+        - filename [string] : the SQLite database
+        - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames, the
+                         timings and the sections of the statistic file
+        - start [float] : time when the run started
+
+    Returns one argument : run [integer] : identifier of the run
+    """
+
+    inputs = list(param['input'])
+    if param['layout'] == 'SE':
+        inputs = inputs[:1]
+
+    # logs of the steps which have been run
+    logs = {'step1': 'step1_output.out', 'step2': 'step2_output.out'}
+
+    connection = connect(filename)
+
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (started, host, layout, inputs, output, "
+            "parameters, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+             socket.gethostname(), param['layout'], ' '.join(inputs),
+             os.path.abspath(param['output']),
+             json.dumps(param, sort_keys=True, default=str),
+             time.time() - start))
+        run = cursor.lastrowid
+
+        for step, seconds in inout.get('timings', []):
+            counts = [None] * 5
+            if step in logs:
+                counts = read_log("{0}/{1}".format(param['output'],
+                                                   logs[step])) or counts
+            connection.execute("INSERT INTO steps (run, step, seconds, input, "
+                               "surviving, forward_only, reverse_only, dropped) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               [run, step, seconds] + counts)
+
+        for title, header, rows in inout.get('stats', []):
+            connection.executemany("INSERT INTO stats VALUES (?, ?, ?, ?, ?)",
+                                   [(run, title, line, name, str(value))
+                                    for line, row in enumerate(rows, 1)
+                                    for name, value in zip(header, row)])
+
+    connection.close()
+
+    return run
+
+
+
+# TIMINGS ----------------------------------------------------------------------
+
+def step_timings(filename):
+    """
+    Function that gives the duration of every step of the recorded runs, with
+    the number of input reads (or pairs) of the run, to calibrate a throughput
+    model.
+
+    Takes one argument : filename [string] : the SQLite database
+
+    Returns one argument :
+        timings [list] : (layout, parameters [dict], step, seconds, records)
+                         of each step, empty if there is no database
+    """
+
+    if not os.path.isfile(filename):
+        return []
+
+    connection = connect(filename)
+
+    rows = connection.execute(
+        "SELECT runs.layout, runs.parameters, steps.step, steps.seconds, "
+        "(SELECT input FROM steps AS first WHERE first.run = runs.id "
+        "AND first.input IS NOT NULL ORDER BY first.id LIMIT 1) "
+        "FROM steps JOIN runs ON runs.id = steps.run "
+        "WHERE steps.seconds > 0").fetchall()
+
+    connection.close()
+
+    return [(layout, json.loads(parameters), step, seconds, records)
+            for layout, parameters, step, seconds, records in rows
+            if records]
+
+
+
+# QUERY ------------------------------------------------------------------------
+
+def query(filename, text):
+    """
+    Function that prints the result of a query on the database, as a table
+    separated by tabs. The query is an SQL query or a name of QUERIES.
+
+    Takes two arguments : - filename [string] : the SQLite database
+                          - text [string] : the query
+
+    Returns anything.
+    """
+
+    if not os.path.isfile(filename):
+        sys.exit("/!\ Database '{0}' does not exist.".format(filename))
+
+    connection = connect(filename)
+
+    try:
+        cursor = connection.execute(QUERIES.get(text, text))
+    except sqlite3.Error as error:
+        sys.exit("/!\ Query failed : {0}".format(error))
+
+    if cursor.description is not None:
+        print "\t".join([column[0] for column in cursor.description])
+        for row in cursor:
+            print "\t".join(['' if value is None else unicode(value).encode('utf8')
+                             for value in row])
+
+    connection.close()
@@ -0,0 +1,360 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+samplesheet.py : module containing all functions to run the samples of a
+                 sample sheet as a cluster array job. Every array task reads
+                 the same sample sheet, computes the same split of the samples
+                 (balanced on the size of the input files) and runs premseq on
+                 its own share, each sample in its own output directory. A
+                 marker file records every finished sample, so a task can be
+                 run again without redoing them, and the statistic files of
+                 all samples are merged by a final gather step.
+
+Dependency : check_entries, commandline (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import subprocess
+import sys
+import time
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+
+
+# file written in the output directory of a sample when it is done
+DONE_MARKER = '.premseq_done'
+
+# options of the sample sheet and watch modes, which are not given to each
+# sample (with the number of values they take)
+SHEET_OPTIONS = {'--samples': 1, '--task': 1, '--gather': 0, '--batch': 1,
+                 '--watch': 1, '--watch-workers': 1, '--watch-settle': 1,
+                 '-output': 1, '-scratch': 1}
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# SAMPLE SHEET -----------------------------------------------------------------
+
+def read_sample_sheet(filename):
+    """
+    Function that reads a sample sheet. Each line gives a sample name and its
+    read file(s), separated by blanks : one file for SE data, two for PE data.
+    Empty lines and lines beginning with '#' are ignored.
+
+    Takes one argument : filename [string] : the sample sheet
+
+    Returns one argument : samples [list] : list of (name, layout, files)
+    """
+
+    samples = []
+    names = set()
+
+    with open(filename, 'rt') as f:
+        for nb, line in enumerate(f, 1):
+            fields = line.split()
+
+            if not fields or fields[0].startswith('#'):
+                continue
+
+            name, files = fields[0], fields[1:]
+
+            if not len(files) in (1, 2):
+                sys.exit("/!\ Line {0} of the sample sheet must give a sample "
+                         "name and one (SE) or two (PE) read files.".format(nb))
+
+            if '/' in name or name in names:
+                sys.exit("/!\ Sample name '{0}' (line {1}) is not unique or "
+                         "contains a '/'.".format(name, nb))
+
+            for read_file in files:
+                ce.check_input(read_file, 'of sample {0}'.format(name))
+
+            names.add(name)
+            samples.append((name, 'SE' if len(files) == 1 else 'PE', files))
+
+    if not samples:
+        sys.exit("/!\ The sample sheet does not contain any sample.")
+
+    return samples
+
+
+
+# ARRAY TASK -------------------------------------------------------------------
+
+def get_task(task=None):
+    """
+    Function that finds the index of the array task and the number of tasks,
+    from the '--task i/N' option (i from 1 to N) or from the environment of
+    SLURM or SGE. Without any, there is one task.
+
+    Takes one argument : task [string] : value of the '--task' option or None
+
+    Returns two arguments : - index [integer] : from 0 to number - 1
+                            - number [integer] : number of tasks
+    """
+
+    if task is not None:
+        try:
+            index, number = [int(value) for value in task.split('/')]
+        except ValueError:
+            sys.exit("/!\ '--task' must be given as i/N, ex : 3/10")
+        index -= 1
+
+    elif 'SLURM_ARRAY_TASK_ID' in os.environ:
+        first = int(os.environ.get('SLURM_ARRAY_TASK_MIN', 0))
+        step = int(os.environ.get('SLURM_ARRAY_TASK_STEP', 1))
+        index = (int(os.environ['SLURM_ARRAY_TASK_ID']) - first) // step
+        number = int(os.environ.get('SLURM_ARRAY_TASK_COUNT', 0))
+        if number == 0:
+            last = int(os.environ['SLURM_ARRAY_TASK_MAX'])
+            number = (last - first) // step + 1
+
+    elif os.environ.get('SGE_TASK_ID', 'undefined') != 'undefined':
+        first = int(os.environ.get('SGE_TASK_FIRST', 1))
+        last = int(os.environ['SGE_TASK_LAST'])
+        step = int(os.environ.get('SGE_TASK_STEPSIZE', 1))
+        index = (int(os.environ['SGE_TASK_ID']) - first) // step
+        number = (last - first) // step + 1
+
+    else:
+        index, number = 0, 1
+
+    if not 0 <= index < number:
+        sys.exit("/!\ Array task {0} is not between 1 and {1}."
+                 .format(index + 1, number))
+
+    return index, number
+
+
+
+def split_samples(samples, number):
+    """
+    Function that splits the samples between the tasks, balanced on the size
+    of the input files : from the biggest sample, each sample is given to the
+    task having the fewest bytes (greedy longest-processing-time split). The
+    split only depends on the sample sheet, so all tasks compute the same one.
+
+    Takes two arguments : - samples [list] : list of (name, layout, files)
+                          - number [integer] : number of tasks
+
+    Returns one argument : shares [list] : samples of each task
+    """
+
+    sizes = [sum([os.path.getsize(filename) for filename in files])
+             for name, layout, files in samples]
+
+    shares = [[] for task in range(number)]
+    loads = [0] * number
+
+    for nb in sorted(range(len(samples)), key=lambda i: (-sizes[i], i)):
+        task = loads.index(min(loads))
+        shares[task].append(samples[nb])
+        loads[task] += sizes[nb]
+
+    return shares
+
+
+
+# RUN SAMPLES ------------------------------------------------------------------
+
+def sample_options(argv):
+    """
+    Function that removes the options of the sample sheet mode (and the output
+    and scratch directories) from the premseq commandline, to give the other
+    options to each sample.
+
+    Takes one argument : argv [list] : the premseq commandline arguments
+
+    Returns one argument : options [list] : options given to each sample
+    """
+
+    options = []
+    skip = 0
+
+    for arg in argv:
+        if skip:
+            skip -= 1
+        elif arg.split('=')[0] in SHEET_OPTIONS:
+            if not '=' in arg:
+                skip = SHEET_OPTIONS[arg]
+        else:
+            options.append(arg)
+
+    return options
+
+
+
+def sample_command(script, param, name, layout, files, options):
+    """
+    Function that gives the premseq commandline of a sample, which writes its
+    outputs in '<output>/<sample>' (and its temporary files in
+    '<scratch>/<sample>').
+
+    Takes six arguments :
+        - script [string] : path to premseq.py
+        - param [dict] : dictionnary containing all parameters
+        - name [string] : name of the sample
+        - layout [string] : 'SE' or 'PE'
+        - files [list] : read file(s) of the sample
+        - options [list] : options given to each sample
+
+    Returns two arguments : - cmd [list] : the commandline
+                            - output [string] : output directory of the sample
+    """
+
+    output = "{0}/{1}".format(param['output'], name)
+
+    cmd = [sys.executable, script, layout] + files + options
+    cmd += ['-output', output]
+    if param.get('scratch') != None :
+        cmd += ['-scratch', "{0}/{1}".format(param['scratch'], name)]
+
+    return cmd, output
+
+
+
+def mark_done(output, cmd, seconds):
+    """
+    Function that writes the marker file of a finished sample.
+
+    Takes three arguments : - output [string] : output directory of the sample
+                            - cmd [list] : commandline of the sample
+                            - seconds [float] : duration of the sample
+
+    Returns anything.
+    """
+
+    with open("{0}/{1}".format(output, DONE_MARKER), 'wt') as f:
+        f.write("{0}\n".format(' '.join(cmd)))
+        f.write("{0:.1f}\n".format(seconds))
+
+
+
+def run_samples(script, param, samples, task=None):
+    """
+    Function that runs premseq on the share of the samples of this array task.
+    Samples whose marker file exists are not run again.
+
+    Takes four arguments :
+        - script [string] : path to premseq.py
+        - param [dict] : dictionnary containing all parameters
+        - samples [list] : list of (name, layout, files)
+        - task [string] : value of the '--task' option or None
+
+    Returns anything.
+    """
+
+    index, number = get_task(task)
+    share = split_samples(samples, number)[index]
+
+    options = sample_options(sys.argv[1:])
+    failed = []
+
+    print "Array task {0}/{1} : {2} sample(s)".format(index + 1, number,
+                                                       len(share))
+
+    for name, layout, files in share:
+        cmd, output = sample_command(script, param, name, layout, files,
+                                     options)
+
+        if os.path.isfile("{0}/{1}".format(output, DONE_MARKER)):
+            print "  {0} : already done".format(name)
+            continue
+
+        start = time.time()
+        if (subprocess.call(cmd) != 0):
+            print "  {0} : failed".format(name)
+            failed.append(name)
+            continue
+
+        mark_done(output, cmd, time.time() - start)
+
+        print "  {0} : done in {1:.1f} s".format(name, time.time() - start)
+
+    if failed :
+        sys.exit("/!\ Sample(s) failed : {0}".format(', '.join(failed)))
+
+
+
+# GATHER -----------------------------------------------------------------------
+
+def read_stat_file(filename):
+    """
+    Function that reads the sections of a statistic file.
+
+    Takes one argument : filename [string] : the statistic file
+
+    Returns one argument : sections [list] : list of (title, header, rows)
+    """
+
+    sections = []
+
+    with open(filename, 'rt') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('##'):
+                sections.append((line[2:], None, []))
+            elif sections and sections[-1][1] is None:
+                sections[-1] = (sections[-1][0], line.split('\t'), [])
+            elif sections and line:
+                sections[-1][2].append(line.split('\t'))
+
+    return sections
+
+
+
+def gather(param, samples):
+    """
+    Function that merges the statistic files of all samples in one statistic
+    file in the output directory : each section gets a 'Sample' column.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - samples [list] : list of (name, layout, files)
+
+    Returns anything.
+    """
+
+    merged = dict()
+    order = []
+    missing = []
+
+    for name, layout, files in samples:
+        output = "{0}/{1}".format(param['output'], name)
+        filename = "{0}/statistic.txt".format(output)
+
+        if not os.path.isfile("{0}/{1}".format(output, DONE_MARKER)):
+            missing.append(name)
+            continue
+
+        if not os.path.isfile(filename):
+            continue
+
+        for title, header, rows in read_stat_file(filename):
+            if not title in merged:
+                merged[title] = (['Sample'] + header, [])
+                order.append(title)
+            merged[title][1].extend([[name] + row for row in rows])
+
+    io = dict()
+    for title in order:
+        io = cl.add_stat_section(io, title, merged[title][0], merged[title][1])
+
+    cl.write_stat_file([], param, io)
+
+    print "{0} sample(s) gathered in {1}/statistic.txt".format(
+        len(samples) - len(missing), param['output'])
+
+    if missing :
+        print "Not done : {0}".format(', '.join(missing))
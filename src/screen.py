@@ -0,0 +1,370 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+screen.py : module containing all functions to screen trimmed reads for
+            contaminants (rRNA, PhiX spike-in, ...). The canonical k-mers of
+            a contaminant FASTA file are stored in a Bloom filter, which is
+            cached on disk next to the FASTA file. A read (or a pair) is a
+            contaminant if enough of its k-mers are in the filter : it is
+            dropped, or written in its own 'contaminant_<prefix>.fastq' file.
+
+Dependency : adapters, commandline, fastq, normalize (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import itertools
+import math
+import os
+import shutil
+import struct
+
+# Personal modules
+import adapters as ad
+import commandline as cl
+import fastq as fq
+import normalize as nm
+
+
+# false positive rate of the Bloom filter
+FALSE_POSITIVE = 0.001
+
+# header of a cached filter : magic, k-mer size, number of bits, number of
+# hashes, check of the hash function, size and modification time of the FASTA
+MAGIC = 'PSBLOOM1'
+HEADER = '<8sIQIqqq'
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class BloomFilter(object):
+    """
+    Bloom filter of canonical k-mers. The positions of a k-mer are given by
+    double hashing of the two halves of its (64 bits) hash value.
+    """
+
+    def __init__(self, ksize, nb_bits, nb_hashes, bits=None):
+        self.ksize = ksize
+        self.nb_bits = nb_bits
+        self.nb_hashes = nb_hashes
+        self.bits = bits if bits is not None else bytearray((nb_bits + 7) // 8)
+
+
+    def positions(self, kmer):
+        """
+        Gives the bits of a k-mer.
+        """
+
+        value = hash(kmer)
+        low = value & 0xffffffff
+        high = ((value >> 32) & 0xffffffff) | 1
+
+        return [(low + i * high) % self.nb_bits for i in range(self.nb_hashes)]
+
+
+    def add(self, kmer):
+        """
+        Adds a k-mer.
+        """
+
+        for position in self.positions(kmer):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+
+    def __contains__(self, kmer):
+        value = hash(kmer)
+        low = value & 0xffffffff
+        high = ((value >> 32) & 0xffffffff) | 1
+        bits = self.bits
+
+        for i in xrange(self.nb_hashes):
+            position = (low + i * high) % self.nb_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+
+        return True
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# FILTER -----------------------------------------------------------------------
+
+def canonical_kmers(seq, ksize):
+    """
+    Generator of the canonical k-mers of a sequence (smallest of the k-mer and
+    of its reverse complement).
+
+    Takes two arguments : - seq [string] : the sequence
+                          - ksize [integer] : size of k-mers
+
+    Yields one argument : kmer [string]
+    """
+
+    rev = seq.translate(nm.COMPLEMENT)[::-1]
+    length = len(seq)
+
+    for i in xrange(length - ksize + 1):
+        kmer = seq[i:i + ksize]
+        rev_kmer = rev[length - i - ksize:length - i]
+        yield kmer if kmer < rev_kmer else rev_kmer
+
+
+
+def cache_name(param, fasta, ksize):
+    """
+    Function that gives the file of the cached filter : next to the FASTA
+    file, or in the scratch directory if it can't be written there.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - fasta [string] : contaminant FASTA file
+        - ksize [integer] : size of k-mers
+
+    Returns one argument : filename [string]
+    """
+
+    directory = os.path.dirname(os.path.abspath(fasta))
+    if not os.access(directory, os.W_OK):
+        directory = param['scratch']
+
+    return "{0}/{1}.k{2}.bloom".format(directory, os.path.basename(fasta), ksize)
+
+
+
+def build_filter(fasta, ksize):
+    """
+    Function that builds the Bloom filter of the k-mers of a FASTA file.
+
+    Takes two arguments : - fasta [string] : contaminant FASTA file
+                          - ksize [integer] : size of k-mers
+
+    Returns one argument : bloom [BloomFilter]
+    """
+
+    entries = ad.read_fasta(fasta)
+    nb_kmers = max(1, sum([max(0, len(seq) - ksize + 1) for name, seq in entries]))
+
+    nb_bits = max(64, int(-nb_kmers * math.log(FALSE_POSITIVE) / math.log(2) ** 2))
+    nb_hashes = max(1, int(round(float(nb_bits) / nb_kmers * math.log(2))))
+
+    bloom = BloomFilter(ksize, nb_bits, nb_hashes)
+    for name, seq in entries:
+        for kmer in canonical_kmers(seq.upper(), ksize):
+            bloom.add(kmer)
+
+    return bloom
+
+
+
+def get_filter(param, fasta, ksize):
+    """
+    Function that loads the cached Bloom filter of a FASTA file, or builds and
+    caches it if there is no valid cache (FASTA file changed, other k-mer size
+    or other hash function).
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - fasta [string] : contaminant FASTA file
+        - ksize [integer] : size of k-mers
+
+    Returns one argument : bloom [BloomFilter]
+    """
+
+    filename = cache_name(param, fasta, ksize)
+    stat = os.stat(fasta)
+    signature = (ksize, hash(MAGIC), stat.st_size, int(stat.st_mtime))
+
+    if os.path.isfile(filename):
+        with open(filename, 'rb') as f:
+            header = struct.unpack(HEADER, f.read(struct.calcsize(HEADER)))
+            magic, size, nb_bits, nb_hashes, check, fasta_size, mtime = header
+
+            if (magic, size, check, fasta_size, mtime) == (MAGIC,) + signature:
+                return BloomFilter(ksize, nb_bits, nb_hashes,
+                                   bytearray(f.read()))
+
+    bloom = build_filter(fasta, ksize)
+
+    # written in a temporary file first, so that concurrent runs never read
+    # an incomplete filter
+    tmp = "{0}.{1}".format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack(HEADER, MAGIC, ksize, bloom.nb_bits,
+                            bloom.nb_hashes, signature[1], signature[2],
+                            signature[3]))
+        f.write(bloom.bits)
+    os.rename(tmp, filename)
+
+    return bloom
+
+
+
+# CLASSIFY READS ---------------------------------------------------------------
+
+def is_contaminant(seqs, bloom, fraction):
+    """
+    Function that classifies a read (or a pair) : it is a contaminant if the
+    proportion of its k-mers found in the filter is at least 'fraction'. The
+    count stops as soon as the answer is known.
+
+    Takes three arguments :
+        - seqs [list] : sequence(s) of the read or of the pair
+        - bloom [BloomFilter] : filter of contaminant k-mers
+        - fraction [float] : minimal proportion of contaminant k-mers
+
+    Returns one argument : [boolean]
+    """
+
+    ksize = bloom.ksize
+    total = sum([max(0, len(seq) - ksize + 1) for seq in seqs])
+
+    if (total == 0):
+        return False
+
+    needed = int(math.ceil(fraction * total))
+    hits = 0
+    remaining = total
+
+    for seq in seqs:
+        for kmer in canonical_kmers(seq, ksize):
+            remaining -= 1
+            if kmer in bloom:
+                hits += 1
+                if (hits >= needed):
+                    return True
+            elif (hits + remaining < needed):
+                return False
+
+    return hits >= needed
+
+
+
+def screen_files(files, bloom, fraction, kept, contaminants, param, size=10000):
+    """
+    Function that screens a read file (or the two files of pairs, read
+    together).
+
+    Takes seven arguments :
+        - files [list] : screened read file(s)
+        - bloom [BloomFilter] : filter of contaminant k-mers
+        - fraction [float] : minimal proportion of contaminant k-mers
+        - kept [list] : output file(s) of the other reads
+        - contaminants [list] : output file(s) of contaminants, or None
+        - param [dict] : dictionnary containing all parameters
+        - size [integer] : number of reads in a batch
+
+    Returns two arguments : - total [integer] : number of reads (or pairs)
+                            - found [integer] : number of contaminants
+    """
+
+    readers = [fq.open_fastq(filename) for filename in files]
+    outputs = list(kept) + (list(contaminants) if contaminants else [])
+    writers = [fq.open_fastq(filename, 'w', param.get('compress_level'))
+               for filename in outputs]
+
+    total = found = 0
+
+    for batches in itertools.izip(*[fq.read_batches(reader, size)
+                                    for reader in readers]):
+
+        records = [([], []) for filename in files]
+
+        for pair in itertools.izip(*batches):
+            clean = not is_contaminant([record[1] for record in pair], bloom,
+                                       fraction)
+            found += not clean
+            for nb, record in enumerate(pair):
+                records[nb][0 if clean else 1].append(record)
+
+        total += len(batches[0])
+
+        for nb in range(len(files)):
+            fq.write_records(writers[nb], records[nb][0])
+            if contaminants:
+                fq.write_records(writers[len(files) + nb], records[nb][1])
+
+    for handle in readers + writers:
+        handle.close()
+
+    return total, found
+
+
+
+# SCREENING STEP ---------------------------------------------------------------
+
+def screen_step(param, inout):
+    """
+    Function that screens the trimmed reads (pairs together) and the kept
+    singletons for contaminants, which are dropped or written in
+    'contaminant_<prefix>.fastq'.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - inout [dict] : dictionnary containing all filenames
+
+    Returns inout [dict] with the contaminant files
+    """
+
+    fields = param['screen'].split(':')
+    fasta, ksize, fraction = fields[0], int(fields[1]), float(fields[2])
+    split = len(fields) == 4 and fields[3] == 'split'
+
+    bloom = get_filter(param, fasta, ksize)
+
+    # pairs are screened together, singletons alone
+    groups = [[inout['trimmed']]] if param['layout'] == 'SE' \
+             else [list(inout['trimmed'])]
+    if 'single' in inout :
+        groups += [[filename] for filename in inout['single']]
+
+    rows = []
+    inout['contaminant'] = []
+
+    for files in groups:
+
+        # reads sent to another sink than a file can't be read again
+        if not all([os.path.isfile(filename) for filename in files]):
+            continue
+
+        kept = ["{0}/screened_{1}".format(param['scratch'],
+                                          os.path.basename(filename))
+                for filename in files]
+
+        contaminants = None
+        if split :
+            contaminants = []
+            for filename in files:
+                name = os.path.basename(filename)
+                if name.startswith('trimmed_'):
+                    name = name[len('trimmed_'):]
+                contaminants.append("{0}/contaminant_{1}".format(param['output'],
+                                                                 name))
+            inout['contaminant'] += contaminants
+
+        total, found = screen_files(files, bloom, fraction, kept, contaminants,
+                                    param)
+
+        for filename, new in zip(files, kept):
+            os.remove(filename)
+            shutil.move(new, filename)
+
+        rows.append([' '.join(files), total, found,
+                     round(100.0 * found / max(total, 1), 2)])
+
+    if not inout['contaminant'] :
+        del inout['contaminant']
+
+    inout = cl.add_stat_section(inout, 'Contaminant Screening',
+                                ['Filename', 'Reads', 'Contaminants',
+                                 'Contaminant Percentage'],
+                                rows)
+
+    return inout
@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+sinks.py : module containing all functions to route the outputs of Trimmomatic.
+           Each output can be :
+               - 'file' : a regular file (default)
+               - 'null' : the null device, for outputs nobody asked for, which
+                          never touch the disk nor use compressor CPU
+               - 'fifo' : a named pipe read by another program
+               - a function : a named pipe read in PREMSEQ by this function
+                              (in-process consumer), which gets the opened
+                              pipe as argument
+
+The kind of each output is given by its role ('trimmed', 'single',
+'step1_single' and 'trimlog') in param['sinks'], unwanted singletons being sent
+to the null device by default.
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import threading
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def default_kind(param, role):
+    """
+    Function that gives the kind of sink of an output which have not been
+    choosen in param['sinks'].
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - role [string] : role of the output
+
+    Returns one argument : kind [string] : 'file' or 'null'
+    """
+
+    # step 1 singletons are always lost, as step 2 only reads pairs
+    if (role == 'step1_single'):
+        return 'null'
+
+    if (role == 'single' and not 'keep_singleton' in param):
+        return 'null'
+
+    return 'file'
+
+
+
+def consume(fifo, consumer):
+    """
+    Function that opens a named pipe and gives it to its consumer (run in a
+    thread).
+
+    Takes two arguments : - fifo [string] : the named pipe
+                          - consumer [function]
+
+    Returns anything.
+    """
+
+    with open(fifo, 'rb') as handle:
+        consumer(handle)
+
+
+
+def get_sink(param, inout, role, filename):
+    """
+    Function that gives the path where Trimmomatic must write an output,
+    according to its kind of sink. Named pipes are created (without the
+    compression suffix, so that Trimmomatic doesn't compress in the pipe) and
+    the consumer started if needed.
+
+    Takes four arguments :
+        - param [dict] : dictionnary containing all parameters
+        - inout [dict] : dictionnary containing all generated filenames
+        - role [string] : role of the output
+        - filename [string] : name of the output if it is a file
+
+    Returns one argument : path [string] : path given to Trimmomatic
+    """
+
+    kind = param.get('sinks', {}).get(role, default_kind(param, role))
+
+    if (kind == 'null'):
+        return os.devnull
+
+    if (kind == 'file'):
+        return filename
+
+    # NAMED PIPES --------------------------------------------------------------
+
+    fifo, ext = os.path.splitext(filename)
+    if not ext in ['.gz', '.bz2']:
+        fifo = filename
+
+    if os.path.exists(fifo):
+        os.remove(fifo)
+    os.mkfifo(fifo)
+
+    thread = None
+
+    if callable(kind):
+        thread = threading.Thread(target=consume, args=(fifo, kind))
+        thread.daemon = True
+        thread.start()
+
+    if not 'sinks' in inout:
+        inout['sinks'] = []
+
+    inout['sinks'].append((fifo, thread))
+
+    return fifo
+
+
+
+def close_sinks(inout):
+    """
+    Function that waits for the consumers of named pipes once Trimmomatic has
+    finished, and deletes the pipes.
+
+    Takes one argument : inout [dict] : dictionnary containing all generated
+                                        filenames
+
+    Returns inout [dict] without the closed sinks
+    """
+
+    for fifo, thread in inout.pop('sinks', []):
+
+        if thread is not None:
+
+            # if Trimmomatic never opened the pipe, the consumer is still
+            # waiting for a writer : open and close it to send the end of file
+            if thread.is_alive():
+                try:
+                    os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+                except OSError:
+                    pass
+
+            thread.join()
+
+        os.remove(fifo)
+
+    return inout
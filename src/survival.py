@@ -0,0 +1,213 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+survival.py : module containing all functions to abort a run early when its
+              survival is too low (wrong adapter file, wrong phred offset, bad
+              library, ...). The survival of the first reads of each trimming
+              step is monitored, from the trimlog of Trimmomatic (read in
+              PREMSEQ through a named pipe, while Trimmomatic writes it) or
+              from the native trimming. If it is below the floor, the step is
+              stopped and premseq quits with a diagnostic.
+
+Dependency : fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import sys
+
+# Personal modules
+import fastq as fq
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class SurvivalMonitor(object):
+    """
+    Survival of the first reads of a trimming step. Once enough reads have
+    been counted, the survival is checked, and the trimming process (if any)
+    is killed when it is below the floor.
+    """
+
+    def __init__(self, param, step):
+        floor, size = param['min_survival'].split(':')
+
+        self.step = step
+        self.floor = float(floor)
+
+        # both reads of the first pairs for PE data
+        self.size = int(size) * (2 if param['layout'] == 'PE' else 1)
+
+        self.reads = 0
+        self.surviving = 0
+        self.decided = False
+        self.aborted = False
+        self.process = None
+
+
+    def add(self, reads, surviving):
+        """
+        Counts reads, until enough reads have been counted to decide.
+        """
+
+        if self.decided:
+            return
+
+        self.reads += reads
+        self.surviving += surviving
+
+        if (self.reads >= self.size):
+            self.decide()
+
+
+    def decide(self):
+        """
+        Checks the survival, and kills the trimming process if it is too low.
+        """
+
+        self.decided = True
+
+        if self.low():
+            self.aborted = True
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+
+
+    def low(self):
+        """
+        Tells if the survival of the counted reads is below the floor.
+        """
+
+        return self.reads > 0 and self.percentage() < self.floor
+
+
+    def percentage(self):
+        return 100.0 * self.surviving / max(self.reads, 1)
+
+
+    def consume(self, handle):
+        """
+        Reads the trimlog of Trimmomatic (one line per read : name, surviving
+        length, first and last surviving bases, bases trimmed at the end), and
+        reads the rest of it without parsing it once the survival is decided,
+        so that Trimmomatic is never blocked.
+        """
+
+        # (lines are read with readline, the file is then read by blocks)
+        line = handle.readline()
+        while line and not self.decided:
+            fields = line.rsplit(' ', 4)
+            self.add(1, len(fields) == 5 and fields[1] != '0')
+            line = handle.readline()
+
+        while handle.read(1 << 20):
+            pass
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+def monitored(param, monitor):
+    """
+    Function that gives the parameters of a Trimmomatic step whose trimlog is
+    read by a monitor (through a named pipe).
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - monitor [SurvivalMonitor]
+
+    Returns one argument : param [dict] : copy of the parameters
+    """
+
+    sinks = dict(param.get('sinks', {}))
+    sinks['trimlog'] = monitor.consume
+
+    new = dict(param)
+    new['sinks'] = sinks
+
+    return new
+
+
+
+def diagnostic(param, monitor):
+    """
+    Function that explains an early abort, with the likely causes.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - monitor [SurvivalMonitor]
+
+    Returns one argument : message [string]
+    """
+
+    lines = ["/!\ Early abort during {0} : {1} of the first {2} reads survived "
+             "({3:.2f}%, below the floor of {4}%).".format(
+                 monitor.step, monitor.surviving, monitor.reads,
+                 monitor.percentage(), monitor.floor),
+             "    The remaining steps have not been run. Check :"]
+
+    if 'phred' in param :
+        offset = fq.detect_phred(param['input'][0])
+        if (int(param['phred']) != offset):
+            lines.append("    - the phred offset : reads look like phred{0}, "
+                         "but -phred {1} is given".format(offset,
+                                                           param['phred']))
+
+    if 'illuminaclip' in param :
+        lines.append("    - the adapter file and thresholds of illuminaclip "
+                     "({0})".format(param['illuminaclip']))
+
+    for key in ['minlen', 'avgqual', 'slidingwindow', 'maxinfo', 'leading',
+                'trailing']:
+        if key in param :
+            lines.append("    - the quality trimming parameters (-{0} {1}, "
+                         "...)".format(key, param[key]))
+            break
+
+    lines.append("    - the quality of the library (run with -qc or -fastqc "
+                 "and without -min-survival)")
+
+    return "\n".join(lines)
+
+
+
+def check(param, monitor, inout):
+    """
+    Function that quits with a diagnostic if the survival of a finished (or
+    killed) step is below the floor, after deleting the temporary files and
+    the partly written outputs (trimmed reads and singletons). Steps with
+    fewer reads than monitored are checked on all their reads.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - monitor [SurvivalMonitor] : or None
+        - inout [dict] : dictionnary containing all generated filenames
+
+    Returns anything.
+    """
+
+    if monitor is None or not monitor.low():
+        return
+
+    discarded = []
+    for key in ['tmp', 'trimmed', 'single']:
+        files = inout.get(key, [])
+        for filename in [files] if isinstance(files, str) else files:
+            if os.path.isfile(filename):
+                os.remove(filename)
+                if key != 'tmp' :
+                    discarded.append(filename)
+
+    message = diagnostic(param, monitor)
+    if discarded :
+        message += ("\n    The partly written outputs have been discarded : "
+                    "{0}".format(", ".join(discarded)))
+
+    sys.exit(message)
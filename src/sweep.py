@@ -0,0 +1,385 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+sweep.py : module containing all functions to compare several quality trimming
+           configurations in one pass. Each batch of reads is decoded once and
+           every configuration is evaluated on this shared batch with the
+           native trimming steps. Adapter trimming (step 1) and poly-X tail
+           trimming are done once before, as they come before quality
+           trimming.
+
+Dependency : check_entries, fastq, parse_xml, pipeline, trimmer (personal
+             modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import os
+import shutil
+import sys
+import xml.etree.ElementTree as ET
+
+# Personal modules
+import check_entries as ce
+import fastq as fq
+import parse_xml as px
+import pipeline as pl
+import trimmer as tr
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# CONFIGURATIONS ---------------------------------------------------------------
+
+def read_sweep_file(filename):
+    """
+    Function that reads the quality trimming configurations to compare. The
+    file contains one 'quality-trimming' category (as in the XML configuration
+    file) per configuration, an optional 'label' attribute naming it :
+
+        <sweep>
+            <category name="quality-trimming" label="strict"> ... </category>
+            <category name="quality-trimming" label="relaxed"> ... </category>
+        </sweep>
+
+    Takes one argument : filename [string] : the sweep XML file
+
+    Returns one argument : configurations [list] : list of (label, param)
+    """
+
+    ce.check_xml_file(filename)
+
+    root = ET.parse(filename).getroot()
+    configurations = []
+
+    for nb, category in enumerate(root.findall('category')):
+
+        if(category.get('name') != 'quality-trimming'):
+            sys.exit("/!\ The sweep file can only contain 'quality-trimming' \
+categories.")
+
+        label = category.get('label', 'config_{0}'.format(nb + 1))
+        configurations.append((label, px.get_quality_parameters(category, {})))
+
+    if not configurations:
+        sys.exit("/!\ The sweep file doesn't contain any 'quality-trimming' \
+category.")
+
+    return configurations
+
+
+
+# STATISTICS -------------------------------------------------------------------
+
+def new_statistics():
+    """
+    Function that creates the counters of a configuration.
+
+    Don't takes argument
+
+    Returns one argument : stats [dict]
+    """
+
+    return {'input': 0, 'input_bases': 0, 'surviving': 0, 'forward_only': 0,
+            'reverse_only': 0, 'surviving_reads': 0, 'retained_bases': 0}
+
+
+
+def count_single(stats, kept):
+    """
+    Function that counts the reads of a batch kept by a configuration (SE).
+
+    Takes two arguments : - stats [dict] : counters of the configuration
+                          - kept [list] : (start, end) or None for each read
+
+    Returns anything.
+    """
+
+    for read in kept:
+        if read is not None:
+            stats['surviving'] += 1
+            stats['surviving_reads'] += 1
+            stats['retained_bases'] += read[1] - read[0]
+
+
+
+def count_pairs(stats, kept_1, kept_2):
+    """
+    Function that counts the pairs of a batch kept by a configuration (PE).
+
+    Takes three arguments : - stats [dict] : counters of the configuration
+                            - kept_1 [list] : kept part of reads 1
+                            - kept_2 [list] : kept part of reads 2
+
+    Returns anything.
+    """
+
+    for read_1, read_2 in zip(kept_1, kept_2):
+        if read_1 is not None:
+            stats['retained_bases'] += read_1[1] - read_1[0]
+        if read_2 is not None:
+            stats['retained_bases'] += read_2[1] - read_2[0]
+
+        if read_1 is not None and read_2 is not None:
+            stats['surviving'] += 1
+            stats['surviving_reads'] += 2
+        elif read_1 is not None:
+            stats['forward_only'] += 1
+            stats['surviving_reads'] += 1
+        elif read_2 is not None:
+            stats['reverse_only'] += 1
+            stats['surviving_reads'] += 1
+
+
+
+# OUTPUTS ----------------------------------------------------------------------
+
+def open_outputs(param, label, inputs):
+    """
+    Function that opens the trimmed (and singleton for PE data) output files
+    of a configuration, in 'sweep/<label>/'.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - label [string] : name of the configuration
+        - inputs [list] : input read file(s)
+
+    Returns one argument : handles [list] : trimmed files, then singletons
+    """
+
+    directory = "{0}/sweep/{1}".format(param['output'], label)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    names = []
+    for kind in ['trimmed', 'single']:
+        for filename in inputs:
+            name = "{0}/{1}_{2}.fastq".format(directory, kind,
+                                              ce.get_file_prefix(filename))
+            if 'compress' in param :
+                name += param['compress']
+            names.append(name)
+
+    # no singleton for single-end data
+    if (len(inputs) == 1):
+        names = names[:1]
+
+    return [fq.open_fastq(name, 'w', param.get('compress_level'))
+            for name in names]
+
+
+
+def write_outputs(handles, batches, kept, table):
+    """
+    Function that writes the reads of a batch kept by a configuration.
+
+    Takes four arguments :
+        - handles [list] : opened output files
+        - batches [list] : batch of records of each input file
+        - kept [list] : kept part of the reads of each input file
+        - table [string] : phred re-encoding table or None
+
+    Returns anything.
+    """
+
+    if (len(batches) == 1):
+        fq.write_records(handles[0], [tr.apply(record, read, table)
+                                      for record, read in zip(batches[0], kept[0])
+                                      if read is not None])
+        return
+
+    paired = ([], [])
+    single = ([], [])
+
+    for record_1, record_2, read_1, read_2 in zip(batches[0], batches[1],
+                                                  kept[0], kept[1]):
+        if read_1 is not None and read_2 is not None:
+            paired[0].append(tr.apply(record_1, read_1, table))
+            paired[1].append(tr.apply(record_2, read_2, table))
+        elif read_1 is not None:
+            single[0].append(tr.apply(record_1, read_1, table))
+        elif read_2 is not None:
+            single[1].append(tr.apply(record_2, read_2, table))
+
+    for handle, records in zip(handles, paired + single):
+        fq.write_records(handle, records)
+
+
+
+# SWEEP ------------------------------------------------------------------------
+
+def adapter_trimming(loc, param):
+    """
+    Function that runs adapter trimming (step 1) and poly-X tail trimming on
+    the inputs, so that the configurations are compared on the reads which
+    quality trimming would get. Reads are written in 'sweep_input/' in the
+    scratch directory, qualities are not re-encoded (the sweep does it) and
+    singletons of step 1 are lost, as in a normal run.
+
+    Takes two arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+
+    Returns two arguments : - inputs [list] : the trimmed read file(s)
+                            - directory [string] : directory to remove
+    """
+
+    directory = "{0}/sweep_input".format(param['scratch'])
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+
+    # same parameters, without quality trimming and the steps after it
+    sub_param = dict(param)
+    sub_param['output'] = directory
+    sub_param['scratch'] = directory
+
+    for key in ['quality', 'tophred33', 'tophred64', 'keep_singleton', 'sinks',
+                'min_survival', 'compress', 'compress_level']:
+        sub_param.pop(key, None)
+
+    io = pl.run_trimming(loc, sub_param, dict())
+
+    if (param['layout'] == 'SE'):
+        return [io['trimmed']], directory
+
+    return list(io['trimmed']), directory
+
+
+
+def sweep(loc, param, configurations, outputs=False, size=10000):
+    """
+    Function that evaluates all quality trimming configurations on the
+    input(s) in one pass, after adapter and poly-X tail trimming if they are
+    choosen. Results are printed and written in 'sweep.txt'.
+
+    Takes five arguments :
+        - loc [string] : path where the personal modules are located
+        - param [dict] : dictionnary containing all parameters
+        - configurations [list] : list of (label, param) to evaluate
+        - outputs [boolean] : write the trimmed reads of each configuration
+        - size [integer] : number of reads in a batch
+
+    Returns one argument : results [list] : list of (label, stats)
+    """
+
+    raw = list(param['input'])
+    if (param['layout'] == 'SE'):
+        raw = raw[:1]
+
+    offset = fq.get_phred(param, raw[0])
+
+    # adapter and poly-X tail trimming are done once for all configurations
+    inputs = raw
+    directory = None
+    if 'illuminaclip' in param or 'polyx' in param :
+        inputs, directory = adapter_trimming(loc, param)
+
+    table = tr.phred_table(param, offset)
+
+    # steps, counters and outputs of each configuration
+    evaluated = []
+    for label, config in configurations:
+        handles = open_outputs(param, label, raw) if outputs else None
+        evaluated.append((label, tr.get_steps(config, offset), new_statistics(),
+                          handles, table))
+
+    readers = [fq.open_fastq(filename) for filename in inputs]
+    batch_readers = [fq.read_batches(reader, size) for reader in readers]
+
+    while True:
+        batches = [next(batch_reader, None) for batch_reader in batch_readers]
+
+        if batches[0] is None:
+            break
+
+        if (len(batches) == 2 and
+            (batches[1] is None or len(batches[0]) != len(batches[1]))):
+            sys.exit("/!\ Paired-end files do not contain the same number of "
+                     "reads.")
+
+        # qualities are decoded once for all configurations
+        quals = [[tr.trimming_quals(record, offset) for record in batch]
+                 for batch in batches]
+        bases = sum([len(qual) for batch in quals for qual in batch])
+
+        for label, steps, stats, handles, table in evaluated:
+            kept = [tr.trim_batch(steps, batch) for batch in quals]
+
+            stats['input'] += len(batches[0])
+            stats['input_bases'] += bases
+
+            if (len(kept) == 1):
+                count_single(stats, kept[0])
+            else:
+                count_pairs(stats, kept[0], kept[1])
+
+            if handles is not None:
+                write_outputs(handles, batches, kept, table)
+
+    if (len(batch_readers) == 2 and next(batch_readers[1], None) is not None):
+        sys.exit("/!\ Paired-end files do not contain the same number of reads.")
+
+    for reader in readers:
+        reader.close()
+
+    for label, steps, stats, handles, table in evaluated:
+        for handle in handles or []:
+            handle.close()
+
+    if directory is not None:
+        shutil.rmtree(directory)
+
+    results = [(label, stats) for label, steps, stats, handles, table in evaluated]
+    write_sweep_file(param, configurations, results)
+
+    return results
+
+
+
+def write_sweep_file(param, configurations, results):
+    """
+    Function that writes (and prints) the statistics of all configurations in
+    'sweep.txt'.
+
+    Takes three arguments :
+        - param [dict] : dictionnary containing all parameters
+        - configurations [list] : list of (label, param)
+        - results [list] : list of (label, stats)
+
+    Returns anything.
+    """
+
+    header = ["Configuration", "Parameters", "Input", "Surviving",
+              "Surviving Percentage", "Mean Length", "Retained Bases Percentage"]
+
+    if (param['layout'] == 'PE'):
+        header += ["Forward Only Surviving", "Reverse Only Surviving"]
+
+    lines = ["\t".join(header)]
+
+    for (label, config), (label, stats) in zip(configurations, results):
+        nb = max(stats['input'], 1)
+        row = [label, tr.describe(config), stats['input'], stats['surviving'],
+               round(100.0 * stats['surviving'] / nb, 2),
+               round(float(stats['retained_bases']) /
+                     max(stats['surviving_reads'], 1), 2),
+               round(100.0 * stats['retained_bases'] /
+                     max(stats['input_bases'], 1), 2)]
+
+        if (param['layout'] == 'PE'):
+            row += [stats['forward_only'], stats['reverse_only']]
+
+        lines.append("\t".join([str(value) for value in row]))
+
+    with open("{0}/sweep.txt".format(param['output']), "wt") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print "\n".join(lines)
@@ -0,0 +1,635 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+trimmer.py : module containing the native implementation of the quality
+             trimming steps of Trimmomatic 0.33 (CROP, HEADCROP, LEADING,
+             TRAILING, SLIDINGWINDOW, MAXINFO, MINLEN and AVGQUAL), and the
+             poly-X tail trimming done between adapter and quality trimming.
+
+A step is a function taking the qualities of a read (bytearray of the quality
+characters, given by trimming_quals), the start and the end of the kept part
+of the read, and its own arguments, and returning the new start and end.
+Thresholds are shifted by the phred offset so that qualities never have to be
+decoded.
+
+Dependency : check_entries, commandline, fastq (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import math
+import os
+import struct
+
+# Personal modules
+import check_entries as ce
+import commandline as cl
+import fastq as fq
+
+
+# bases on the 5' side of a mismatch needed to extend a poly-X tail over it
+POLYX_SEGMENT = 4
+
+# constants of MAXINFO in Trimmomatic 0.33
+LONGEST_READ = 1000
+MAXQUAL = 60
+
+# MAXINFO tables already computed, for each (target length, strictness, offset)
+MAXINFO_TABLES = {}
+
+# quality binning schemes : (lowest, highest or None, binned quality) of each bin
+BINNING_SCHEMES = {'illumina': [(2, 9, 6), (10, 19, 15), (20, 24, 22),
+                                (25, 29, 27), (30, 34, 33), (35, 39, 37),
+                                (40, None, 40)]}
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# TRIMMING STEPS ---------------------------------------------------------------
+
+def crop(quals, start, end, length):
+    """
+    CROP : keeps the 'length' first bases of the read.
+    """
+
+    return start, min(end, start + length)
+
+
+
+def headcrop(quals, start, end, length):
+    """
+    HEADCROP : removes the 'length' first bases of the read, the read is
+    dropped if it isn't longer.
+    """
+
+    if (end - start <= length):
+        return start, start
+
+    return start + length, end
+
+
+
+def leading(quals, start, end, threshold):
+    """
+    LEADING : removes bases from the 5' end while their quality is below the
+    threshold.
+    """
+
+    while (start < end and quals[start] < threshold):
+        start += 1
+
+    return start, end
+
+
+
+def trailing(quals, start, end, threshold):
+    """
+    TRAILING : removes bases from the 3' end while their quality is below the
+    threshold. As in Trimmomatic, the quality of the first base is never
+    looked at : the read is dropped if all the other bases are below the
+    threshold.
+    """
+
+    for i in xrange(end - 1, start, -1):
+        if (quals[i] >= threshold):
+            return start, i + 1
+
+    return start, start
+
+
+
+def sliding_window(quals, start, end, window, threshold):
+    """
+    SLIDINGWINDOW : slides a window from the 5' end, cuts the read at the end
+    of the first window whose average quality is below the threshold, then
+    removes the low quality bases left at the 3' end of the kept part. As in
+    Trimmomatic, the read is dropped if it is shorter than the window or if
+    its first window is already below the threshold.
+    """
+
+    if (end - start < window):
+        return start, start
+
+    required = window * threshold
+    total = sum(quals[start:start + window])
+
+    if (total < required):
+        return start, start
+
+    keep = end
+    for i in xrange(start, end - window):
+        total += quals[i + window] - quals[i]
+        if (total < required):
+            keep = i + window
+            break
+
+    # the first base of the read is never looked at
+    while (keep > start + 1 and quals[keep - 1] < threshold):
+        keep -= 1
+
+    return start, keep
+
+
+
+def maxinfo(quals, start, end, target, strictness, offset):
+    """
+    MAXINFO : cuts the read at the position maximising the sum of a length
+    score and of the cumulated quality scores of the kept bases (tables
+    computed once by maxinfo_tables). The read is dropped if the best score
+    is 0.
+    """
+
+    lengths, probs = maxinfo_tables(target, strictness, offset, end - start)
+
+    accum = 0
+    best = None
+    position = 0
+
+    for i in xrange(end - start):
+        accum += probs[quals[start + i]]
+        score = lengths[i] + accum
+
+        if best is None or score >= best:
+            best = score
+            position = i + 1
+
+    if (position < 1 or best == 0):
+        return start, start
+
+    return start, start + position
+
+
+
+def float32(value):
+    """
+    Function that rounds a number as a 32 bits float (strictness is a float in
+    Trimmomatic).
+    """
+
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+
+def normalization(values, margin):
+    """
+    Function that computes the ratio used by Trimmomatic to turn MAXINFO
+    scores into integers (same computation, first value included as is).
+    """
+
+    maximum = values[0]
+    for value in values[1:]:
+        if abs(value) > maximum:
+            maximum = abs(value)
+
+    return float(2 ** 63 - 1) / (maximum * margin)
+
+
+
+def maxinfo_tables(target, strictness, offset, length=LONGEST_READ):
+    """
+    Function that computes, once for each (target length, strictness), the
+    tables of MAXINFO as Trimmomatic 0.33 does : length score of each
+    position and log-probability of each quality, scaled to integers by the
+    same ratio. Quality scores are indexed by quality character.
+
+    Takes four arguments :
+        - target [integer] : target length
+        - strictness [float] : between 0 and 1
+        - offset [integer] : phred offset of reads (33 or 64)
+        - length [integer] : length of the longest read
+
+    Returns two arguments : - lengths [list] : score of each length
+                            - probs [list] : score of each quality character
+    """
+
+    key = (target, strictness, offset)
+    length = max(length, LONGEST_READ)
+
+    if key in MAXINFO_TABLES and len(MAXINFO_TABLES[key][0]) >= length:
+        return MAXINFO_TABLES[key]
+
+    strictness = float32(strictness)
+    coverage = float32(1 - strictness)
+
+    lengths = []
+    for pos in range(length):
+        unique = math.log(1.0 / (1.0 + math.exp(target - pos - 1.0)))
+        lengths.append(unique + math.log(pos + 1.0) * coverage)
+
+    quals = [math.log(1 - math.pow(0.1, (0.5 + q) / 10.0)) * strictness
+             for q in range(MAXQUAL + 1)]
+
+    # the ratio only depends on the LONGEST_READ first lengths
+    ratio = max(normalization(lengths[:LONGEST_READ], LONGEST_READ * 2),
+                normalization(quals, LONGEST_READ * 2))
+
+    lengths = [int(value * ratio) for value in lengths]
+    quals = [int(value * ratio) for value in quals]
+
+    probs = [quals[min(max(char - offset, 0), MAXQUAL)] for char in range(256)]
+
+    MAXINFO_TABLES[key] = lengths, probs
+
+    return lengths, probs
+
+
+
+def minlen(quals, start, end, length):
+    """
+    MINLEN : drops the read if it is shorter than 'length'.
+    """
+
+    if (end - start < length):
+        return start, start
+
+    return start, end
+
+
+
+def avgqual(quals, start, end, threshold):
+    """
+    AVGQUAL : drops the read if its average quality is below the threshold.
+    """
+
+    if (sum(quals[start:end]) < threshold * (end - start)):
+        return start, start
+
+    return start, end
+
+
+
+# STEPS FROM PARAMETERS --------------------------------------------------------
+
+def get_steps(param, offset):
+    """
+    Function that creates the list of native trimming steps from the quality
+    trimming parameters, in the same order as the Trimmomatic commandline of
+    step 2.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - offset [integer] : phred offset of reads (33 or 64)
+
+    Returns one argument : steps [list] : list of (function, arguments)
+    """
+
+    steps = []
+
+    if 'crop' in param :
+        steps.append((crop, (int(param['crop']),)))
+
+    if 'headcrop' in param :
+        steps.append((headcrop, (int(param['headcrop']),)))
+
+    if 'leading' in param :
+        steps.append((leading, (int(param['leading']) + offset,)))
+
+    if 'trailing' in param :
+        steps.append((trailing, (int(param['trailing']) + offset,)))
+
+    if 'slidingwindow' in param :
+        window, quality = str(param['slidingwindow']).split(':')
+        steps.append((sliding_window, (int(window), int(quality) + offset)))
+
+    if 'maxinfo' in param :
+        target, strictness = str(param['maxinfo']).split(':')
+        steps.append((maxinfo, (int(target), float(strictness), offset)))
+
+    if 'minlen' in param :
+        steps.append((minlen, (int(param['minlen']),)))
+
+    if 'avgqual' in param :
+        steps.append((avgqual, (int(param['avgqual']) + offset,)))
+
+    return steps
+
+
+
+def describe(param):
+    """
+    Function that describes quality trimming parameters as Trimmomatic steps.
+
+    Takes one argument : param [dict] : dictionnary containing all parameters
+
+    Returns one argument : text [string] : ex 'SLIDINGWINDOW:4:30 MINLEN:36'
+    """
+
+    names = [('crop', 'CROP'), ('headcrop', 'HEADCROP'), ('leading', 'LEADING'),
+             ('trailing', 'TRAILING'), ('slidingwindow', 'SLIDINGWINDOW'),
+             ('maxinfo', 'MAXINFO'), ('minlen', 'MINLEN'),
+             ('avgqual', 'AVGQUAL')]
+
+    return ' '.join(['{0}:{1}'.format(step, param[key])
+                     for key, step in names if key in param])
+
+
+
+# TRIM READS -------------------------------------------------------------------
+
+def trimming_quals(record, offset):
+    """
+    Function that gives the qualities of a read as seen by the trimming steps :
+    as in Trimmomatic, the quality of 'N' bases is 0 whatever their quality
+    character.
+
+    Takes two arguments : - record [tuple] : FASTQ record
+                          - offset [integer] : phred offset of reads (33 or 64)
+
+    Returns one argument : quals [bytearray] : quality characters of the read
+    """
+
+    quals = bytearray(record[3])
+
+    if 'N' in record[1]:
+        for i, base in enumerate(record[1]):
+            if (base == 'N'):
+                quals[i] = offset
+
+    return quals
+
+
+
+def trim(steps, quals):
+    """
+    Function that applies trimming steps on the qualities of a read.
+
+    Takes two arguments : - steps [list] : list of (function, arguments)
+                          - quals [bytearray] : quality characters of the read
+
+    Returns one argument :
+        - (start, end) [tuple] : kept part of the read
+        - or None, if the read is dropped
+    """
+
+    start = 0
+    end = len(quals)
+
+    for function, args in steps:
+
+        start, end = function(quals, start, end, *args)
+
+        if (end <= start):
+            return None
+
+    if (end == 0):
+        return None
+
+    return start, end
+
+
+
+def trim_batch(steps, batch_quals):
+    """
+    Function that applies trimming steps on a batch of reads.
+
+    Takes two arguments : - steps [list] : list of (function, arguments)
+                          - batch_quals [list] : qualities of reads (bytearrays)
+
+    Returns one argument : kept [list] : (start, end) or None for each read
+    """
+
+    return [trim(steps, quals) for quals in batch_quals]
+
+
+
+def quality_bins(scheme):
+    """
+    Function that gives the bins of a quality binning scheme : a name of
+    BINNING_SCHEMES, or bins given as '<lowest>-<highest>:<quality>' separated
+    by commas (the highest quality of the last bin can be omitted). Qualities
+    outside of all bins are not changed.
+
+    Takes one argument : scheme [string] : the binning scheme
+
+    Returns one argument : bins [list] : (lowest, highest or None, quality)
+    """
+
+    if scheme in BINNING_SCHEMES :
+        return BINNING_SCHEMES[scheme]
+
+    bins = []
+    for text in scheme.split(','):
+        bounds, quality = text.split(':')
+        lowest, highest = bounds.split('-')
+        bins.append((int(lowest), int(highest) if highest else None,
+                     int(quality)))
+
+    return bins
+
+
+
+def binned_quality(quality, bins):
+    """
+    Function that gives the binned value of a quality.
+
+    Takes two arguments : - quality [integer] : phred quality
+                          - bins [list] : (lowest, highest or None, quality)
+
+    Returns one argument : quality [integer] : binned quality
+    """
+
+    for lowest, highest, value in bins:
+        if lowest <= quality and (highest is None or quality <= highest):
+            return value
+
+    return quality
+
+
+
+def phred_table(param, offset):
+    """
+    Function that creates the translation table which re-encodes qualities if
+    TOPHRED33 or TOPHRED64 is choosen, and bins them if a binning scheme is
+    choosen. Both are done by the same table lookup when reads are written, so
+    trimming is not affected.
+
+    Takes two arguments : - param [dict] : dictionnary containing all parameters
+                          - offset [integer] : phred offset of reads (33 or 64)
+
+    Returns one argument : table [string] : translation table, or None
+    """
+
+    if 'tophred33' in param :
+        new_offset = 33
+    elif 'tophred64' in param :
+        new_offset = 64
+    else :
+        new_offset = offset
+
+    bins = []
+    if 'binquality' in param :
+        bins = quality_bins(param['binquality'])
+
+    if (new_offset == offset) and not bins:
+        return None
+
+    table = [chr(i) for i in range(256)]
+
+    for i in range(offset, 127):
+        quality = binned_quality(i - offset, bins) + new_offset
+        if 33 <= quality < 127:
+            table[i] = chr(quality)
+
+    return ''.join(table)
+
+
+
+def apply(record, kept, table=None):
+    """
+    Function that cuts a record according to trimming.
+
+    Takes three arguments : - record [tuple] : FASTQ record
+                            - kept [tuple] : (start, end) of the kept part
+                            - table [string] : phred re-encoding table or None
+
+    Returns one argument : record [tuple] : the trimmed record
+    """
+
+    start, end = kept
+    qual = record[3][start:end]
+
+    if table is not None:
+        qual = qual.translate(table)
+
+    return (record[0], record[1][start:end], record[2], qual)
+
+
+
+# POLY-X TAILS -----------------------------------------------------------------
+
+def polyx_tail(seq, base, mismatches):
+    """
+    Function that finds the poly-X tail of a read. Runs of the base are found
+    with rstrip (in C), and the tail is extended over a mismatch when it is
+    followed, on its 5' side, by at least POLYX_SEGMENT bases of the run.
+
+    Takes three arguments :
+        - seq [string] : sequence of the read
+        - base [string] : base of the tail ('A', 'T', 'G', ...)
+        - mismatches [integer] : maximal number of mismatches in the tail
+
+    Returns one argument : start [integer] : start of the tail
+    """
+
+    start = len(seq.rstrip(base))
+
+    for nb in range(mismatches):
+        if (start == 0):
+            break
+
+        extended = len(seq[:start - 1].rstrip(base))
+
+        if (start - 1 - extended < POLYX_SEGMENT):
+            break
+
+        start = extended
+
+    return start
+
+
+
+def polyx(record, bases, min_length, mismatches):
+    """
+    Function that removes the longest poly-X tail (of at least 'min_length'
+    bases) of a record.
+
+    Takes four arguments :
+        - record [tuple] : FASTQ record
+        - bases [string] : bases of the tails ('AG', ...)
+        - min_length [integer] : minimal length of a tail
+        - mismatches [integer] : maximal number of mismatches in a tail
+
+    Returns one argument : record [tuple] : the trimmed record
+    """
+
+    seq = record[1].upper()
+    end = min([polyx_tail(seq, base, mismatches) for base in bases])
+
+    if (len(seq) - end < min_length):
+        return record
+
+    return (record[0], record[1][:end], record[2], record[3][:end])
+
+
+
+def polyx_step(param, nb, inout, size=10000):
+    """
+    Function that runs the poly-X tail trimming, on step 1 outputs if adapter
+    trimming has been done, on the inputs otherwise. Trimmed reads are written
+    in the scratch directory and become the step 1 outputs, so that quality
+    trimming (step 2) reads them. Pairs are kept together (a read can become
+    empty, it is then dropped by step 2).
+
+    Takes four arguments :
+        - param [dict] : dictionnary containing all parameters
+        - nb [integer] : number of executed trimming command
+        - inout [dict] : dictionnary containing all generated filenames
+        - size [integer] : number of reads in a batch
+
+    Returns inout [dict] with the poly-X trimmed files
+    """
+
+    bases, min_length, mismatches = param['polyx'].split(':')
+    bases = bases.upper()
+    min_length = int(min_length)
+    mismatches = int(mismatches)
+
+    if (nb == 1):
+        inputs = inout['trimmed']
+        inputs = [inputs] if param['layout'] == 'SE' else list(inputs)
+    else:
+        inputs = list(param['input'])
+        if (param['layout'] == 'SE'):
+            inputs = inputs[:1]
+        inout['input'] = param['input']
+
+    outputs = ["{0}/polyx_{1}.fastq".format(param['scratch'],
+                                            ce.get_file_prefix(filename))
+               for filename in inputs]
+
+    rows = []
+
+    for filename, output, raw in zip(inputs, outputs, param['input']):
+        reader = fq.open_fastq(filename)
+        writer = fq.open_fastq(output, 'w')
+        trimmed_reads = 0
+        removed_bases = 0
+
+        for batch in fq.read_batches(reader, size):
+            trimmed = [polyx(record, bases, min_length, mismatches)
+                       for record in batch]
+            removed = [len(record[1]) - len(new[1])
+                       for record, new in zip(batch, trimmed)]
+
+            trimmed_reads += len(removed) - removed.count(0)
+            removed_bases += sum(removed)
+
+            # empty single-end reads are dropped
+            if (len(inputs) == 1):
+                trimmed = [record for record in trimmed if record[1]]
+
+            fq.write_records(writer, trimmed)
+
+        reader.close()
+        writer.close()
+
+        rows.append([raw, trimmed_reads, removed_bases])
+
+        # step 1 outputs are intermediate files
+        if (nb == 1):
+            os.remove(filename)
+
+    inout = cl.add_stat_section(inout, 'Poly-X Trimming',
+                                ['Filename', 'Trimmed Reads', 'Removed Bases'],
+                                rows)
+
+    inout['trimmed'] = outputs[0] if param['layout'] == 'SE' else tuple(outputs)
+
+    return inout
@@ -0,0 +1,386 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+"""
+watch.py : module containing all functions to trim the reads of a directory as
+           they land (from the sequencer or the demultiplexing). The directory
+           is watched with inotify (polling if inotify is not available), a
+           FASTQ file is complete when its size has not changed for a while,
+           and a PE sample is ready when both mates are complete. Ready
+           samples are queued onto a bounded number of premseq runs (each
+           sample in '<output>/<sample>/'), and a state file records the
+           processed samples so that a restarted daemon does not run them
+           again.
+
+Dependency : check_entries, samplesheet (personal modules)
+"""
+
+__author__ = "Anita Annamalé"
+__version__  = "1.0"
+__copyright__ = "copyleft"
+__date__ = "2015/07"
+
+#-------------------------- MODULES IMPORTATION -------------------------------#
+
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import re
+import select
+import signal
+import struct
+import subprocess
+import sys
+import time
+
+# Personal modules
+import check_entries as ce
+import samplesheet as ss
+
+
+# state of the processed samples, in the output directory
+STATE_FILE = '.premseq_watch.json'
+
+# seconds between two scans of the directory without inotify (or between two
+# checks of the running samples)
+POLL = 10
+
+# seconds without change of size after which a file is complete
+SETTLE = 60
+
+# FASTQ files, and mates of PE files : <sample><separator><1|2><end>
+FASTQ = re.compile(r"\.(fastq|fq)(\.gz|\.bz2|\.zst)?$")
+MATES = re.compile(r"^(.+?)([._]R?)([12])"
+                   r"((?:_\d+)?\.(?:fastq|fq)(?:\.gz|\.bz2|\.zst)?)$")
+
+# inotify events : closed after writing, moved in, created, modified
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+EVENT = struct.Struct('iIII')
+
+
+#---------------------------- CLASS DEFINITION --------------------------------#
+
+
+class Inotify(object):
+    """
+    Watch of a directory with the inotify system calls of the C library. Any
+    event of the directory wakes up the daemon, which then scans it.
+    """
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.fd = libc.inotify_init()
+        if (self.fd < 0):
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if (libc.inotify_add_watch(self.fd, directory, mask) < 0):
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'inotify_add_watch failed')
+
+
+    def wait(self, timeout):
+        """
+        Waits for events (at most 'timeout' seconds) and reads them all.
+        """
+
+        try:
+            ready = select.select([self.fd], [], [], timeout)[0]
+        except select.error as error:
+            if error.args[0] == errno.EINTR:
+                return
+            raise
+
+        if ready:
+            os.read(self.fd, 64 * EVENT.size + 16 * 4096)
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+
+class Poller(object):
+    """
+    Watch of a directory by polling, when inotify is not available.
+    """
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, POLL))
+
+
+    def close(self):
+        pass
+
+
+#-------------------------- FUNCTIONS DEFINITION ------------------------------#
+
+
+# STATE ------------------------------------------------------------------------
+
+def read_state(filename):
+    """
+    Function that reads the state of the processed samples.
+
+    Takes one argument : filename [string] : the state file
+
+    Returns one argument :
+        state [dict] : files, sizes and status of each processed sample
+    """
+
+    if not os.path.isfile(filename):
+        return dict()
+
+    with open(filename, 'rt') as f:
+        return json.load(f)
+
+
+
+def write_state(filename, state):
+    """
+    Function that writes the state of the processed samples (in a temporary
+    file renamed over the state file, so that it is never left incomplete).
+
+    Takes two arguments : - filename [string] : the state file
+                          - state [dict] : state of the processed samples
+
+    Returns anything.
+    """
+
+    tmp = "{0}.tmp".format(filename)
+
+    with open(tmp, 'wt') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+
+    os.rename(tmp, filename)
+
+
+
+# READY SAMPLES ----------------------------------------------------------------
+
+def complete_files(directory, seen, settle):
+    """
+    Function that scans the directory and gives the FASTQ files whose size and
+    modification time have not changed for 'settle' seconds. Hidden files
+    (temporary files of rsync, ...) are ignored.
+
+    Takes three arguments :
+        - directory [string] : the watched directory
+        - seen [dict] : (size, mtime, time of the last change) of each file,
+                        updated
+        - settle [integer] : seconds without change of a complete file
+
+    Returns two arguments : - complete [dict] : size of each complete file
+                            - wait [float] : seconds before the next file
+                                             may be complete, or None
+    """
+
+    now = time.time()
+    complete = dict()
+    wait = None
+
+    names = [name for name in os.listdir(directory)
+             if FASTQ.search(name) and not name.startswith('.')]
+
+    for name in seen.keys():
+        if not name in names:
+            del seen[name]
+
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+
+        if seen.get(name, (None, None, None))[:2] != (stat.st_size,
+                                                      stat.st_mtime):
+            seen[name] = (stat.st_size, stat.st_mtime, now)
+
+        remaining = seen[name][2] + settle - now
+        if (remaining <= 0):
+            complete[name] = stat.st_size
+        elif wait is None or remaining < wait:
+            wait = remaining
+
+    return complete, wait
+
+
+
+def ready_samples(directory, layout, complete):
+    """
+    Function that gives the samples whose files are complete : every file for
+    SE data, both mates for PE data (mates are named <sample>_1 and <sample>_2,
+    <sample>_R1 and <sample>_R2, ...).
+
+    Takes three arguments :
+        - directory [string] : the watched directory
+        - layout [string] : 'SE' or 'PE'
+        - complete [dict] : size of each complete file
+
+    Returns one argument : samples [list] : list of (name, files, sizes)
+    """
+
+    samples = []
+
+    if (layout == 'SE'):
+        for name in sorted(complete):
+            samples.append((ce.get_file_prefix(name),
+                            [os.path.join(directory, name)],
+                            [complete[name]]))
+        return samples
+
+    for name in sorted(complete):
+        match = MATES.match(name)
+        if not match or match.group(3) != '1':
+            continue
+
+        mate = "{0}{1}2{2}".format(match.group(1), match.group(2),
+                                   match.group(4))
+        if not mate in complete:
+            continue
+
+        sample = match.group(1) + match.group(4).split('.')[0]
+        samples.append((sample, [os.path.join(directory, name),
+                                 os.path.join(directory, mate)],
+                        [complete[name], complete[mate]]))
+
+    return samples
+
+
+
+# DAEMON -----------------------------------------------------------------------
+
+def stop(signum, frame):
+    """
+    Function that stops the daemon on SIGTERM, as on an interruption.
+
+    Takes two arguments : - signum [integer] : the signal
+                          - frame [frame] : the interrupted frame
+
+    Returns anything (raises KeyboardInterrupt).
+    """
+
+    raise KeyboardInterrupt
+
+
+
+def watch(script, param, directory, workers=1, settle=SETTLE):
+    """
+    Function that watches a directory and runs premseq on each sample as soon
+    as its files are complete, with at most 'workers' samples at a time. The
+    processed samples (done or failed) are recorded in the state file of the
+    output directory, a sample is run again only if its files change. The
+    daemon runs until it is interrupted (Ctrl-C or SIGTERM), running samples
+    are then stopped and will be run again at the next start.
+
+    Takes five arguments :
+        - script [string] : path to premseq.py
+        - param [dict] : dictionnary containing all parameters
+        - directory [string] : the watched directory
+        - workers [integer] : maximal number of samples running at a time
+        - settle [integer] : seconds without change of a complete file
+
+    Returns anything.
+    """
+
+    if not os.path.isdir(directory):
+        sys.exit("/!\ Watched directory '{0}' does not exist.".format(directory))
+
+    if (workers < 1):
+        sys.exit("/!\ Number of watch workers must be a positive integer.")
+
+    state_file = "{0}/{1}".format(param['output'], STATE_FILE)
+    state = read_state(state_file)
+
+    # options of each sample : without the watch options and the layout
+    options = ss.sample_options(sys.argv[1:])
+    for arg in options:
+        if arg.upper() == param['layout']:
+            options.remove(arg)
+            break
+
+    try:
+        watcher = Inotify(directory)
+        print "Watching '{0}' (inotify)".format(directory)
+    except (OSError, AttributeError, TypeError):
+        watcher = Poller()
+        print "Watching '{0}' (polling every {1} s)".format(directory, POLL)
+
+    signal.signal(signal.SIGTERM, stop)
+
+    seen = dict()
+    queue = collections.deque()
+    running = dict()
+
+    try:
+        while True:
+
+            # queue the samples which are ready and have not been processed
+            # with the same files
+            complete, wait = complete_files(directory, seen, settle)
+            queued = set([sample[0] for sample in queue]) | set(running)
+
+            for name, files, sizes in ready_samples(directory,
+                                                    param['layout'], complete):
+                done = state.get(name)
+                if name in queued or (done and done['files'] == files and
+                                      done['sizes'] == sizes):
+                    continue
+                queue.append((name, files, sizes))
+                print "{0} : queued".format(name)
+
+            # samples which have finished
+            for name, (process, cmd, output, files, sizes, start) \
+                    in running.items():
+                if process.poll() is None:
+                    continue
+
+                del running[name]
+                seconds = time.time() - start
+
+                if (process.returncode == 0):
+                    ss.mark_done(output, cmd, seconds)
+                    status = 'done'
+                else:
+                    status = 'failed'
+
+                print "{0} : {1} in {2:.1f} s".format(name, status, seconds)
+                state[name] = {'files': files, 'sizes': sizes,
+                               'status': status, 'seconds': round(seconds, 1),
+                               'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+                write_state(state_file, state)
+
+            # start queued samples
+            while queue and len(running) < workers:
+                name, files, sizes = queue.popleft()
+                cmd, output = ss.sample_command(script, param, name,
+                                                param['layout'], files,
+                                                options)
+                running[name] = (subprocess.Popen(cmd), cmd, output, files,
+                                 sizes, time.time())
+                print "{0} : started".format(name)
+
+            # wait for events, for a file to become complete or for a sample
+            # to finish (checked every second)
+            timeout = POLL if wait is None else min(wait + 0.1, POLL)
+            if running :
+                timeout = min(timeout, 1)
+            watcher.wait(timeout)
+
+    except KeyboardInterrupt:
+        for process, cmd, output, files, sizes, start in running.values():
+            process.terminate()
+            process.wait()
+        print "\nStopped ({0} sample(s) interrupted).".format(len(running))
+
+    finally:
+        watcher.close()
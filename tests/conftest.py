@@ -0,0 +1,12 @@
+# -*- coding: utf8 -*-
+
+"""
+conftest.py : the personal modules of premseq are imported from src/, as
+              premseq.py does.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
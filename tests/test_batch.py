@@ -0,0 +1,93 @@
+# -*- coding: utf8 -*-
+
+"""
+test_batch.py : the reads of a batch are demultiplexed back to their samples,
+                unchanged and in order.
+"""
+
+import batch as bt
+import fastq as fq
+
+
+def write_reads(filename, names, quals='IIII'):
+    with open(filename, 'w') as f:
+        fq.write_records(f, [('@{0} 1:N:0:1'.format(name), 'ACGT', '+', quals)
+                             for name in names])
+
+
+def read_records(filename):
+    with open(filename) as f:
+        return list(fq.read_records(f))
+
+
+def test_make_batches():
+    samples = [('s{0}'.format(i), 'PE' if i % 2 else 'SE', [])
+               for i in range(5)]
+    batches = bt.make_batches(samples, 2, 33)
+    assert [[sample[0] for sample in batch] for batch in batches] == \
+           [['s0', 's2'], ['s4'], ['s1', 's3']]
+
+
+def test_make_batches_separates_phred_offsets(tmpdir):
+    samples = []
+    for name, quals in [('p33', '#+5I'), ('p64', 'BJTh'), ('q33', '!!II')]:
+        filename = str(tmpdir.join('{0}.fastq'.format(name)))
+        write_reads(filename, ['r1'], quals)
+        samples.append((name, 'SE', [filename]))
+
+    batches = bt.make_batches(samples, 10)
+    assert [[sample[0] for sample in batch] for batch in batches] == \
+           [['p33', 'q33'], ['p64']]
+
+
+def test_survival_rows():
+    header, rows = bt.survival_rows('PE', [10, 4],
+                                    {'trimmed': [5, 0], 'merged': [1, 0],
+                                     'single_1': [2, 1], 'single_2': [1, 0]})
+    assert header[0] == 'Input Read Pairs'
+    assert rows == [[10, 6, 60.0, 2, 20.0, 1, 10.0, 1, 10.0],
+                    [4, 0, 0.0, 1, 25.0, 0, 0.0, 3, 75.0]]
+
+
+def test_single_end_round_trip(tmpdir):
+    batch = []
+    for name, reads in [('a', ['a1', 'a2']), ('empty', []), ('b', ['b1'])]:
+        filename = str(tmpdir.join('{0}.fastq'.format(name)))
+        write_reads(filename, reads)
+        batch.append((name, 'SE', [filename]))
+
+    files, counts = bt.concatenate(batch, 'batch', str(tmpdir))
+    assert counts == [2, 0, 1]
+    assert all([bt.TAG in record[0] for record in read_records(files[0])])
+
+    outputs = [str(tmpdir.join('out_{0}.fastq'.format(name)))
+               for name, layout, inputs in batch]
+    assert bt.demultiplex(files[0], batch, outputs, {}) == [2, 0, 1]
+
+    for (name, layout, inputs), output in zip(batch, outputs):
+        assert read_records(output) == read_records(inputs[0])
+
+
+def test_paired_end_round_trip(tmpdir):
+    batch = []
+    for name, reads in [('a', ['a1', 'a2', 'a3']), ('b', ['b1'])]:
+        inputs = [str(tmpdir.join('{0}_{1}.fastq'.format(name, mate)))
+                  for mate in (1, 2)]
+        for filename in inputs:
+            write_reads(filename, reads)
+        batch.append((name, 'PE', inputs))
+
+    files, counts = bt.concatenate(batch, 'batch', str(tmpdir))
+    assert counts == [3, 1]
+
+    prefixes = ['batch_1', 'batch_2']
+    for mate, filename in enumerate(files):
+        outputs = [str(tmpdir.join(bt.output_name('trimmed_' + prefixes[mate] +
+                                                  '.fastq', prefixes, inputs)))
+                   for name, layout, inputs in batch]
+        assert bt.demultiplex(filename, batch, outputs, {}) == [3, 1]
+
+        for (name, layout, inputs), output in zip(batch, outputs):
+            assert output.endswith('trimmed_{0}_{1}.fastq'.format(name,
+                                                                  mate + 1))
+            assert read_records(output) == read_records(inputs[mate])
@@ -0,0 +1,44 @@
+# -*- coding: utf8 -*-
+
+"""
+test_native.py : native trimming of paired-end reads writes the same pairs and
+                 singletons as Trimmomatic 0.33.
+"""
+
+import os
+
+import fastq as fq
+import native as nt
+import trimmer as tr
+
+
+# pairs (phred33) and their outputs by Trimmomatic 0.33 PE with
+# LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:20 (data/trimmomatic/PE/)
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+OUTPUTS = ['trimmed_1', 'trimmed_2', 'single_1', 'single_2']
+
+
+def read_text(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+def read_records(text):
+    return list(fq.read_records(text.splitlines(True)))
+
+
+def test_same_pairs_and_singletons_as_trimmomatic():
+    param = {'leading': '3', 'trailing': '3', 'slidingwindow': '4:15',
+             'minlen': '20'}
+    nt.init_worker(tr.get_steps(param, 33), None, 33)
+
+    chunks = [read_text(os.path.join(DATA, name))
+              for name in ['reads.fastq', 'reads_2.fastq']]
+    outputs, stats = nt.trim_chunk(chunks)
+
+    assert len(outputs) == 4
+    for name, text in zip(OUTPUTS, outputs):
+        expected = read_text(os.path.join(DATA, 'trimmomatic', 'PE',
+                                          name + '.fastq'))
+        assert read_records(text) == read_records(expected)
+    assert stats['input'] == 400
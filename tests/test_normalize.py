@@ -0,0 +1,65 @@
+# -*- coding: utf8 -*-
+
+"""
+test_normalize.py : digital normalization keeps reads (or pairs) until their
+                    k-mers reach the target coverage.
+"""
+
+import fastq as fq
+import normalize as nm
+
+
+def write_reads(filename, seqs):
+    with open(filename, 'w') as f:
+        fq.write_records(f, [('@r{0}'.format(i), seq, '+', 'I' * len(seq))
+                             for i, seq in enumerate(seqs)])
+
+
+def read_seqs(filename):
+    with open(filename) as f:
+        return [record[1] for record in fq.read_records(f)]
+
+
+def test_primes():
+    assert [n for n in range(20) if nm.is_prime(n)] == [2, 3, 5, 7, 11, 13,
+                                                        17, 19]
+    assert nm.get_primes(20, 3) == [19, 17, 13]
+
+
+def test_reverse_complement_has_the_same_kmers():
+    sketch = nm.CountMinSketch(5, 1 << 16)
+    seq = 'ACGTTGCAAGGCTTAC'
+    rev = seq.translate(nm.COMPLEMENT)[::-1]
+    assert sorted(sketch.hashes(seq)) == sorted(sketch.hashes(rev))
+
+
+def test_single_end(tmpdir):
+    inputs = [str(tmpdir.join('in.fastq'))]
+    outputs = [str(tmpdir.join('out.fastq'))]
+
+    repeated = 'ACGTACGGTTCAGCATTGCA'
+    other = 'TTGACCAGTAGGCATCAGTC'
+    write_reads(inputs[0], [repeated] * 10 + [other])
+
+    total, kept = nm.normalize_files({'normalize': '8:3:1'}, inputs, outputs)
+
+    # copies are kept while their median abundance is below 3
+    assert (total, kept) == (11, 4)
+    assert read_seqs(outputs[0]) == [repeated] * 3 + [other]
+
+
+def test_paired_end_keeps_pairs_with_one_new_mate(tmpdir):
+    inputs = [str(tmpdir.join('in_1.fastq')), str(tmpdir.join('in_2.fastq'))]
+    outputs = [str(tmpdir.join('out_1.fastq')), str(tmpdir.join('out_2.fastq'))]
+
+    mate_1 = 'ACGTACGGTTCAGCATTGCA'
+    write_reads(inputs[0], [mate_1] * 3)
+    write_reads(inputs[1], ['TTGACCAGTAGGCATCAGTC', 'TTGACCAGTAGGCATCAGTC',
+                            'GGATCCTAGCTAGGATCAAA'])
+
+    total, kept = nm.normalize_files({'normalize': '8:1:1'}, inputs, outputs)
+
+    assert (total, kept) == (3, 2)
+    assert read_seqs(outputs[0]) == [mate_1] * 2
+    assert read_seqs(outputs[1]) == ['TTGACCAGTAGGCATCAGTC',
+                                     'GGATCCTAGCTAGGATCAAA']
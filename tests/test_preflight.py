@@ -0,0 +1,91 @@
+# -*- coding: utf8 -*-
+
+"""
+test_preflight.py : corrupted and truncated inputs are reported, not raised.
+"""
+
+import bz2
+import distutils.spawn
+import gzip
+import os
+import subprocess
+
+import pytest
+
+import preflight as pf
+
+
+READS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                     'reads.fastq')
+
+
+def compressed(tmpdir, ext):
+    with open(READS) as f:
+        data = f.read()
+
+    filename = str(tmpdir.join('reads.fastq' + ext))
+
+    if (ext == '.gz'):
+        handle = gzip.open(filename, 'wb')
+        handle.write(data)
+        handle.close()
+    elif (ext == '.bz2'):
+        handle = bz2.BZ2File(filename, 'w')
+        handle.write(data)
+        handle.close()
+    else:
+        subprocess.check_call(['zstd', '-qf', READS, '-o', filename])
+
+    return filename
+
+
+def truncate(filename, nb):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    with open(filename, 'wb') as f:
+        f.write(data[:-nb])
+
+
+def test_valid_file():
+    assert pf.check_file(READS) == (400, None)
+
+
+def test_incomplete_record(tmpdir):
+    filename = str(tmpdir.join('reads.fastq'))
+    with open(READS) as f:
+        lines = f.readlines()
+    with open(filename, 'w') as f:
+        f.writelines(lines[:-2])
+
+    records, error = pf.check_file(filename)
+    assert records == 0 and 'incomplete record' in error
+
+
+@pytest.mark.parametrize('nb', [1, 4, 8, 1000])
+def test_truncated_gzip(tmpdir, nb):
+    filename = compressed(tmpdir, '.gz')
+    assert pf.check_file(filename) == (400, None)
+
+    # a cut in the trailer used to raise struct.error
+    truncate(filename, nb)
+    records, error = pf.check_file(filename)
+    assert records == 0 and 'truncated' in error
+
+
+def test_truncated_bzip2(tmpdir):
+    filename = compressed(tmpdir, '.bz2')
+    truncate(filename, 100)
+    records, error = pf.check_file(filename)
+    assert records == 0 and error is not None
+
+
+@pytest.mark.skipif(distutils.spawn.find_executable('zstd') is None,
+                    reason="zstd is not installed")
+@pytest.mark.parametrize('nb', [1, 1000])
+def test_truncated_zstd(tmpdir, nb):
+    filename = compressed(tmpdir, '.zst')
+    assert pf.check_file(filename) == (400, None)
+
+    truncate(filename, nb)
+    records, error = pf.check_file(filename)
+    assert records == 0 and 'truncated' in error
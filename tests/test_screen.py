@@ -0,0 +1,93 @@
+# -*- coding: utf8 -*-
+
+"""
+test_screen.py : reads (or pairs) made of contaminant k-mers are screened out,
+                 on both strands, and the filter is cached.
+"""
+
+import os
+import random
+
+import fastq as fq
+import normalize as nm
+import screen as sc
+
+
+def random_seq(rnd, length):
+    return ''.join([rnd.choice('ACGT') for i in range(length)])
+
+
+def write_reads(filename, seqs):
+    with open(filename, 'w') as f:
+        fq.write_records(f, [('@r{0}'.format(i), seq, '+', 'I' * len(seq))
+                             for i, seq in enumerate(seqs)])
+
+
+def read_seqs(filename):
+    with open(filename) as f:
+        return [record[1] for record in fq.read_records(f)]
+
+
+def fixtures(tmpdir):
+    rnd = random.Random(3)
+    contaminant = random_seq(rnd, 300)
+
+    fasta = str(tmpdir.join('contaminants.fa'))
+    with open(fasta, 'w') as f:
+        f.write(">phiX\n{0}\n{1}\n".format(contaminant[:150],
+                                           contaminant[150:]))
+
+    return fasta, contaminant, rnd
+
+
+def test_canonical_kmers_of_both_strands():
+    seq = 'ACGTTGCAAGGCTTACG'
+    rev = seq.translate(nm.COMPLEMENT)[::-1]
+    assert sorted(sc.canonical_kmers(seq, 7)) == \
+           sorted(sc.canonical_kmers(rev, 7))
+
+
+def test_contaminants_are_found(tmpdir):
+    fasta, contaminant, rnd = fixtures(tmpdir)
+    bloom = sc.build_filter(fasta, 21)
+
+    read = contaminant[100:200]
+    rev = read.translate(nm.COMPLEMENT)[::-1]
+    half = read[:50] + random_seq(rnd, 50)
+
+    assert sc.is_contaminant([read], bloom, 0.5)
+    assert sc.is_contaminant([rev], bloom, 0.5)
+    assert not sc.is_contaminant([random_seq(rnd, 100)], bloom, 0.5)
+    assert not sc.is_contaminant([half], bloom, 0.9)
+
+    # reads shorter than the k-mers are never contaminants
+    assert not sc.is_contaminant([read[:20]], bloom, 0.5)
+
+
+def test_screen_files(tmpdir):
+    fasta, contaminant, rnd = fixtures(tmpdir)
+    bloom = sc.build_filter(fasta, 21)
+
+    clean = [random_seq(rnd, 80) for i in range(5)]
+    dirty = [contaminant[i:i + 80] for i in (0, 90, 200)]
+
+    reads = str(tmpdir.join('reads.fastq'))
+    kept = str(tmpdir.join('kept.fastq'))
+    found = str(tmpdir.join('found.fastq'))
+    write_reads(reads, clean[:2] + dirty + clean[2:])
+
+    assert sc.screen_files([reads], bloom, 0.5, [kept], [found], {}) == (8, 3)
+    assert read_seqs(kept) == clean
+    assert read_seqs(found) == dirty
+
+
+def test_cached_filter(tmpdir):
+    fasta, contaminant, rnd = fixtures(tmpdir)
+    param = {'scratch': str(tmpdir)}
+
+    bloom = sc.get_filter(param, fasta, 21)
+    assert os.path.isfile(sc.cache_name(param, fasta, 21))
+
+    cached = sc.get_filter(param, fasta, 21)
+    assert (cached.nb_bits, cached.nb_hashes, cached.bits) == \
+           (bloom.nb_bits, bloom.nb_hashes, bloom.bits)
@@ -0,0 +1,79 @@
+# -*- coding: utf8 -*-
+
+"""
+test_trimmer.py : the native trimming steps give the same reads as the steps
+                  of Trimmomatic 0.33.
+"""
+
+import os
+
+import pytest
+
+import fastq as fq
+import trimmer as tr
+
+
+# reads (phred33, with 'N' bases) and their outputs by Trimmomatic 0.33 for
+# each configuration (data/trimmomatic/<steps>.fastq, ':' as '_' and ' ' as '-')
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CONFIGURATIONS = ['LEADING:20', 'TRAILING:20', 'SLIDINGWINDOW:4:20',
+                  'SLIDINGWINDOW:10:25', 'AVGQUAL:20', 'MAXINFO:40:0.5',
+                  'MAXINFO:80:0.2',
+                  'LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:36']
+
+
+def quals(*values):
+    return bytearray([33 + value for value in values])
+
+
+def read_fastq(filename):
+    with open(filename) as f:
+        return list(fq.read_records(f))
+
+
+def test_trailing_cuts_low_bases():
+    assert tr.trailing(quals(30, 30, 10, 2), 0, 4, 33 + 20) == (0, 2)
+
+
+def test_trailing_never_looks_at_the_first_base():
+    # all bases but the first one are low : the read is dropped, whatever the
+    # quality of the first base
+    assert tr.trailing(quals(40, 2, 2), 0, 3, 33 + 20) == (0, 0)
+    assert tr.trailing(quals(40), 0, 1, 33 + 20) == (0, 0)
+    assert tr.trailing(quals(40, 30), 0, 2, 33 + 20) == (0, 2)
+
+
+def test_sliding_window_drops_reads_shorter_than_the_window():
+    assert tr.sliding_window(quals(40, 40, 40), 0, 3, 4, 33 + 20) == (0, 0)
+
+
+def test_sliding_window_cuts_at_the_end_of_the_first_low_window():
+    # the window 10-10-10-40 is the first one below 20, then the low bases
+    # left at its end are removed
+    read = quals(40, 40, 40, 40, 10, 10, 10, 40, 40)
+    assert tr.sliding_window(read, 0, 9, 4, 33 + 20) == (0, 4)
+
+
+def test_n_bases_have_the_lowest_quality():
+    record = ('@r', 'ANA', '+', 'III')
+    assert tr.trimming_quals(record, 33) == bytearray('I!I')
+
+
+@pytest.mark.parametrize('config', CONFIGURATIONS)
+def test_same_reads_as_trimmomatic(config):
+    name = config.replace(':', '_').replace(' ', '-')
+    expected = read_fastq(os.path.join(DATA, 'trimmomatic', name + '.fastq'))
+
+    param = dict()
+    for step in config.split():
+        key, value = step.split(':', 1)
+        param[key.lower()] = value
+    steps = tr.get_steps(param, 33)
+
+    trimmed = []
+    for record in read_fastq(os.path.join(DATA, 'reads.fastq')):
+        kept = tr.trim(steps, tr.trimming_quals(record, 33))
+        if kept is not None:
+            trimmed.append(tr.apply(record, kept))
+
+    assert trimmed == expected